@@ -0,0 +1,130 @@
+"""
+Asyncio operations
+------------------
+
+Coroutine variants of the Context and Page operations. The elasticsearch 6.x client has no async API,
+therefore each coroutine runs the synchronous method in the thread pool of this module by
+`loop.run_in_executor`. A single call does not get faster this way, but independent calls can be
+awaited concurrently (e.g. with `asyncio.gather`), which is used by the `async def` views of the API.
+
+The context variables are copied into the worker threads. Thus the Flask request context is available
+there and the Elasticsearch calls are counted by the request metrics of `metacatalog2.metrics`.
+
+Note: Flask runs `async def` views only if installed with the async extra (`pip install flask[async]`).
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from metacatalog2.elastic import es, ELASTIC_POOL_SIZE
+from metacatalog2.models import Context, Page
+
+# the blocking calls are run in this pool, more threads than pooled connections would only wait
+executor = ThreadPoolExecutor(max_workers=ELASTIC_POOL_SIZE, thread_name_prefix='metacatalog2-aio')
+
+
+async def run(func, *args, **kwargs):
+    """
+    Run the blocking function in the thread pool and await the result. The function is called
+    inside a copy of the current context variables.
+
+    :param func: callable
+    :return: the result of func(*args, **kwargs)
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+
+async def info():
+    """
+    Return the Elasticsearch info and cluster health, both requested concurrently.
+
+    :return: tuple of (info, health)
+    """
+    return await asyncio.gather(run(es.info), run(es.cat.health))
+
+
+async def context_by_name(name, strict=True, use_cache=True):
+    """
+    Async variant of `Context.by_name`.
+    """
+    return await run(Context.by_name, name, strict=strict, use_cache=use_cache)
+
+
+async def contexts_by_names(names, strict=True, use_cache=True):
+    """
+    Async variant of `Context.by_names`.
+    """
+    return await run(Context.by_names, names, strict=strict, use_cache=use_cache)
+
+
+async def get_page(id, context=None, index=None, fields=None):
+    """
+    Async variant of `Page.get`.
+    """
+    return await run(Page.get, id, index=index, context=context, fields=fields)
+
+
+async def get_pages(ids, context=None, index=None, fields=None):
+    """
+    Async variant of `Page.get_many`.
+    """
+    return await run(Page.get_many, ids, context=context, index=index, fields=fields)
+
+
+async def create_page(page, **kwargs):
+    """
+    Async variant of `Page.create`. The index has to be set on the meta object of the Page.
+
+    :param page: `metacatalog2.models.Page`
+    :return: the created Page
+    """
+    await run(page.create, **kwargs)
+    return page
+
+
+async def bulk_create_pages(docs, index, chunk_size=500):
+    """
+    Async variant of `Page.bulk_create`. In contrast to the synchronous method, the bulk responses
+    are collected into a list, as the generator can not be consumed from the event loop.
+
+    :return: list of (ok, item) tuples
+    """
+    return await run(lambda: list(Page.bulk_create(docs, index=index, chunk_size=chunk_size)))
+
+
+async def all_pages(index=None, limit=None, fields=None):
+    """
+    Async variant of `Page.all`.
+    """
+    return await run(Page.all, index=index, limit=limit, fields=fields)
+
+
+async def iter_pages(index=None, page_size=50, cursor=None, fields=None):
+    """
+    Async variant of `Page.iter_pages`.
+    """
+    return await run(Page.iter_pages, index=index, page_size=page_size, cursor=cursor, fields=fields)
+
+
+async def fulltext(q, **kwargs):
+    """
+    Async variant of `Page.fulltext`, the keyword arguments are the same.
+    """
+    return await run(Page.fulltext, q, **kwargs)
+
+
+async def all_coordinates(**kwargs):
+    """
+    Async variant of `Page.all_coordinates`, the keyword arguments are the same.
+    """
+    return await run(Page.all_coordinates, **kwargs)
+
+
+async def variables(index=None, use_cache=True):
+    """
+    Async variant of `Page.variables`.
+    """
+    return await run(Page.variables, index=index, use_cache=use_cache)
@@ -1,5 +1,5 @@
-from .system import info
-from .contexts import get_contexts, get_context, new_context, edit_context, delete_context
-from .page import get_pages, get_page, new_page, edit_page, delete_page
-from .geo import get_pages_geohash
+from .system import info, get_metrics
+from .contexts import get_contexts, get_context, new_context, edit_context, reindex_context, delete_context
+from .page import get_pages, search_pages, get_page, mget_pages, new_page, bulk_pages, edit_page, delete_page
+from .geo import get_pages_geohash, get_pages_spatial
 from .manage import get_all_variables
\ No newline at end of file
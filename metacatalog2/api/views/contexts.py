@@ -1,4 +1,5 @@
 from flask import jsonify, request
+from requests import HTTPError
 
 from metacatalog2.api import api
 from metacatalog2.models import Context
@@ -8,9 +9,21 @@ from metacatalog2.models import Context
 def get_contexts():
     """
     Return all Context documents from the mgt index.
+    If the GET argument `cursor` or `page_size` is set, only one page of contexts is returned, along with
+    the cursor pointing to the next page.
 
     :return: json of all documents
     """
+    if 'cursor' in request.args or 'page_size' in request.args:
+        try:
+            contexts, cursor = Context.iter_pages(
+                page_size=request.args.get('page_size', 50),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify(dict(error=dict(status=400, message=str(e))))
+        return jsonify(dict(contexts=[ctx.to_json() for ctx in contexts], cursor=cursor))
+
     return jsonify([ctx.to_json() for ctx in Context.all()])
 
 
@@ -65,7 +78,7 @@ def edit_context(id):
     Edit an existing Context.
     All contents of the part_of property will be re-aliased, but the index will NOT be reindexed, yet.
 
-    Note: the old index will NOT be reindexed. This has to be done externally.
+    Note: the old index will NOT be reindexed. Use the reindex endpoint for that.
 
     :param id: str, the unique ID of the requested Context
     :return: the edited Context as JSON
@@ -95,6 +108,55 @@ def edit_context(id):
     return jsonify(ctx.to_json())
 
 
+@api.route('/context/<string:id>/reindex', methods=['POST'])
+def reindex_context(id):
+    """
+    Start the reindex of the requested Context into a new index version, using the definition given
+    as GET argument `definition` (default 'page'). The reindex runs as a task on Elasticsearch and
+    the response is sent immediately with status 202. Writes to the Context fail until the reindex
+    is finished. Clients have to poll `GET /context/<id>/reindex`, which swaps the aliases to the new
+    index once all documents are copied.
+    The old index is kept read-only, unless the GET argument `delete_old` is set.
+
+    :param id: str, the unique ID of the requested Context
+    :return: the Context and the task id as JSON
+    """
+    ctx = Context.get(id)
+    try:
+        task = ctx.start_reindex(
+            definition_name=request.args.get('definition', 'page'),
+            delete_old=request.args.get('delete_old') is not None
+        )
+    except FileNotFoundError as e:
+        return jsonify(dict(error=dict(status=404, message=str(e))))
+    except HTTPError as e:
+        return jsonify(dict(error=dict(status=e.errno, message=e.strerror)))
+
+    return jsonify(dict(context=ctx.to_json(), task=task)), 202
+
+
+@api.route('/context/<string:id>/reindex', methods=['GET'])
+def reindex_context_status(id):
+    """
+    Return the status of the reindex of the requested Context. If the reindex task is completed, the
+    aliases are swapped to the new index and `finished` is true.
+
+    :param id: str, the unique ID of the requested Context
+    :return: the Context and the reindex task status as JSON
+    """
+    ctx = Context.get(id)
+    try:
+        finished, status = ctx.finish_reindex()
+    except HTTPError as e:
+        return jsonify(dict(error=dict(status=e.errno, message=e.strerror)))
+
+    return jsonify(dict(
+        finished=finished,
+        context=ctx.to_json(),
+        task=status['task']['status']
+    ))
+
+
 @api.route('/context/<string:id>', methods=['DELETE'])
 def delete_context(id):
     """
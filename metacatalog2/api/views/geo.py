@@ -1,29 +1,154 @@
-from flask import request, jsonify
+import json
+
+import numpy as np
+from flask import request, jsonify, Response
+from shapely.errors import ShapelyError
 
 from metacatalog2.api import api
 from metacatalog2.models import Page
+from metacatalog2.metrics import profiling
 from metacatalog2.api.views.page import invoke_context
-from metacatalog2.util.geohash import decode
+from metacatalog2.util.geohash import decode_array
+from metacatalog2.util.geo import parse_bbox, decode_geotile
+from metacatalog2.util.spatial import load_wkt
+
+# output formats of points_response
+POINT_FORMATS = ('json', 'columnar', 'binary', 'geojsonseq')
 
 
 @api.route('/<string:context>/pages/geohash', methods=['GET'])
 @api.route('/pages/geohash', defaults={'context': None}, methods=['GET'])
 def get_pages_geohash(context):
     """
-    Return all
+    Return all Page coordinates of the current context aggregated into a grid.
+
+    GET arguments
+    -------------
+     * bbox:        min_lon,min_lat,max_lon,max_lat, only aggregate Pages in this bounding box
+     * zoom:        the map zoom level, used to choose the precision
+     * precision:   the geohash precision (1-12) or tile zoom (0-29), overwrites the automatic precision
+     * max_buckets: the maximum number of buckets for the automatic precision, default 10000
+     * grid:        'geohash' (default), or 'geotile'
+     * centroid:    if set, the coordinates are the centroid of the documents in each bucket,
+                    instead of the center of the cell
+     * format:      'json' (default), 'columnar', 'binary' or 'geojsonseq', see `points_response`
 
-    :param context:
-    :return:
+    :param context: string, name of the context where the documents shall be aggregated
+    :return: JSON of the aggregated points
     """
     if context is None:
         context = invoke_context()
 
-    # get  the precision or set to 7 on default. this is about 150m by 150m
-    precision = request.args.get('precision', 7)
+    # check the format before the aggregation is run
+    fmt = request.args.get('format', 'json')
+    if fmt not in POINT_FORMATS:
+        return jsonify(dict(error=dict(status=400, message='format has to be one of %s' % list(POINT_FORMATS))))
+
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+        zoom = request.args.get('zoom', None, type=int)
+        precision = request.args.get('precision', None)
+        max_buckets = request.args.get('max_buckets', 10000, type=int)
+        grid = request.args.get('grid', 'geohash')
+        centroid = request.args.get('centroid', 'false').lower() not in ('false', '0', '')
+
+        # default to 7, which is about 150m by 150m, if nothing is known about the map
+        if precision is None and bbox is None and zoom is None and grid == 'geohash':
+            precision = 7
+
+        # get the pages
+        hashlist = Page.all_coordinates(precision=precision, index=context, bbox=bbox, zoom=zoom, grid=grid,
+                                        centroid=centroid, max_buckets=max_buckets, use_cache=not profiling())
+    except ValueError as e:
+        return jsonify(dict(error=dict(status=400, message=str(e))))
 
-    # get the pages
-    hashlist = Page.all_coordinates(precision=precision, index=context)
+    # build the point arrays
+    count = np.fromiter((h['doc_count'] for h in hashlist), dtype=np.uint32, count=len(hashlist))
+    if centroid:
+        lat = np.fromiter((h['centroid']['location']['lat'] for h in hashlist), dtype=np.float64, count=len(hashlist))
+        lon = np.fromiter((h['centroid']['location']['lon'] for h in hashlist), dtype=np.float64, count=len(hashlist))
+    elif grid == 'geotile':
+        coords = np.array([decode_geotile(h['key']) for h in hashlist], dtype=np.float64).reshape(-1, 2)
+        lat, lon = coords[:, 0], coords[:, 1]
+    else:
+        # decode all keys at once
+        lat, lon = decode_array([h['key'] for h in hashlist])
 
-    return jsonify(dict(
-        points=[dict(count=h['doc_count'], coordinates=decode(h['key'])) for h in hashlist]
-    ))
+    return points_response(count, lat, lon, fmt=fmt)
+
+
+@api.route('/<string:context>/pages/spatial', methods=['GET'])
+@api.route('/pages/spatial', defaults={'context': None}, methods=['GET'])
+def get_pages_spatial(context):
+    """
+    Return the ids of all Pages in the current context, whose location matches the spatial predicate
+    for the given geometry. The query is answered by the in-process spatial index of the context.
+
+    GET arguments
+    -------------
+     * wkt:       the query geometry as WKT
+     * predicate: 'intersects' (default), 'within', 'contains' or 'nearest'
+
+    :param context: string, name of the context where the documents shall be queried
+    :return: JSON of the matching Page ids
+    """
+    if context is None:
+        context = invoke_context()
+
+    predicate = request.args.get('predicate', 'intersects')
+    if predicate not in ('intersects', 'within', 'contains', 'nearest'):
+        return jsonify(dict(error=dict(
+            status=400,
+            message="predicate has to be one of ['intersects', 'within', 'contains', 'nearest']"
+        )))
+
+    try:
+        geometry = load_wkt(request.args.get('wkt', ''))
+    except (ShapelyError, ValueError) as e:
+        return jsonify(dict(error=dict(status=400, message='The wkt is not valid: %s' % str(e))))
+
+    ids = getattr(Page.spatial_index(index=context), predicate)(geometry)
+    return jsonify(dict(ids=ids, count=len(ids)))
+
+
+def points_response(count, lat, lon, fmt='json'):
+    """
+    Build the response for the given point arrays in one of the supported formats:
+
+     * json:       {"points": [{"count": n, "coordinates": [lat, lon]}, ...]}
+     * columnar:   {"count": [...], "lat": [...], "lon": [...]}, parallel arrays
+     * binary:     application/octet-stream, little-endian. A uint32 number of points n,
+                   followed by n float32 lat, n float32 lon and n uint32 count values
+     * geojsonseq: streamed GeoJSON text sequence (RFC 8142) of Point features with a count property
+
+    :param count: numpy array of document counts
+    :param lat: numpy array of latitudes
+    :param lon: numpy array of longitudes
+    :param fmt: string, the output format
+    :return: `flask.Response`
+    """
+    if fmt == 'json':
+        return jsonify(dict(
+            points=[dict(count=c, coordinates=(y, x)) for c, y, x in zip(count.tolist(), lat.tolist(), lon.tolist())]
+        ))
+    elif fmt == 'columnar':
+        return jsonify(dict(count=count.tolist(), lat=lat.tolist(), lon=lon.tolist()))
+    elif fmt == 'binary':
+        body = b''.join([
+            np.array([len(count)], dtype='<u4').tobytes(),
+            lat.astype('<f4').tobytes(),
+            lon.astype('<f4').tobytes(),
+            count.astype('<u4').tobytes()
+        ])
+        return Response(body, mimetype='application/octet-stream', headers={'X-Point-Count': str(len(count))})
+    elif fmt == 'geojsonseq':
+        def generate():
+            for c, y, x in zip(count.tolist(), lat.tolist(), lon.tolist()):
+                yield '\x1e' + json.dumps(dict(
+                    type='Feature',
+                    geometry=dict(type='Point', coordinates=[x, y]),
+                    properties=dict(count=c)
+                )) + '\n'
+        return Response(generate(), mimetype='application/geo+json-seq')
+    else:
+        return jsonify(dict(error=dict(status=400, message='format has to be one of %s' % list(POINT_FORMATS))))
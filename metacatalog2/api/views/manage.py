@@ -3,6 +3,7 @@ from flask import jsonify
 from metacatalog2.api import api
 from metacatalog2.api.views.page import invoke_context
 from metacatalog2.models import Page
+from metacatalog2.metrics import profiling
 
 
 @api.route('/variables', defaults={'context': None}, methods=['GET'])
@@ -23,7 +24,7 @@ def get_all_variables(context):
         context = invoke_context()
 
     # get the variables
-    variables = Page.variables(index=context)
+    variables = Page.variables(index=context, use_cache=not profiling())
 
     return jsonify(
         [dict(variable=v['key'], count=v['doc_count']) for v in variables]
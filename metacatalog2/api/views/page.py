@@ -1,10 +1,24 @@
-from flask import jsonify, request, session
+from flask import jsonify, request, session, json, Response, stream_with_context
 from requests import HTTPError
+from elasticsearch import TransportError
 
 from metacatalog2.api import api
 from metacatalog2.models import Page, Context
 
 
+def write_blocked(e):
+    """
+    Return the error response for a write rejected by Elasticsearch. This happens while the
+    context is reindexed, as the old index does not accept any writes until the aliases are swapped.
+
+    :param e: elasticsearch.TransportError raised on the write
+    :return: the error as JSON, or None if the error was not caused by an index block
+    """
+    if e.status_code != 403:
+        return None
+    return jsonify(dict(error=dict(status=409, message='The context is being reindexed, try again later. (%s)' % e.error)))
+
+
 def invoke_context():
     """
     Invoke the current context and return the Elasticsearch alias.
@@ -29,22 +43,128 @@ def invoke_context():
         return 'meta'
 
 
+def stream_pages(pages, fmt='ndjson'):
+    """
+    Stream the given pages as a chunked Flask response. The pages are serialized one at a time,
+    therefore the memory consumption does not depend on the number of pages.
+
+     * ndjson: one JSON document per line (application/x-ndjson)
+     * json: a single JSON array, which is written element by element
+
+    :param pages: iterable of Page objects, usually the `Page.scan` generator
+    :param fmt: string, either 'ndjson' or 'json'
+    :return: `flask.Response`
+    """
+    if fmt == 'ndjson':
+        def generate():
+            for page in pages:
+                yield json.dumps(page.to_json()) + '\n'
+        mimetype = 'application/x-ndjson'
+    elif fmt == 'json':
+        def generate():
+            yield '['
+            for i, page in enumerate(pages):
+                yield (',' if i > 0 else '') + json.dumps(page.to_json())
+            yield ']'
+        mimetype = 'application/json'
+    else:
+        raise ValueError("The stream format has to be one of ['ndjson', 'json'], found '%s'." % fmt)
+
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
 @api.route('/pages', defaults={'context': None}, methods=['GET'])
 @api.route('/<string:context>/pages', methods=['GET'])
 def get_pages(context):
     """
     Return all pages from the current context. The context can be overwritten by request GET argument `context`.
     If no session is registered and no GET argument is set, the global `meta` context will be used.
+    If the GET argument `stream` is set to 'ndjson' or 'json', all pages are streamed using the scroll API
+    instead. This should be used for exports of large contexts.
+    If the GET argument `cursor` or `page_size` is set, only one page of pages is returned, along with the
+    cursor pointing to the next page.
+    The GET argument `fields` is a comma separated list of fields to be returned. Fields prefixed by '-'
+    are excluded, e.g. `fields=-location,-supplemetary`.
 
     :param context: string, name of the context where the documents shall be fetched from
     :return: JSON of all pages
     """
     # set the current search context
     if context is None:
-        context  = invoke_context()
-        print('invoked context: %s' % context)
+        context = invoke_context()
+
+    fields = request.args.get('fields')
+
+    # stream all pages
+    fmt = request.args.get('stream')
+    if fmt is not None:
+        if fmt not in ('ndjson', 'json'):
+            return jsonify(dict(error=dict(status=400, message="stream has to be one of ['ndjson', 'json']")))
+        return stream_pages(Page.scan(index=context, fields=fields), fmt=fmt)
+
+    # cursor based pagination
+    if 'cursor' in request.args or 'page_size' in request.args:
+        try:
+            pages, cursor = Page.iter_pages(
+                index=context,
+                page_size=request.args.get('page_size', 50),
+                cursor=request.args.get('cursor'),
+                fields=fields
+            )
+        except ValueError as e:
+            return jsonify(dict(error=dict(status=400, message=str(e))))
+        return jsonify(dict(pages=[page.to_json() for page in pages], cursor=cursor))
+
     limit = request.args.get('limit', None)
-    return jsonify([page.to_json() for page in Page.all(index=context, limit=limit)])
+    return jsonify([page.to_json() for page in Page.all(index=context, limit=limit, fields=fields)])
+
+
+@api.route('/search', defaults={'context': None}, methods=['GET'])
+@api.route('/<string:context>/search', methods=['GET'])
+def search_pages(context):
+    """
+    Full text search on all pages of the current context, see `Page.fulltext`.
+
+    GET arguments
+    -------------
+     * q:               the query string
+     * size:            number of hits, default 20
+     * offset:          number of hits to skip, default 0
+     * fields:          comma separated list of fields to be returned, '-' prefixed fields are excluded
+     * timeout:         ES time unit like '500ms', default '1s'
+     * terminate_after: maximum number of documents collected per shard
+
+    :param context: string, name of the context where the documents shall be searched
+    :return: JSON of the hits, including the score and highlights
+    """
+    if context is None:
+        context = invoke_context()
+
+    q = request.args.get('q')
+    if q is None or q.strip() == '':
+        return jsonify(dict(error=dict(status=400, message='The query string q is missing.')))
+    result = Page.fulltext(
+        q,
+        index=context,
+        size=request.args.get('size', 20, type=int),
+        offset=request.args.get('offset', 0, type=int),
+        source=request.args.get('fields'),
+        timeout=request.args.get('timeout', '1s'),
+        terminate_after=request.args.get('terminate_after', None, type=int)
+    )
+
+    total = result.hits.total
+    return jsonify(dict(
+        total=total['value'] if isinstance(total, dict) else total,
+        took=result.took,
+        timed_out=result.timed_out,
+        terminated_early=result.to_dict().get('terminated_early', False),
+        hits=[dict(
+            page=Page.from_hit(hit).to_json(),
+            score=hit.meta.score,
+            highlight=hit.meta.highlight.to_dict() if hasattr(hit.meta, 'highlight') else dict()
+        ) for hit in result]
+    ))
 
 
 @api.route('/page/<string:id>', defaults={'context': None}, methods=['GET'])
@@ -52,7 +172,7 @@ def get_pages(context):
 def get_page(id, context):
     """
     Return the page of `id` from the current search context. The context can be overwritte by
-    request GET arugment `context`.
+    request GET arugment `context`. The GET argument `fields` can be used to filter the returned fields.
 
     :param id: string, id of the requested Page
     :param context: string, name of the context where the document shall be fetched from
@@ -60,10 +180,38 @@ def get_page(id, context):
     """
     if context is None:
         context = invoke_context()
-    page = Page.get(id, index=context)
+    page = Page.get(id, index=context, fields=request.args.get('fields'))
     return jsonify(page.to_json())
 
 
+@api.route('/pages/_mget', defaults={'context': None}, methods=['POST'])
+@api.route('/<string:context>/pages/_mget', methods=['POST'])
+def mget_pages(context):
+    """
+    Return many pages by id from the current context in one request. The ids are passed as JSON,
+    either as list or as object with an `ids` list. The GET argument `fields` can be used to filter
+    the returned fields.
+
+    :param context: string, name of the context where the documents shall be fetched from
+    :return: JSON of the requested Pages in the order of the ids, null for missing pages, and the missing ids
+    """
+    if context is None:
+        context = invoke_context()
+
+    ids = request.json
+    if isinstance(ids, dict):
+        ids = ids.get('ids')
+    if not isinstance(ids, list):
+        return jsonify(dict(error=dict(status=400, message='The ids have to be passed as list.')))
+
+    pages = Page.get_many(ids, context=context, fields=request.args.get('fields'))
+
+    return jsonify(dict(
+        pages=[page.to_json() if page is not None else None for page in pages],
+        missing=[str(id) for id, page in zip(ids, pages) if page is None]
+    ))
+
+
 @api.route('/page', defaults={'id': None, 'context': None}, methods=['PUT'])
 @api.route('/page/<string:id>', defaults={'context': None}, methods=['PUT'])
 @api.route('/<string:context>/page', defaults={'id': None}, methods=['PUT'])
@@ -91,18 +239,87 @@ def new_page(id, context):
     if context is None:
         context = invoke_context()
     try:
-        index = Context.by_name(name=context).index_name
+        # write through the alias, the cached Context might still name the index of an older version
+        index = Context.by_name(name=context).name
     except HTTPError as e:
         return jsonify(dict(error=dict(status=e.errno, message=e.strerror)))
-    page_dict['meta']['index'] = index
 
-    # build the page
+    # build the page, the index has to be set on the meta object, the DocType default would win otherwise
     page = Page(**page_dict)
-    page.create()
+    page.meta.index = index
+    try:
+        page.create()
+    except TransportError as e:
+        response = write_blocked(e)
+        if response is None:
+            raise
+        return response
 
     return jsonify(page.to_json())
 
 
+@api.route('/pages/_bulk', defaults={'context': None}, methods=['PUT'])
+@api.route('/<string:context>/pages/_bulk', methods=['PUT'])
+def bulk_pages(context):
+    """
+    Bulk create Pages
+    -----------------
+    Create many new metadata pages in the current context at once. The request body has to be
+    newline delimited JSON (NDJSON), with one Page per line. The context is resolved only once and
+    the request body is read line by line and sent to Elasticsearch in chunks, therefore large
+    harvests can be loaded without holding them in memory.
+    The chunk size can be set by the GET argument `chunk_size` (default 500).
+    Lines that are not a valid JSON object are reported as error with their line number.
+
+    Parameters
+    ----------
+    :param context: string, name of the context where the documents shall be indexed
+    :return: JSON summary of the indexed pages and a list of all errors
+    """
+    if context is None:
+        context = invoke_context()
+    try:
+        # write through the alias, the cached Context might still name the index of an older version
+        index = Context.by_name(name=context).name
+    except HTTPError as e:
+        return jsonify(dict(error=dict(status=e.errno, message=e.strerror)))
+
+    chunk_size = request.args.get('chunk_size', 500, type=int)
+    if chunk_size < 1:
+        return jsonify(dict(error=dict(status=400, message='The chunk_size has to be at least 1.')))
+
+    errors = []
+
+    def read_lines():
+        for lineno, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError as e:
+                errors.append(dict(line=lineno, status=400, error=str(e)))
+                continue
+            if not isinstance(doc, dict):
+                errors.append(dict(line=lineno, status=400, error='The line has to be a JSON object.'))
+                continue
+            yield doc
+
+    indexed = 0
+    for ok, item in Page.bulk_create(read_lines(), index=index, chunk_size=chunk_size):
+        if ok:
+            indexed += 1
+        else:
+            result = item.get('index', item)
+            errors.append(dict(id=result.get('_id'), status=result.get('status'), error=result.get('error')))
+
+    return jsonify(dict(
+        acknowleged=len(errors) == 0,
+        indexed=indexed,
+        errors=errors
+    ))
+
+
 @api.route('/page/<string:id>', defaults={'context': None}, methods=['POST'])
 @api.route('/<string:context>/page/<string:id>', methods=['POST'])
 def edit_page(id, context):
@@ -122,7 +339,13 @@ def edit_page(id, context):
     """
     # get the page and update
     page = Page.get(id, context=context)
-    page.update(**request.json)
+    try:
+        page.update(**request.json)
+    except TransportError as e:
+        response = write_blocked(e)
+        if response is None:
+            raise
+        return response
 
     # return the JSON
     return jsonify(page.to_json())
@@ -141,7 +364,13 @@ def delete_page(id, context):
     :return: acknowlege message as JSON
     """
     page = Page.get(id, context=context)
-    page.delete()
+    try:
+        page.delete()
+    except TransportError as e:
+        response = write_blocked(e)
+        if response is None:
+            raise
+        return response
 
     return jsonify(dict(
         acknowleged=True,
@@ -1,14 +1,27 @@
-from flask import jsonify
+from flask import jsonify, Response
 
 from metacatalog2.api import api
-from metacatalog2.elastic import es
+from metacatalog2.models import Context, Page
+from metacatalog2 import metrics, aio
 
 
 @api.route('/info')
-def info():
+async def info():
+    # both requests are independent, send them at once
+    es_info, health = await aio.info()
+
     return jsonify({
-        'elasticsearch_info': es.info(),
-        'cluster_health': es.cat.health()
+        'elasticsearch_info': es_info,
+        'cluster_health': health,
+        'context_cache': Context.cache.stats(),
+        'aggregation_cache': Page.aggregation_cache.stats(),
+        'page_get_paths': dict(Page.get_paths)
     })
 
 
+@api.route('/metrics')
+def get_metrics():
+    """
+    Return the request, Elasticsearch and cache metrics of this process in the Prometheus text format.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
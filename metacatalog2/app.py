@@ -1,11 +1,13 @@
 import os
 
+import click
 from flask import Flask
 
 from metacatalog2.config import config
 from metacatalog2.main import main
 from metacatalog2.api import api
 from metacatalog2.elastic import es
+from metacatalog2 import metrics
 
 # load the flask configuration as specified in the environment variables, or use the default
 conf = config[os.environ.get('FLASK_CONFIG', 'default')]
@@ -19,6 +21,9 @@ conf.init_app(app)
 app.register_blueprint(main)
 app.register_blueprint(api, url_prefix='/api')
 
+# record the request metrics
+metrics.init_app(app)
+
 # define a custom shell context
 @app.shell_context_processor
 def make_shell_context():
@@ -30,5 +35,64 @@ def make_shell_context():
     )
 
 
+# bulk load metadata dumps from the command line
+@app.cli.command()
+@click.argument('path')
+@click.option('--context', default='meta', help='name of the context where the pages shall be indexed')
+@click.option('--format', 'fmt', default=None, help='json, ndjson or csv. Guessed from the extension by default')
+@click.option('--processes', default=None, type=int, help='number of worker processes for the conversion')
+@click.option('--threads', default=4, type=int, help='number of threads sending bulk requests')
+@click.option('--chunk-size', default=500, type=int, help='number of documents per bulk request')
+def load(path, context, fmt, processes, threads, chunk_size):
+    """Load a JSON, NDJSON or CSV metadata dump into a context."""
+    from metacatalog2.util.loader import load as load_dump
+    indexed, errors = load_dump(
+        path,
+        context=context,
+        fmt=fmt,
+        processes=processes,
+        threads=threads,
+        chunk_size=chunk_size
+    )
+    for error in errors:
+        click.echo('[ERROR]: %s' % error, err=True)
+    click.echo('Indexed %d pages into %s. %d errors.' % (indexed, context, len(errors)))
+
+
+# benchmark the API against an in-memory Elasticsearch
+@app.cli.command()
+@click.option('--size', 'sizes', multiple=True, type=int, default=[10000], help='number of synthetic pages, can be repeated')
+@click.option('--requests', default=500, type=int, help='number of requests per scenario')
+@click.option('--scenario', 'only', multiple=True, help='run only this scenario, can be repeated')
+@click.option('--seed', default=42, type=int, help='seed of the synthetic dataset')
+@click.option('--output', default=None, help='write the results to this JSON file')
+@click.option('--baseline', default=None, help='JSON file of an earlier run, regressions exit with status 1')
+@click.option('--tolerance', default=0.2, type=float, help='accepted relative change compared to the baseline')
+def bench(sizes, requests, only, seed, output, baseline, tolerance):
+    """Benchmark the API offline against synthetic datasets."""
+    import json
+    from metacatalog2.util import benchmark
+
+    click.echo(benchmark.HEADER)
+    results = benchmark.run(
+        sizes=sizes,
+        requests=requests,
+        seed=seed,
+        only=list(only) if len(only) > 0 else None,
+        report=lambda result: click.echo(benchmark.format_result(result))
+    )
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = benchmark.compare(results, baseline, tolerance=tolerance)
+        for regression in regressions:
+            click.echo('[REGRESSION]: %s' % regression, err=True)
+        if len(regressions) > 0:
+            raise SystemExit(1)
+
+
 if __name__ == '__main__':
     app.run()
@@ -5,6 +5,9 @@ import os
 
 
 class Config:
+    # The Elasticsearch client is built on import of metacatalog2.elastic, before any app exists.
+    # Therefore, ELASTIC_BACKEND, ELASTIC_POOL_SIZE, ELASTIC_TIMEOUT, ELASTIC_RETRIES and
+    # ELASTIC_SLOW_QUERY_MS are read from the environment only, see metacatalog2.elastic
     ELASTIC_NODE = os.environ.get('ELASTIC_NODE', 'http://localhost:9200')
 
     @staticmethod
@@ -1,30 +1,274 @@
 import os
+import json
+import importlib
+import base64
+import time
+from threading import Lock
+from itertools import islice
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from elasticsearch import Elasticsearch
 from elasticsearch_dsl import Search
 from elasticsearch_dsl import DocType as ElasticDocType
 
-new_elastic = lambda: Elasticsearch(os.environ.get('ELASTIC_NODE', 'http://localhost:9200'))
+# default value of the index.max_result_window setting
+MAX_RESULT_WINDOW = 10000
+
+# Connection settings, shared by the elasticsearch client and the HTTP session. They are environment
+# variables only, as the client is built on import and not from the flask app config.
+ELASTIC_NODE = os.environ.get('ELASTIC_NODE', 'http://localhost:9200')
+ELASTIC_POOL_SIZE = int(os.environ.get('ELASTIC_POOL_SIZE', 10))
+ELASTIC_TIMEOUT = float(os.environ.get('ELASTIC_TIMEOUT', 30))
+ELASTIC_RETRIES = int(os.environ.get('ELASTIC_RETRIES', 3))
+
+# Elasticsearch calls slower than this (in milliseconds) are logged, see `metacatalog2.metrics`
+ELASTIC_SLOW_QUERY_MS = float(os.environ.get('ELASTIC_SLOW_QUERY_MS', 500))
+
+# storage backend of all models, the name of a backend in BACKENDS or the dotted path of a connection class
+ELASTIC_BACKEND = os.environ.get('ELASTIC_BACKEND', 'elasticsearch')
+
+# The backends are connection classes of the elasticsearch client, thus the client, the DocTypes,
+# elasticsearch_dsl and the helpers work unchanged on each backend.
+BACKENDS = {
+    'elasticsearch': 'elasticsearch.Urllib3HttpConnection',
+    'memory': 'metacatalog2.util.memory.MemoryConnection'
+}
+
+
+def backend_connection(backend=ELASTIC_BACKEND):
+    """
+    Return the connection class of a storage backend.
+
+    :param backend: string, name of a backend in BACKENDS or the dotted path of an
+                    `elasticsearch.Connection` subclass
+    :return: the connection class
+    """
+    path = BACKENDS.get(backend, backend)
+    module, _, name = path.rpartition('.')
+    if module == '':
+        raise ValueError("The backend has to be one of %s or a dotted path, found '%s'." % (list(BACKENDS), backend))
+    return getattr(importlib.import_module(module), name)
+
+
+new_elastic = lambda backend=ELASTIC_BACKEND: Elasticsearch(
+    ELASTIC_NODE,
+    connection_class=backend_connection(backend),
+    maxsize=ELASTIC_POOL_SIZE,
+    timeout=ELASTIC_TIMEOUT,
+    max_retries=ELASTIC_RETRIES,
+    retry_on_timeout=True
+)
 es = new_elastic()
 
+
+def new_session():
+    """
+    Build a `requests.Session` with a keep-alive connection pool of the same size as the elasticsearch
+    client. This session should be used for all raw HTTP requests to the Elasticsearch node, that
+    cannot be sent through the client, like the proxy in `metacatalog2.main.views`.
+
+    :return: `requests.Session`
+    """
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=ELASTIC_POOL_SIZE,
+        max_retries=Retry(total=ELASTIC_RETRIES, backoff_factor=0.1)
+    )
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    return s
+
+
+session = new_session()
+
 # build a Search object
 search = Search(using=es)
 
 
+def encode_cursor(sort_values):
+    """
+    Encode the sort values of the last hit of a result page into an opaque, URL-safe cursor token.
+
+    :param sort_values: list, the `hit.meta.sort` values
+    :return: string, the cursor token
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(sort_values)).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor token created by `encode_cursor` back into the list of sort values.
+
+    :param cursor: string, the cursor token
+    :return: list of sort values, to be used as `search_after`
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        raise ValueError('The cursor "%s" is not valid.' % cursor)
+
+
+def source_filter(fields):
+    """
+    Parse a list of field names into a _source filter. Fields prefixed by '-' are excluded,
+    all other fields are included. If no field is included, all fields but the excluded ones
+    are returned by Elasticsearch.
+
+    :param fields: comma separated string or list of field names, or None
+    :return: dict of includes and excludes, None if :param fields: is None
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = [f.strip() for f in fields if f.strip() != '']
+
+    source = dict()
+    includes = [f for f in fields if not f.startswith('-')]
+    excludes = [f[1:] for f in fields if f.startswith('-')]
+    if len(includes) > 0:
+        source['includes'] = includes
+    if len(excludes) > 0:
+        source['excludes'] = excludes
+    return source
+
+
+def source_params(fields):
+    """
+    Build the _source filter of :param fields: as URL parameters for the get and mget APIs.
+
+    :param fields: comma separated string or list of field names, or None
+    :return: dict of URL parameters
+    """
+    source = source_filter(fields)
+    params = dict()
+    if source is not None:
+        if 'includes' in source:
+            params['_source_include'] = ','.join(source['includes'])
+        if 'excludes' in source:
+            params['_source_exclude'] = ','.join(source['excludes'])
+    return params
+
+
+class AliasMap:
+    """
+    Alias map
+    ---------
+
+    In-process map of all aliases to their concrete indices, loaded from the `_alias` API.
+    The map is reloaded on the first lookup after it was invalidated, or after :param ttl: seconds.
+    """
+    def __init__(self, using=None, ttl=60):
+        self.using = using
+        self.ttl = ttl
+        self._aliases = None
+        self._indices = None
+        self._expires = 0
+        self._lock = Lock()
+
+    def refresh(self):
+        result = (self.using or es).indices.get_alias()
+        aliases = dict()
+        for index, body in result.items():
+            for alias in body.get('aliases', dict()).keys():
+                aliases.setdefault(alias, []).append(index)
+        with self._lock:
+            self._aliases = aliases
+            self._indices = set(result.keys())
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0
+
+    def resolve(self, name):
+        """
+        Resolve the index or alias name into the list of concrete indices.
+
+        :param name: string, index or alias name, can be a comma separated list
+        :return: list of concrete indices, or None if any name is unknown
+        """
+        if self._expires < time.monotonic():
+            self.refresh()
+
+        indices = []
+        for n in name.split(','):
+            if n in self._indices:
+                indices.append(n)
+            elif n in self._aliases:
+                indices.extend(self._aliases[n])
+            else:
+                return None
+        return sorted(set(indices))
+
+    def is_index(self, name):
+        """
+        Return True, if the name is a concrete index and not an alias.
+
+        :param name: string, index or alias name
+        :return: bool
+        """
+        if self._expires < time.monotonic():
+            self.refresh()
+        return name in self._indices
+
+
+# alias -> concrete indices, invalidated by the Context alias management
+alias_map = AliasMap(using=es)
+
+
+def apply_source_filter(doc, fields):
+    """
+    Apply the _source filter of :param fields: to the top level keys of the document dict.
+    This is used for documents, that were not filtered by Elasticsearch.
+
+    :param doc: dict, the document
+    :param fields: comma separated string or list of field names, or None
+    :return: dict, the filtered document
+    """
+    source = source_filter(fields)
+    if source is None:
+        return doc
+    includes = set(f.split('.')[0] for f in source.get('includes', []))
+    excludes = set(source.get('excludes', []))
+    return {k: v for k, v in doc.items() if (len(includes) == 0 or k in includes) and k not in excludes}
+
+
 # build a custom DocType class, which is extended by some useful fuctions
 class DocType(ElasticDocType):
+    # stable sort order used for cursor based pagination, has to end on a unique field. Sorting on _id
+    # loads the ids into the fielddata, thus classes with large indices should sort on a keyword field
+    _cursor_sort = ('_id', )
+
+    @classmethod
+    def from_hit(cls, hit, fields=None):
+        """
+        Create a new instance of the calling class `cls` from a given `elasticsearch_dsl.hit.Hit`.
+        Only the document body, the index and the id are transferred.
+
+        :param hit: `elasticsearch_dsl.hit.Hit`
+        :param fields: list of fields to be transferred, see `source_filter`. None for all fields.
+        :return: instance of `cls`
+        """
+        doc = cls(**apply_source_filter(hit.to_dict(), fields))
+        doc.meta.index = hit.meta.index
+        doc.meta.id = hit.meta.id
+        return doc
+
     @classmethod
-    def all(cls, as_hit=False, index=None, limit=None):
+    def all(cls, as_hit=False, index=None, limit=None, fields=None):
         """
         Return all documents
         --------------------
 
         Return all instances of this DocType objects from the index.
-        Note: it does by default set the hit return range to 0:total_hits, that might cause some
-        traffic for large indices.
-        The query is implemented by the `elasticsearch_dsl.Search.execute` method with caching activated.
-        Nevertheless, the search object is re-created on every call, therefore I am not sure if the
-        hits are actually cached.
+        All documents are fetched by a single search request and the instances are built directly
+        from the hits. If the index holds more documents than the result window of Elasticsearch
+        (:data:`MAX_RESULT_WINDOW`), the documents are collected using `DocType.scan` instead.
+        For large indices, `DocType.scan` or `DocType.iter_pages` should be used directly.
         By default, the hits will be converted into the calling clss `cls`, if as_hit is True, they will
         be returned as search hit objects (including the score of 1).
 
@@ -34,16 +278,21 @@ class DocType(ElasticDocType):
                 `elasticsearch_dsl.DocType`.
         :param index: The index to be used for searching. Can overwrite the default in inheriting classes.
         :param limit: integer, limit the output, similar to SQL LIMIT.
+        :param fields: list of fields to be fetched, see `source_filter`. None for whole documents.
         :return: list, all documents in the index
         """
         s = cls.search()
+        if fields is not None:
+            s = s.source(**source_filter(fields))
 
         # overwrite the default result range of 10 hits
         if limit is None or limit == 'max':
-            limit = s.count()
+            limit = None
+            size = MAX_RESULT_WINDOW
         else:
             limit = int(limit)
-        s = s[0:limit]
+            size = min(limit, MAX_RESULT_WINDOW)
+        s = s[0:size]
 
         if index is not None:
             # empty the index ist
@@ -52,10 +301,101 @@ class DocType(ElasticDocType):
             s = s.index(index.split(','))
 
         # execute a empty search on the context document type
+        response = s.execute()
+        total = response.hits.total
+        if isinstance(total, dict):
+            total = total['value']
+
+        # the result window was exceeded, scroll through all documents
+        if total > size and (limit is None or limit > size):
+            return list(islice(cls.scan(index=index, as_hit=as_hit, fields=fields), limit))
+
+        if as_hit:
+            return list(response)
+        else:
+            return [cls.from_hit(hit) for hit in response]
+
+    @classmethod
+    def scan(cls, index=None, as_hit=False, fields=None, **kwargs):
+        """
+        Iterate all documents
+        ---------------------
+
+        Yield all instances of this DocType from the index, using the scroll API under the hood.
+        In contrast to `DocType.all`, the hits are never collected into a list and the result window
+        of Elasticsearch does not apply. Therefore, the memory consumption is constant, regardless
+        of the index size. The order of the documents is not defined.
+
+        Parameters
+        ----------
+        :param index: The index to be used for searching. Can overwrite the default in inheriting classes.
+        :param as_hit: bool, if True the instances will be yielded as `elasticsearch_dsl.response.hit.Hit`,
+                else they are built by `cls.from_hit`.
+        :param fields: list of fields to be fetched, see `source_filter`. None for whole documents.
+        :param kwargs: will be passed to `elasticsearch_dsl.Search.params`, e.g. `scroll` or `size`.
+        :return: generator of all documents in the index
+        """
+        s = cls.search()
+        if fields is not None:
+            s = s.source(**source_filter(fields))
+
+        if index is not None:
+            s = s.index()
+            s = s.index(index.split(','))
+
+        if len(kwargs) > 0:
+            s = s.params(**kwargs)
+
+        for hit in s.scan():
+            yield hit if as_hit else cls.from_hit(hit)
+
+    @classmethod
+    def iter_pages(cls, index=None, page_size=50, cursor=None, as_hit=False, fields=None):
+        """
+        Return one result page
+        ----------------------
+
+        Return one page of documents, starting after the given cursor. The documents are sorted by
+        the `_cursor_sort` fields of the class and fetched using `search_after`. Therefore, the
+        cost of a deep page is the same as the cost of the first one.
+        Pass the returned cursor to the next call to get the following page. If there are no more
+        documents, the returned cursor is None.
+
+        Parameters
+        ----------
+        :param index: The index to be used for searching. Can overwrite the default in inheriting classes.
+        :param page_size: integer, number of documents per page, at least 1
+        :param cursor: string, opaque cursor token as returned by the last call. None for the first page.
+        :param as_hit: bool, if True the instances will be returned as `elasticsearch_dsl.response.hit.Hit`
+        :param fields: list of fields to be fetched, see `source_filter`. None for whole documents.
+        :return: tuple of (list of documents, next cursor)
+        """
+        page_size = int(page_size)
+        if page_size < 1:
+            raise ValueError('The page_size has to be at least 1.')
+        s = cls.search().sort(*cls._cursor_sort)[0:page_size]
+        if fields is not None:
+            s = s.source(**source_filter(fields))
+
+        if index is not None:
+            s = s.index()
+            s = s.index(index.split(','))
+
+        if cursor is not None and cursor != '':
+            s = s.extra(search_after=decode_cursor(cursor))
+
+        hits = list(s.execute())
+
+        # build the next cursor from the last hit
+        if len(hits) < page_size:
+            next_cursor = None
+        else:
+            next_cursor = encode_cursor(hits[-1].meta.sort)
+
         if as_hit:
-            return list(s)
+            return hits, next_cursor
         else:
-            return cls.mget([hit.meta.id for hit in s.execute()])
+            return [cls.from_hit(hit) for hit in hits], next_cursor
 
     def to_json(self):
         """
@@ -1,8 +1,10 @@
+import json
+
 from flask import render_template, request, Response
-import requests
+from elasticsearch import TransportError
 
 from metacatalog2.main import main
-from metacatalog2.elastic import es
+from metacatalog2.elastic import es, session, ELASTIC_TIMEOUT
 
 
 @main.route('/')
@@ -15,22 +17,73 @@ def add():
     return render_template('add_form.html')
 
 
+# chunk size in bytes used to stream the proxied responses
+PROXY_CHUNK_SIZE = 64 * 1024
+
+# headers forwarded between the client and elasticsearch by the proxy. Elasticsearch sends no ETag or
+# Last-Modified header, thus conditional requests are not forwarded.
+PROXY_REQUEST_HEADERS = ('Accept', 'Accept-Encoding')
+PROXY_RESPONSE_HEADERS = ('Content-Encoding', )
+
+
 # expose the GET and only the GET elasticsearch endpoint
 @main.route('/es/<path:uri>', methods=['GET'])
 def elasticsearch(uri):
     """
-    send any request on host/es/URI to localhost:9200/URI and fetch the result
+    send any request on host/es/URI to localhost:9200/URI and stream the result
+
+    The response is streamed chunk by chunk to the client, without reading it into memory. The
+    status code, content type and content encoding of Elasticsearch are preserved.
 
     :param uri: The API request to elasticsearch
-    :return: the elasticsearch response as JSON
+    :return: the elasticsearch response
     """
+    host = es.transport.get_connection().host
+    if not host.startswith('http'):
+        return _backend_request(uri)
+
     params = request.query_string.decode()
     full_url = '%s/%s%s' % (
-        es.transport.get_connection().host,
+        host,
         uri,
         '?%s' % params if len(params) > 0 else ''
     )
-    print('forwarding to %s' % full_url)
 
-    result = requests.get(full_url)
-    return Response(result.content, mimetype='text/plain')
\ No newline at end of file
+    headers = {k: request.headers[k] for k in PROXY_REQUEST_HEADERS if k in request.headers}
+    result = session.get(full_url, headers=headers, stream=True, timeout=ELASTIC_TIMEOUT)
+
+    def generate():
+        try:
+            # read the raw stream, the content is passed through with its original encoding
+            for chunk in result.raw.stream(PROXY_CHUNK_SIZE, decode_content=False):
+                yield chunk
+        finally:
+            result.close()
+
+    response = Response(
+        generate(),
+        status=result.status_code,
+        content_type=result.headers.get('Content-Type', 'text/plain')
+    )
+    for k in PROXY_RESPONSE_HEADERS:
+        if k in result.headers:
+            response.headers[k] = result.headers[k]
+    return response
+
+
+def _backend_request(uri):
+    """
+    Answer a proxy request on a storage backend without HTTP node (e.g. the in-memory store) through
+    the transport of the elasticsearch client. The response is not streamed.
+
+    :param uri: The API request to elasticsearch
+    :return: the backend response
+    """
+    try:
+        status, data = 200, es.transport.perform_request('GET', '/' + uri, params=request.args.to_dict())
+    except TransportError as e:
+        status, data = e.status_code if isinstance(e.status_code, int) else 500, e.info
+
+    if isinstance(data, str):
+        return Response(data, status=status, content_type='text/plain')
+    return Response(json.dumps(data), status=status, content_type='application/json')
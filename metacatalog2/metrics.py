@@ -0,0 +1,256 @@
+"""
+Performance metrics
+-------------------
+
+In-process request metrics of the Flask application: the latency, response size and the number
+and time of Elasticsearch calls per endpoint, as well as the cache statistics of the models.
+The metrics are collected by request hooks registered by `init_app` and a wrapper around the
+transport of the shared `es` client. They are rendered in the Prometheus text format by `render`.
+Each response carries a `Server-Timing` header with the request and Elasticsearch durations.
+
+Profiling can be requested per request by the `X-Profile` header or the `profile` GET argument.
+Then all searches are sent with `profile: true` and the query DSL and profiles are attached
+to the JSON response. Streamed responses can not be profiled, as their body is produced after the
+response was sent. Elasticsearch calls slower than `ELASTIC_SLOW_QUERY_MS` milliseconds are
+logged to the `metacatalog2.slowlog` logger.
+
+As the metrics live in the process, each worker process reports its own metrics.
+"""
+import json
+import time
+import logging
+from collections import defaultdict
+from threading import Lock
+
+from flask import g, request, has_request_context
+
+from metacatalog2.elastic import es, ELASTIC_SLOW_QUERY_MS
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# the calls of a request can run in several threads (see metacatalog2.aio)
+_request_lock = Lock()
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, as used by Prometheus.
+    """
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    self.counts[i] += 1
+
+    def render(self, name, labels):
+        lines = []
+        for le, count in zip(self.buckets, self.counts):
+            lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, le, count))
+        lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, self.count))
+        lines.append('%s_sum{%s} %.6f' % (name, labels, self.sum))
+        lines.append('%s_count{%s} %d' % (name, labels, self.count))
+        return lines
+
+
+# endpoint -> metric
+request_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+response_size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+es_calls = defaultdict(lambda: Histogram(COUNT_BUCKETS))
+es_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+responses = defaultdict(int)
+
+# slow query log, one JSON record per slow Elasticsearch call
+slowlog = logging.getLogger('metacatalog2.slowlog')
+
+# all Elasticsearch calls, also outside of requests
+es_latency = Histogram(LATENCY_BUCKETS)
+
+
+def _instrument_transport(transport):
+    """
+    Wrap the `perform_request` method of the elasticsearch transport to record the number
+    and duration of all Elasticsearch calls. Calls slower than `ELASTIC_SLOW_QUERY_MS` are
+    written to the slow query log. If profiling is requested for the current request, the
+    search bodies are sent with `profile: true` and the query and profile are collected.
+    """
+    perform_request = transport.perform_request
+    if getattr(perform_request, '_instrumented', False):
+        return
+
+    def instrumented(method, url, headers=None, params=None, body=None):
+        profile = profiling()
+        if profile and url.endswith('/_search') and isinstance(body, dict):
+            body = dict(body, profile=True)
+
+        start = time.perf_counter()
+        result = None
+        try:
+            result = perform_request(method, url, headers=headers, params=params, body=body)
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            es_latency.observe(duration)
+            if has_request_context() and hasattr(g, 'es_calls'):
+                with _request_lock:
+                    g.es_calls += 1
+                    g.es_time += duration
+
+            if profile:
+                g.profile.append(dict(
+                    method=method,
+                    url=url,
+                    params=params,
+                    query=body,
+                    duration_ms=duration * 1000,
+                    took=result.get('took') if isinstance(result, dict) else None,
+                    profile=result.get('profile') if isinstance(result, dict) else None
+                ))
+
+            if duration * 1000 >= ELASTIC_SLOW_QUERY_MS:
+                slowlog.warning(json.dumps(dict(
+                    method=method,
+                    url=url,
+                    params=params,
+                    endpoint=request.endpoint if has_request_context() else None,
+                    duration_ms=round(duration * 1000, 1),
+                    took=result.get('took') if isinstance(result, dict) else None,
+                    query=body
+                ), default=str))
+
+    instrumented._instrumented = True
+    transport.perform_request = instrumented
+
+
+def profiling():
+    """
+    Return True, if profiling was requested for the current request. Caches should be bypassed
+    then, so that the queries are actually sent to Elasticsearch.
+    """
+    return has_request_context() and g.get('profile') is not None
+
+
+def _before_request():
+    g.request_start = time.perf_counter()
+    g.es_calls = 0
+    g.es_time = 0.
+
+    # opt-in profiling
+    flag = request.headers.get('X-Profile', request.args.get('profile', 'false'))
+    if flag.lower() not in ('false', '0', ''):
+        g.profile = []
+
+
+def _attach_profile(response):
+    """
+    Attach the collected queries and profiles to a JSON response. Objects get a `profile` key,
+    all other JSON bodies are wrapped into {"data": ..., "profile": ...}. Other bodies only get the
+    number of profiled queries in the `X-Profile-Queries` header.
+    Streamed responses are not profiled, their queries are sent while the body is consumed.
+    """
+    if response.is_streamed:
+        # stop profiling, the searches of the stream would be profiled for nothing
+        g.profile = None
+        return response
+    if not response.is_json:
+        response.headers['X-Profile-Queries'] = str(len(g.profile))
+        return response
+
+    data = response.get_json()
+    if isinstance(data, dict):
+        data['profile'] = g.profile
+    else:
+        data = dict(data=data, profile=g.profile)
+    response.set_data(json.dumps(data, default=str))
+    return response
+
+
+def _after_request(response):
+    if not hasattr(g, 'request_start'):
+        return response
+    duration = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unknown'
+
+    if g.get('profile') is not None:
+        response = _attach_profile(response)
+
+    request_latency[endpoint].observe(duration)
+    es_calls[endpoint].observe(g.es_calls)
+    es_time[endpoint].observe(g.es_time)
+    responses[(endpoint, response.status_code)] += 1
+
+    # streamed responses have no known size
+    if not response.is_streamed:
+        response_size[endpoint].observe(response.calculate_content_length() or 0)
+
+    response.headers['Server-Timing'] = 'app;dur=%.1f, es;dur=%.1f;desc="%d calls"' % (
+        duration * 1000, g.es_time * 1000, g.es_calls
+    )
+    return response
+
+
+def init_app(app, using=None):
+    """
+    Register the request hooks on the app and instrument the elasticsearch client.
+
+    :param app: `flask.Flask`
+    :param using: `elasticsearch.Elasticsearch` instance to instrument, defaults to the shared client
+    """
+    _instrument_transport((using or es).transport)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def render():
+    """
+    Render all metrics in the Prometheus text format.
+
+    :return: string
+    """
+    from metacatalog2.models import Context, Page
+    lines = []
+
+    def histograms(name, help, metrics):
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s histogram' % name)
+        for endpoint, hist in sorted(metrics.items()):
+            lines.extend(hist.render(name, 'endpoint="%s"' % endpoint))
+
+    histograms('metacatalog_request_duration_seconds', 'Request latency by endpoint.', request_latency)
+    histograms('metacatalog_response_size_bytes', 'Response size by endpoint, without streamed responses.',
+               response_size)
+    histograms('metacatalog_request_es_calls', 'Elasticsearch calls per request by endpoint.', es_calls)
+    histograms('metacatalog_request_es_duration_seconds', 'Elasticsearch time per request by endpoint.', es_time)
+
+    lines.append('# HELP metacatalog_es_duration_seconds Latency of all Elasticsearch calls.')
+    lines.append('# TYPE metacatalog_es_duration_seconds histogram')
+    lines.extend(es_latency.render('metacatalog_es_duration_seconds', 'client="default"'))
+
+    lines.append('# HELP metacatalog_responses_total Responses by endpoint and status.')
+    lines.append('# TYPE metacatalog_responses_total counter')
+    for (endpoint, status), n in sorted(responses.items()):
+        lines.append('metacatalog_responses_total{endpoint="%s",status="%d"} %d' % (endpoint, status, n))
+
+    lines.append('# HELP metacatalog_cache_requests_total Cache lookups by cache and result.')
+    lines.append('# TYPE metacatalog_cache_requests_total counter')
+    for name, cache in (('context', Context.cache), ('aggregation', Page.aggregation_cache)):
+        stats = cache.stats()
+        lines.append('metacatalog_cache_requests_total{cache="%s",result="hit"} %d' % (name, stats['hits']))
+        lines.append('metacatalog_cache_requests_total{cache="%s",result="miss"} %d' % (name, stats['misses']))
+
+    lines.append('# HELP metacatalog_page_get_total Page.get calls by the path taken.')
+    lines.append('# TYPE metacatalog_page_get_total counter')
+    for path, n in sorted(Page.get_paths.items()):
+        lines.append('metacatalog_page_get_total{path="%s"} %d' % (path, n))
+
+    return '\n'.join(lines) + '\n'
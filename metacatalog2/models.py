@@ -1,15 +1,155 @@
 from datetime import datetime as dt
+from collections import OrderedDict, Counter
+from threading import Lock
+import time
+import uuid
 
-from elasticsearch_dsl import Text, Object, Date, GeoPoint, GeoShape, Integer
-from elasticsearch_dsl import Index
+from elasticsearch_dsl import Text, Keyword, Object, Date, GeoPoint, GeoShape, Integer
+from elasticsearch_dsl import Index, Q
 from elasticsearch_dsl.response.hit import Hit
 from elasticsearch.exceptions import TransportError
-from shapely import wkt
-import requests
+from elasticsearch.helpers import streaming_bulk
 from requests import HTTPError
 
-from metacatalog2.elastic import es, DocType
+from metacatalog2.elastic import es, alias_map, DocType, source_filter, source_params, apply_source_filter
 from metacatalog2 import definitions
+from metacatalog2.util import geo
+from metacatalog2.util.spatial import SpatialIndex, load_wkt, load_prepared
+
+
+class LRUCache:
+    """
+    LRU cache
+    ---------
+
+    In-process LRU cache with a time to live. Each entry expires after :param ttl: seconds and
+    the least recently used entries are dropped once more than :param maxsize: keys are cached.
+    As the cache lives in the process, other worker processes will only see changes after the
+    ttl expired.
+    """
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[name]
+                self.misses += 1
+                return None
+            self._data.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, name, value):
+        with self._lock:
+            self._data[name] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(name)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def peek(self, name):
+        """
+        Return the cached value of name without counting a hit or changing the LRU order.
+        """
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def invalidate(self, name=None):
+        """
+        Remove the entry of name from the cache. If name is None, the whole cache is cleared.
+        """
+        with self._lock:
+            if name is None:
+                self._data.clear()
+            else:
+                self._data.pop(name, None)
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self._data), maxsize=self.maxsize, ttl=self.ttl)
+
+
+class AggregationCache(LRUCache):
+    """
+    Aggregation cache
+    -----------------
+
+    LRU cache for aggregation results of Pages. Each index (or alias) name has a generation counter,
+    which is bumped on any Page write affecting it. A cached result is only returned if none of the
+    generations of the indices it was aggregated from has changed since, therefore the results
+    are invalidated by the writes of this process immediately and by the ttl for other processes.
+
+    The snapshot of the generations has to be taken before the aggregation is sent. Writes become
+    visible to searches only after the next refresh of the index, thus results aggregated less than
+    :param refresh_interval: seconds after a write are not cached, they might miss the write.
+    """
+    def __init__(self, maxsize=128, ttl=300, refresh_interval=1):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.refresh_interval = refresh_interval
+        self._generations = dict()
+        self._written = dict()
+
+    def snapshot(self, indices):
+        return tuple(self._generations.get(i, 0) for i in indices)
+
+    def get(self, key, indices=()):
+        entry = super().get(key)
+        if entry is None:
+            return None
+        snapshot, value = entry
+        if snapshot != self.snapshot(indices):
+            # outdated, count as miss
+            with self._lock:
+                self._data.pop(key, None)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return value
+
+    def set(self, key, value, indices=(), snapshot=None):
+        """
+        Cache the value, if none of the indices was written since the :param snapshot: was taken and
+        the last write to them is older than the refresh interval.
+
+        :param snapshot: tuple, result of `AggregationCache.snapshot` taken before the aggregation
+        :return: True if the value was cached
+        """
+        if snapshot is not None and snapshot != self.snapshot(indices):
+            return False
+        settled = time.monotonic() - self.refresh_interval
+        if any(self._written.get(i, 0) > settled for i in indices):
+            return False
+        super().set(key, (self.snapshot(indices), value))
+        return True
+
+    def bump(self, indices):
+        """
+        Increment the generation of all given index and alias names.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for i in indices:
+                self._generations[i] = self._generations.get(i, 0) + 1
+                self._written[i] = now
+
+
+def invalidate_aliases():
+    """
+    Drop all in-process state, that depends on the aliases of the indices. This has to be called
+    after any change of the aliases or indices.
+    """
+    alias_map.invalidate()
+    Page.spatial_cache.invalidate()
+    Page.uid_mapped.clear()
 
 
 class Context(DocType):
@@ -25,6 +165,12 @@ class Context(DocType):
     name = Text()
     part_of = Text(multi=True)
     v = Integer()
+    # the running reindex, see Context.start_reindex
+    reindex_task = Object(enabled=False)
+
+    # sort order for cursor based pagination. The names are expected to be unique (see Context.by_name)
+    # and the contexts index holds only a few documents, thus the _id tiebreaker is cheap here
+    _cursor_sort = ('name', '_id')
 
     # define the index in the Meta object
     class Meta:
@@ -32,8 +178,11 @@ class Context(DocType):
         doc_type = 'context'
         using = es
 
+    # name -> Context cache used by by_name, invalidated by the CRUD methods
+    cache = LRUCache(maxsize=256, ttl=60)
+
     @classmethod
-    def by_name(cls, name, strict=True):
+    def by_name(cls, name, strict=True, use_cache=True):
         """
         Return an Context instance by name.
 
@@ -46,17 +195,70 @@ class Context(DocType):
         ---------
         :param name: string, the name of the context
         :param strict: bool, if True a multi-match will cause an exception
+        :param use_cache: bool, if True the Context will be looked up in `Context.cache` first
         :return: the `metacatalog2.models.Context` of `name`
         """
-        s = cls.search().filter('term', name=name)
+        if use_cache:
+            ctx = cls.cache.get(name)
+            if ctx is not None:
+                return ctx
+
+        # two hits are enough to decide on strict
+        hits = list(cls.search().filter('term', name=name)[0:2].execute())
 
         # check
-        if strict and s.count() > 1:
+        if strict and len(hits) > 1:
             raise HTTPError(412, 'There is more than one Context of name "%s" and that\'s bad.' % name)
-        elif s.count() == 0:
+        elif len(hits) == 0:
             raise HTTPError(404, 'A Context of name "%s" could not be found.' % name)
         else:
-            return list(s).pop()
+            ctx = cls.from_hit(hits[0])
+
+        cls.cache.set(name, ctx)
+        return ctx
+
+    @classmethod
+    def by_names(cls, names, strict=True, use_cache=True):
+        """
+        Return many Context instances by name.
+
+        All names not found in the cache are resolved by a single terms query. The same rules
+        as for `Context.by_name` apply: if a name is not found, or found multiple times and
+        :param strict: is `True`, a HTTPError is raised.
+
+        Parameter
+        ---------
+        :param names: list of strings, the names of the contexts
+        :param strict: bool, if True a multi-match will cause an exception
+        :param use_cache: bool, if True the Contexts will be looked up in `Context.cache` first
+        :return: dict of name: `metacatalog2.models.Context`
+        """
+        contexts = dict()
+        missing = []
+        for name in set(names):
+            ctx = cls.cache.get(name) if use_cache else None
+            if ctx is None:
+                missing.append(name)
+            else:
+                contexts[name] = ctx
+
+        if len(missing) > 0:
+            # fetch up to two hits per name in one request
+            s = cls.search().filter('terms', name=missing)[0:2 * len(missing)]
+            found = dict()
+            for hit in s.execute():
+                found.setdefault(hit.name, []).append(hit)
+
+            for name in missing:
+                hits = found.get(name, [])
+                if strict and len(hits) > 1:
+                    raise HTTPError(412, 'There is more than one Context of name "%s" and that\'s bad.' % name)
+                elif len(hits) == 0:
+                    raise HTTPError(404, 'A Context of name "%s" could not be found.' % name)
+                contexts[name] = cls.from_hit(hits[0])
+                cls.cache.set(name, contexts[name])
+
+        return contexts
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -78,7 +280,7 @@ class Context(DocType):
         """
         Create a new index of this Context object.
         It will load the definition name from the `metacatalog2.definitions` submodule and PUT it
-        into elasticsearch as `Context.name + '_v1'.
+        into elasticsearch as `Context.index_name`.
 
         Parameter
         ---------
@@ -96,16 +298,17 @@ class Context(DocType):
             raise FileNotFoundError('The default mapping could not be found')
 
         # sent the mapping to elasticsearch
-        res = requests.put(es.transport.get_connection().host + '/%s_v1' % self.name, json=mapping)
-        if res.status_code != 200:
-            raise HTTPError(404, 'The mapping was not accepted by Elasticsearch. %s.' % res.content)
-
-        # create the alias
-        self.create_alias(self.name)
-
-        # check parent indices
-        if self.has('part_of'):
-            [self.create_alias(name=n) for n in self.part_of]
+        try:
+            es.indices.create(index=self.index_name, body=mapping)
+        except TransportError as e:
+            raise HTTPError(e.status_code, 'The mapping was not accepted by Elasticsearch. %s.' % e.info)
+
+        # create the own and all parent aliases at once
+        try:
+            es.indices.update_aliases(body=dict(actions=self.alias_actions()))
+        except TransportError as e:
+            raise HTTPError(e.status_code, e.info)
+        invalidate_aliases()
 
         # save the index
         if not idx.exists():
@@ -115,42 +318,267 @@ class Context(DocType):
     def create_alias(self, name):
         """
         Create an alias to the basic alias of this context.
-        Note: This function operates directly on the elasticsearch node as the `elasticsearch_dsl.Index.aliases`
-            function seems to work not correctly?
+        Note: This function uses the indices API of the elasticsearch client directly as the
+            `elasticsearch_dsl.Index.aliases` function seems to work not correctly?
 
         :param name: string, will be used as alias
         :return: True, if the HTTP Response of Elasticsearch was of status 200
         """
         # create the alias
-        res = requests.put(self.index_endpoint + '/_aliases/%s' % name)
-        if res.status_code != 200:
-            raise HTTPError(res.status_code, res.content)
+        try:
+            es.indices.put_alias(index=self.index_name, name=name)
+        except TransportError as e:
+            raise HTTPError(e.status_code, e.info)
         else:
+            invalidate_aliases()
             return True
 
+    def alias_names(self):
+        """
+        Return all alias names of this Context: its own name and the names of all contexts it is part of.
+
+        :return: list of strings
+        """
+        return [self.name] + [n for n in (self.part_of or []) if n != self.name]
+
+    def alias_actions(self, index=None, current=None):
+        """
+        Build the `_aliases` actions, that move all aliases of this Context to :param index:.
+
+        :param index: string, the index the aliases shall point to, defaults to `Context.index_name`
+        :param current: dict of index: list of aliases, that shall be removed first
+        :return: list of actions
+        """
+        index = index or self.index_name
+        actions = []
+        for idx, aliases in (current or dict()).items():
+            actions.extend([dict(remove=dict(index=idx, alias=alias)) for alias in aliases])
+        for alias in self.alias_names():
+            add = dict(index=index, alias=alias)
+            # the own alias is the write index of the Context, the part_of aliases include other indices
+            if alias == self.name:
+                add['is_write_index'] = True
+            actions.append(dict(add=add))
+        return actions
+
+    @classmethod
+    def realias_many(cls, contexts):
+        """
+        Delete all alias endpoints of the given contexts and recreate them from the name and part_of
+        property. All changes are sent in one atomic `_aliases` request, thus searches on any alias
+        never miss an index.
+
+        :param contexts: list of `metacatalog2.models.Context`
+        :return: True, if Elasticsearch acknowledged the changes
+        """
+        if len(contexts) == 0:
+            return True
+        indices = [ctx.index_name for ctx in contexts]
+
+        # the current aliases of all indices
+        current = es.indices.get_alias(index=','.join(indices), ignore=404)
+        actions = []
+        for ctx in contexts:
+            aliases = current.get(ctx.index_name, dict()).get('aliases', dict())
+            actions.extend(ctx.alias_actions(current={ctx.index_name: list(aliases.keys())}))
+
+        try:
+            res = es.indices.update_aliases(body=dict(actions=actions))
+        except TransportError as e:
+            raise HTTPError(e.status_code, e.info)
+
+        for ctx in contexts:
+            cls.cache.invalidate(ctx.name)
+        invalidate_aliases()
+        Page.aggregation_cache.invalidate()
+        return res.get('acknowledged', False)
+
     def realias(self):
         """
         Delete all alias endpoints of this context and recreate from the name and part_of property.
+        This is done in one atomic request, see `Context.realias_many`.
+
+        :return: True, if Elasticsearch acknowledged the changes
+        """
+        return self.realias_many([self])
 
-        :return:
+    def realias_hierarchy(self):
         """
-        res = requests.delete(self.index_endpoint + '/_aliases/*')
-        self.create_alias(self.name)
+        Re-alias this context and all contexts, that are part of it, in one atomic request.
 
-        # part of
-        if self.has('part_of'):
-            [self.create_alias(name=n) for n in self.part_of]
+        :return: True, if Elasticsearch acknowledged the changes
+        """
+        s = self.__class__.search().filter('term', part_of=self.name)
+        children = [self.from_hit(hit) for hit in s.scan()]
+        return self.realias_many([self] + children)
+
+    @staticmethod
+    def block_writes(index, block=True):
+        """
+        Set or lift the `index.blocks.write` setting of the index. Writes to a blocked index fail with a 403.
+
+        :param index: string, the concrete index
+        :param block: bool, False lifts the block
+        """
+        es.indices.put_settings(index=index, body={'index.blocks.write': True if block else None})
+
+    def start_reindex(self, definition_name='page', delete_old=False):
+        """
+        Start the reindex of this Context
+        ---------------------------------
+        Create a new version of the index of this Context from the definition name and start a `_reindex`
+        task on Elasticsearch, which copies all documents into it. The old index is blocked for writes
+        until the reindex is finished, thus no document written during the copy gets lost. The writes
+        fail instead.
+        The task is saved on this Context and has to be finished by `Context.finish_reindex`, once it
+        is completed.
+
+        Parameter
+        ---------
+        :param definition_name: string, name of the json file holding the index definition
+        :param delete_old: bool, if True the old index is deleted after the aliases were swapped,
+                            else it is kept read-only
+        :return: string, the task id
+        """
+        if getattr(self, 'reindex_task', None):
+            raise HTTPError(409, 'The Context "%s" is already being reindexed by task %s.' % (
+                self.name, self.reindex_task['task']))
+        old_index = self.index_name
+
+        mapping = definitions.get(definition_name)
+        if mapping is None:
+            raise FileNotFoundError('The mapping %s could not be found' % definition_name)
+
+        # find the next free version
+        v = self.v + 1
+        while es.indices.exists(index='%s_v%d' % (self.name, v)):
+            v += 1
+        new_index = '%s_v%d' % (self.name, v)
+
+        try:
+            es.indices.create(index=new_index, body=mapping)
+        except TransportError as e:
+            raise HTTPError(e.status_code, 'The mapping was not accepted by Elasticsearch. %s.' % e.info)
+
+        # copy the documents, the uid of Pages indexed before it existed is set from the id
+        self.block_writes(old_index)
+        try:
+            task = es.reindex(
+                body=dict(
+                    source=dict(index=old_index),
+                    dest=dict(index=new_index),
+                    script=dict(source='ctx._source.uid = ctx._id', lang='painless')
+                ),
+                slices='auto',
+                wait_for_completion=False
+            )
+        except TransportError as e:
+            self.block_writes(old_index, block=False)
+            es.indices.delete(index=new_index, ignore=404)
+            raise HTTPError(e.status_code, 'The reindex of %s could not be started: %s' % (old_index, e.info))
+
+        self.reindex_task = dict(task=task['task'], index=new_index, v=v, delete_old=bool(delete_old))
+        self.save(refresh=True)
+        return task['task']
+
+    def finish_reindex(self, progress=None):
+        """
+        Finish the reindex of this Context
+        ----------------------------------
+        Check the task started by `Context.start_reindex`. Once it is completed, the own alias and all
+        part_of aliases are swapped to the new index in one atomic `_aliases` request and the new version
+        of this Context is saved. If the task failed, the new index is deleted and the write block of
+        the old index is lifted. An old index that is kept stays write blocked, writes still addressing
+        it fail instead of getting lost.
+
+        Parameter
+        ---------
+        :param progress: callable, called with the task status dict of Elasticsearch
+        :return: tuple of (bool, task status), the bool is True if the reindex is finished
+        """
+        pending = getattr(self, 'reindex_task', None)
+        if not pending:
+            raise HTTPError(404, 'The Context "%s" is not being reindexed.' % self.name)
+        old_index, new_index = self.index_name, pending['index']
+
+        status = es.tasks.get(task_id=pending['task'])
+        if progress is not None:
+            progress(status['task']['status'])
+        if not status.get('completed', False):
+            return False, status
+
+        failures = status.get('response', dict()).get('failures', [])
+        if 'error' in status or len(failures) > 0:
+            es.indices.delete(index=new_index, ignore=404)
+            self.block_writes(old_index, block=False)
+            self.reindex_task = None
+            self.save(refresh=True)
+            raise HTTPError(500, 'The reindex of %s failed: %s' % (old_index, status.get('error', failures)))
+
+        # swap all aliases at once
+        current = es.indices.get_alias(index=old_index, ignore=404)
+        aliases = list(current.get(old_index, dict()).get('aliases', dict()).keys())
+        es.indices.update_aliases(body=dict(actions=self.alias_actions(index=new_index, current={old_index: aliases})))
+        invalidate_aliases()
+        Page.aggregation_cache.invalidate()
+
+        # save the new version
+        self.v = pending['v']
+        self.reindex_task = None
+        self.save(refresh=True)
+
+        if pending['delete_old']:
+            es.indices.delete(index=old_index, ignore=404)
+
+        return True, status
+
+    def reindex(self, definition_name='page', delete_old=False, progress=None, poll_interval=2):
+        """
+        Reindex this Context
+        --------------------
+        Create a new version of the index of this Context from the definition name and copy all
+        documents into it, without downtime for reads. The workflow is:
+
+         1. create the index `<name>_v<n+1>` with the new mapping and block writes to the old index
+         2. run a sliced `_reindex` task on Elasticsearch and poll its progress
+         3. swap the own alias and all part_of aliases to the new index in one atomic `_aliases` request
+         4. save the new version of this Context and delete the old index, if :param delete_old: is True
+
+        This blocks until the reindex is finished, see `Context.start_reindex` and `Context.finish_reindex`
+        for the single steps.
+
+        Parameter
+        ---------
+        :param definition_name: string, name of the json file holding the index definition
+        :param delete_old: bool, if True the old index is deleted after the aliases were swapped
+        :param progress: callable, called with the task status dict of Elasticsearch on each poll
+        :param poll_interval: float, seconds between two polls of the reindex task
+        :return: the task status of the finished reindex task
+        """
+        self.start_reindex(definition_name=definition_name, delete_old=delete_old)
+        while True:
+            finished, status = self.finish_reindex(progress=progress)
+            if finished:
+                return status
+            time.sleep(poll_interval)
 
     # customize the save method
     def save(self, **kwargs):
-        # do nothing
+        self.cache.invalidate(self.name)
         return super().save(**kwargs)
 
+    # customize the update method
+    def update(self, **kwargs):
+        self.cache.invalidate(self.name)
+        return super().update(**kwargs)
+
     # customize the delete method
     def delete(self, using=None, index=None, delete_index=False, **kwargs):
+        self.cache.invalidate(self.name)
         # delete the index as well
         if delete_index:
-            requests.delete(es.transport.get_connection().host + '/%s_v%d' % (self.name, self.v))
+            es.indices.delete(index=self.index_name, ignore=404)
+            invalidate_aliases()
         return super().delete(using=using, index=index, **kwargs)
 
 
@@ -180,6 +608,15 @@ class Page(DocType):
         downloads=Integer(),
         votes=Integer()
     )
+    # keyword copy of the id, used as tiebreaker of the cursor sort
+    uid = Keyword()
+
+    # sort order for cursor based pagination, sorting on _id would load it into the fielddata.
+    # Indices created before the uid field existed have no mapping for it, until the first write.
+    _cursor_sort = ('edited', {'uid': {'unmapped_type': 'keyword'}})
+
+    # indices known to map the uid field as keyword, see Page.ensure_uid_mapping
+    uid_mapped = set()
 
     # define the index in the Meta object
     class Meta:
@@ -187,8 +624,23 @@ class Page(DocType):
         doc_type = 'page'
         using = es
 
+    # aggregation results, invalidated by Page writes
+    aggregation_cache = AggregationCache(maxsize=128, ttl=300)
+
+    # fields used by fulltext, see the page definition for the subfields
+    _fulltext_fields = ['title^3', 'title.en^2', 'title.shingles^2', 'identifiers.raw^4', 'identifiers.en',
+                        'description.en', 'description.shingles', 'variable^2', 'owner']
+    _trigram_fields = ['title.trigrams', 'identifiers.trigrams', 'variable.trigrams', 'owner.trigrams',
+                       'license.trigrams']
+
+    # number of Page.get calls by the path taken: 'get', 'search' or 'fallback' after a failed get
+    get_paths = Counter()
+
+    # index name -> SpatialIndex, updated by the Page writes of this process
+    spatial_cache = LRUCache(maxsize=16, ttl=300)
+
     @classmethod
-    def from_hit(cls, hit):
+    def from_hit(cls, hit, fields=None):
         """
         Create a new Page object from a given `elasticsearch_dsl.hit.Hit` from search results.
         Although simple CRUD can be done on the hit, the Page class offers some helpful  methods
@@ -197,6 +649,8 @@ class Page(DocType):
         Parameter
         ---------
         :param hit: `elasticsearch_dsl.hit.Hit`, or dict of the same structure.
+        :param fields: list of fields to be transferred, see `metacatalog2.elastic.source_filter`.
+                None for all fields.
         :return:  Page, created from the hit
         """
         if isinstance(hit, Hit):
@@ -210,7 +664,7 @@ class Page(DocType):
             raise AttributeError('The hit has to be of type Hit or dict, found %s.' % hit.__class__)
 
         # build the page
-        page = cls(**doc)
+        page = cls(**apply_source_filter(doc, fields))
         page.meta.index = meta['index']
         page.meta.id = meta['id']
 
@@ -218,21 +672,144 @@ class Page(DocType):
 
     # ------------------------------
     # Methods
-    def to_shapely(self):
-        if hasattr(self, 'location'):
-            return wkt.loads(self.location)
+    def set_uid(self):
+        """
+        Copy the id into the uid field. Pages without id get a random id first, as the id has to be known
+        before the Page is written.
+        """
+        if getattr(self.meta, 'id', None) is None:
+            self.meta.id = uuid.uuid4().hex
+        self.uid = str(self.meta.id)
+
+    @classmethod
+    def ensure_uid_mapping(cls, index):
+        """
+        Map the uid field as keyword in the given index, before a Page with uid is written to it.
+        Otherwise, Elasticsearch would map the field dynamically as text in indices created before
+        the field existed, and the cursor sort would fail on them. The mapping is put once per index
+        and process.
+        Indices, which already map uid as text, have to be reindexed using `Context.start_reindex`.
+
+        :param index: string, the index or the alias of a Context
+        """
+        if index in cls.uid_mapped:
+            return
+        try:
+            es.indices.put_mapping(
+                index=index,
+                doc_type=cls._doc_type.name,
+                body=dict(properties=dict(uid=dict(type='keyword')))
+            )
+        except TransportError as e:
+            # a conflicting mapping can not be changed anymore, anything else will fail the write
+            if e.status_code != 400:
+                return
+        cls.uid_mapped.add(index)
+
+    def to_shapely(self, prepared=False):
+        """
+        Return the location as shapely geometry. The parsed geometries are cached by their WKT,
+        therefore repeated calls do not parse the location again.
+
+        :param prepared: bool, if True a `shapely.prepared.PreparedGeometry` is returned, which
+                should be used for repeated predicates on the same location
+        :return: shapely geometry or None, if the Page has no location
+        """
+        if hasattr(self, 'location') and self.location is not None:
+            return load_prepared(self.location) if prepared else load_wkt(self.location)
         else:
             return None
 
+    @classmethod
+    def spatial_index(cls, index='meta'):
+        """
+        Return the in-process spatial index of all Page locations in the given index (or alias).
+        The spatial index is built from a scan over the locations on first use and then kept up to
+        date by the Page writes of this process. Bulk writes and alias changes drop the spatial index,
+        it will be rebuilt on next use. Writes of other processes are seen after the ttl of the
+        `Page.spatial_cache`.
+
+        :param index: the index (or alias) of the Pages
+        :return: `metacatalog2.util.spatial.SpatialIndex`
+        """
+        idx = cls.spatial_cache.get(index)
+        if idx is not None:
+            return idx
+
+        s = cls.search().source(['location']).filter('exists', field='location')
+        s = s.index()
+        s = s.index(index.split(','))
+        idx = SpatialIndex((hit.meta.id, hit.location) for hit in s.scan())
+
+        cls.spatial_cache.set(index, idx)
+        return idx
+
+    @classmethod
+    def _affected_names(cls, index=None):
+        """
+        Return the names of all indices and aliases, that include the given concrete index. These are
+        the index itself, the alias of its Context, all aliases the Context is part of and the global
+        meta context.
+
+        :param index: string, the concrete index or the alias of a Context
+        :return: list of names
+        """
+        names = ['meta']
+        if index is not None:
+            names.append(index)
+            # the concrete indices of a Context are named <name>_v<version>, the alias is the name itself
+            name = index.rsplit('_v', 1)[0] if alias_map.is_index(index) else index
+            try:
+                ctx = Context.by_name(name=name, strict=False)
+                if ctx.name != index:
+                    names.append(ctx.name)
+                if ctx.part_of:
+                    names.extend(ctx.part_of)
+            except HTTPError:
+                pass
+        return names
+
+    def _after_write(self, deleted=False):
+        # invalidate the aggregations and update the spatial indices of this Page
+        names = self._affected_names(self.meta.index)
+        self.aggregation_cache.bump(names)
+
+        for name in names:
+            idx = self.spatial_cache.peek(name)
+            if idx is None:
+                continue
+            if deleted or self.location is None:
+                idx.remove(self.meta.id)
+            else:
+                idx.add(self.meta.id, self.location)
+
     # customize the CRUD methods
     def save(self, **kwargs):
         # update the edited field
         self.edited = dt.utcnow()
-
-        return super().save(**kwargs)
+        self.set_uid()
+        self.ensure_uid_mapping(self._get_index(kwargs.get('index')))
+
+        result = super().save(**kwargs)
+        self._after_write()
+        return result
+
+    def update(self, **kwargs):
+        # Pages indexed before the uid field existed get it on their next update
+        if getattr(self, 'uid', None) is None:
+            kwargs.setdefault('uid', str(self.meta.id))
+            self.ensure_uid_mapping(self._get_index(kwargs.get('index')))
+        result = super().update(**kwargs)
+        self._after_write()
+        return result
+
+    def delete(self, **kwargs):
+        result = super().delete(**kwargs)
+        self._after_write(deleted=True)
+        return result
 
     @classmethod
-    def get(cls, id, using=None, index=None, context=None, strict=False, **kwargs):
+    def get(cls, id, using=None, index=None, context=None, strict=False, fields=None, **kwargs):
         """
         Native get overwrite
         --------------------
@@ -249,28 +826,53 @@ class Page(DocType):
         :param index:       the index where the object will be fetched from
         :param context:     instead of index, either a context name or context obeject can be used
         :param strict:      raise a HTTPError if more than one hit is found
+        :param fields:      list of fields to be fetched, see `metacatalog2.elastic.source_filter`.
+                            None for the whole document
         :param kwargs:      will be passed to the native `get` method
         :return:            the requested object
         """
+        source = source_filter(fields)
+
         # if a Context is given, us the index for search
         if isinstance(context, Context):
             index = context.index_name
             context = None
 
+        # resolve the alias locally, a get on an alias of many indices is not possible
+        name = context if context is not None else index or 'meta'
+        indices = alias_map.resolve(name)
+        if indices is not None and len(indices) == 1:
+            index, context = indices[0], None
+        elif indices is not None:
+            context = name
+
         # the exact index is known, use the parent get method
         if context is None:
+            kwargs.update(source_params(fields))
             try:
-                return super().get(id=id, using=using, index=index, **kwargs)
+                result = super().get(id=id, using=using, index=index, **kwargs)
+                cls.get_paths['get'] += 1
+                return result
             except TransportError as e:
-                if e.status_code != 400:
-                    raise
-                else:
-                    print('TransportError [400], search the meta context for id %s' % id)
+                if e.status_code == 404 and e.error == 'index_not_found_exception':
+                    # the alias map is outdated, e.g. the index was deleted by a reindex of another process
+                    invalidate_aliases()
+                    cls.get_paths['fallback'] += 1
+                    context = name
+                elif e.status_code == 400:
+                    cls.get_paths['fallback'] += 1
                     context = 'meta'
+                else:
+                    raise
+        else:
+            cls.get_paths['search'] += 1
 
         # only the index is known, search for the object
         if isinstance(context, str):
-            results = list(cls.search(index=context).filter('match', _id=id))
+            s = cls.search(index=context).filter('match', _id=id)
+            if source is not None:
+                s = s.source(**source)
+            results = list(s)
 
             if len(results) > 1 and strict:
                 raise HTTPError(409, 'Conflict: Multiple Pages found for id={0} in Context={1}'.format(id, context))
@@ -284,49 +886,156 @@ class Page(DocType):
             raise HTTPError(405, 'context must be of instance Context, or a context name as string')
 
     @classmethod
-    def all(cls, index=None, limit=None):
+    def get_many(cls, ids, context=None, index=None, fields=None):
+        """
+        Get many Pages
+        --------------
+        Fetch many Pages by id in a single request. If the concrete index is known, either by passing
+        it as :param index: or by passing a `metacatalog2.models.Context`, the Pages are fetched by
+        a multi get. If the context is given by name, a single ids query is sent to the alias.
+        If no index and no context is given, the global meta context is searched.
+
+        Parameter
+        ---------
+        :param ids:     list of strings, the ids of the requested Pages
+        :param context: either a context name or context object
+        :param index:   the concrete index where the Pages will be fetched from
+        :param fields:  list of fields to be fetched, see `metacatalog2.elastic.source_filter`.
+                        None for the whole documents
+        :return:        list of Pages in the order of ids, None for missing Pages
+        """
+        ids = [str(id) for id in ids]
+        if len(ids) == 0:
+            return []
+        source = source_filter(fields)
+
+        if isinstance(context, Context):
+            index = context.index_name
+            context = None
+
+        # resolve the alias locally
+        resolved = False
+        if index is None:
+            indices = alias_map.resolve(context or 'meta')
+            if indices is not None and len(indices) == 1:
+                index, resolved = indices[0], True
+
+        # the exact index is known, use mget
+        if index is not None:
+            try:
+                return super().mget(ids, index=index, missing='none', **source_params(fields))
+            except TransportError as e:
+                if not resolved or 'index_not_found_exception' not in str(e.info):
+                    raise
+                # the alias map is outdated, search the alias instead
+                invalidate_aliases()
+
+        # search the alias
+        s = cls.search(index=context or 'meta').filter('ids', values=ids)[0:len(ids)]
+        if source is not None:
+            s = s.source(**source)
+
+        found = dict()
+        for hit in s.execute():
+            found.setdefault(hit.meta.id, hit)
+        return [Page.from_hit(found[id]) if id in found else None for id in ids]
+
+    @classmethod
+    def all(cls, index=None, limit=None, fields=None):
         """
         Return all documents
         --------------------
 
         Return all instances of this DocType objects from the index.
-        Note: it does by default set the hit return range to 0:total_hits, that might cause some
-        traffic for large indices.
-        The query is implemented by the `elasticsearch_dsl.Search.execute` method with caching activated.
-        Nevertheless, the search object is re-created on every call, therefore I am not sure if the
-        hits are actually cached.
+        See `metacatalog2.elastic.DocType.all` for details.
 
         Page overwrite
         --------------
-        This overwrite of the `metacatalog2.elastic.DocType.all` method always uses the hit objects in the
-        response and builds new Page instances from the `Page.from_hit` method. This is needed as the
+        This overwrite of the `metacatalog2.elastic.DocType.all` method always builds the Page instances
+        from the hit objects in the response, using the `Page.from_hit` method. This is needed as the
         Page documents most likely live in different indices and are fetched from an alias.
-        Therefore the `mget` method does not work
 
         Parameters
         ----------
         :param index: The index to be used for searching. Can overwrite the default in inheriting classes.
         :param limit: integer, limit the output, similar to SQL LIMIT.
+        :param fields: list of fields to be fetched, see `metacatalog2.elastic.source_filter`.
+                None for whole documents.
         :return: list, all documents in the index
         """
-        hits = super().all(as_hit=True, index=index, limit=limit)
+        return super().all(as_hit=False, index=index, limit=limit, fields=fields)
 
-        # return
-        return [cls.from_hit(hit) for hit in hits]
+    @classmethod
+    def scan(cls, index=None, as_hit=False, fields=None, **kwargs):
+        """
+        Yield all Pages of the given index (or alias) one by one, without loading them into memory.
+        See `metacatalog2.elastic.DocType.scan` for details.
+
+        :param index: The index to be used for searching. Can overwrite the default in inheriting classes.
+        :param as_hit: bool, if True the hits are yielded instead of Page objects
+        :param fields: list of fields to be fetched, see `metacatalog2.elastic.source_filter`.
+        :param kwargs: will be passed to `elasticsearch_dsl.Search.params`, e.g. `scroll` or `size`.
+        :return: generator of Page objects
+        """
+        return super().scan(index=index, as_hit=as_hit, fields=fields, **kwargs)
 
     @classmethod
-    def all_coordinates(cls, precision='1m', index=None):
+    def all_coordinates(cls, precision=None, index=None, bbox=None, zoom=None, grid='geohash', centroid=False,
+                        max_buckets=10000, use_cache=True):
         """
         Use a aggregation to create a geohash grid from all documents with coordinate information.
-        The precision defines the aggregation level. The default setting of 1 meter will slow the
-        aggregation down for larger bounding boxes, then a coarser precision should be chosen.
-
-        TODO: add a optional bounding box filter to narrow the results down
+        The precision defines the aggregation level. A fine precision will slow the aggregation down
+        for larger bounding boxes, then a coarser precision should be chosen.
+        If no precision is given, it is chosen from the bounding box and map zoom level, so that
+        at most :param max_buckets: buckets are returned.
 
-        :param precision: integer or string, the geohash precision.
+        :param precision: integer or string, the geohash precision (or tile zoom level for geotile grids).
         :param index: the index (or alias) that should be used for searching
+        :param bbox: tuple of (min_lon, min_lat, max_lon, max_lat) to filter the documents
+        :param zoom: integer, the zoom level of the map requesting the grid
+        :param grid: string, either 'geohash' or 'geotile'. The geotile_grid needs Elasticsearch 7.
+        :param centroid: bool, if True, a geo_centroid of the documents is added to each bucket
+        :param max_buckets: integer, maximum number of buckets, used for the automatic precision
+        :param use_cache: bool, if True the result is looked up in `Page.aggregation_cache` first
         :return: JSON of all requested coordiantes
         """
+        key, indices, s = cls._coordinates_query(precision=precision, index=index, bbox=bbox, zoom=zoom, grid=grid,
+                                                 centroid=centroid, max_buckets=max_buckets)
+        if use_cache:
+            buckets = cls.aggregation_cache.get(key, indices)
+            if buckets is not None:
+                return buckets
+
+        # take the snapshot first, writes during the aggregation must not be cached as seen
+        snapshot = cls.aggregation_cache.snapshot(indices)
+        result = s.execute()
+
+        buckets = result.aggregations.coordinates.buckets
+        cls.aggregation_cache.set(key, buckets, indices, snapshot=snapshot)
+        return buckets
+
+    @classmethod
+    def _coordinates_query(cls, precision=None, index=None, bbox=None, zoom=None, grid='geohash', centroid=False,
+                           max_buckets=10000):
+        """
+        Build the search of `Page.all_coordinates`.
+
+        :return: tuple of (cache key, list of indices, `elasticsearch_dsl.Search`)
+        """
+        if grid not in ('geohash', 'geotile'):
+            raise ValueError("The grid has to be one of ['geohash', 'geotile'], found '%s'." % grid)
+
+        # choose the precision
+        precision = geo.parse_precision(precision, grid=grid)
+        if precision is None:
+            if grid == 'geohash':
+                precision = geo.geohash_precision(bbox=bbox, zoom=zoom, max_buckets=max_buckets)
+            else:
+                precision = geo.geotile_precision(bbox=bbox, zoom=zoom, max_buckets=max_buckets)
+
+        indices = index.split(',') if index is not None else ['meta']
+        key = ('coordinates', tuple(indices), grid, str(precision), bbox, bool(centroid), max_buckets)
+
         # get the search object
         s = cls.search()
 
@@ -335,20 +1044,106 @@ class Page(DocType):
             s = s.index()
             s = s.index(index.split(','))
 
+        # filter the bounding box
+        if bbox is not None:
+            s = s.filter('geo_bounding_box', coordinates=geo.bbox_filter(bbox))
+
         # aggregate, catch the agg object
-        s.aggs.bucket('coordinates', 'geohash_grid', field='coordinates', precision=precision)
-        result = s[0:0].execute()
+        agg = s.aggs.bucket('coordinates', '%s_grid' % grid, field='coordinates', precision=precision,
+                            size=max_buckets)
+        if centroid:
+            agg.metric('centroid', 'geo_centroid', field='coordinates')
 
-        return result.aggregations.coordinates.buckets
+        return key, indices, s[0:0]
 
     @classmethod
-    def variables(cls, index=None):
+    def fulltext(cls, q, index=None, size=20, offset=0, source=None, timeout=None, terminate_after=None):
+        """
+        Full text search
+        ----------------
+        Search the Pages for the query string :param q:. The query combines a multi_match on the
+        english, shingle and keyword subfields (see `metacatalog2/definitions/default/page.json`) with a
+        less boosted multi_match on the trigram subfields, which will also match misspelled or
+        partial words. Title and description matches are highlighted.
+
+        The latency of a query can be bounded by the :param timeout:, after which each shard returns
+        the hits collected so far, and :param terminate_after:, the maximum number of documents
+        collected per shard. In both cases, the response is flagged as `timed_out` or `terminated_early`.
+
+        Parameter
+        ---------
+        :param q:               string, the query string
+        :param index:           the index (or alias) that should be used for searching
+        :param size:            integer, number of hits returned
+        :param offset:          integer, number of hits skipped
+        :param source:          list of fields to be fetched, see `metacatalog2.elastic.source_filter`.
+                                None for the whole document
+        :param timeout:         string, ES time unit like '500ms'
+        :param terminate_after: integer, maximum number of documents collected per shard
+        :return:                `elasticsearch_dsl.response.Response`
+        """
+        s = cls.search()
+
+        if index is not None:
+            s = s.index()
+            s = s.index(index.split(','))
+
+        s = s.query(Q(
+            'bool',
+            should=[
+                Q('multi_match', query=q, type='best_fields', fields=cls._fulltext_fields, tie_breaker=0.3),
+                Q('multi_match', query=q, type='most_fields', fields=cls._trigram_fields, minimum_should_match='60%')
+            ],
+            minimum_should_match=1
+        ))
+
+        s = s.highlight('title', 'title.en', 'description', 'description.en', fragment_size=150,
+                        number_of_fragments=2)
+        s = s.highlight_options(require_field_match=False)
+
+        if source is not None:
+            s = s.source(**source_filter(source))
+        if timeout is not None:
+            s = s.extra(timeout=timeout)
+        if terminate_after is not None:
+            s = s.extra(terminate_after=int(terminate_after))
+
+        offset, size = int(offset), int(size)
+        return s[offset:offset + size].execute()
+
+    @classmethod
+    def variables(cls, index=None, use_cache=True):
         """
         Aggregate the given index for variables and return all buckets.
 
         :param index: the index (or alias) that should be used for aggreagtion
+        :param use_cache: bool, if True the result is looked up in `Page.aggregation_cache` first
         :return: JSON of all requested variables
         """
+        key, indices, s = cls._variables_query(index=index)
+        if use_cache:
+            buckets = cls.aggregation_cache.get(key, indices)
+            if buckets is not None:
+                return buckets
+
+        # take the snapshot first, writes during the aggregation must not be cached as seen
+        snapshot = cls.aggregation_cache.snapshot(indices)
+        result = s.execute()
+
+        buckets = result.aggregations.variables.buckets
+        cls.aggregation_cache.set(key, buckets, indices, snapshot=snapshot)
+        return buckets
+
+    @classmethod
+    def _variables_query(cls, index=None):
+        """
+        Build the search of `Page.variables`.
+
+        :return: tuple of (cache key, list of indices, `elasticsearch_dsl.Search`)
+        """
+        indices = index.split(',') if index is not None else ['meta']
+        key = ('variables', tuple(indices))
+
         # get the search object
         s = cls.search()
 
@@ -359,17 +1154,70 @@ class Page(DocType):
 
         # aggregate, use a TERM aggregation on variable
         s.aggs.bucket('variables', 'terms', field='variable.raw', size=1000)   # TODO size hardcoded
-        result = s[0:0].execute()
-
-        return result.aggregations.variables.buckets
 
+        return key, indices, s[0:0]
 
     def create(self, **kwargs):
         # update the created and edited field
         now = dt.utcnow()
         self.edited = now
         self.created = now
+        self.set_uid()
+        self.ensure_uid_mapping(self._get_index(kwargs.get('index')))
 
         # invoke any content check for validity here
 
-        return super().save(**kwargs)
+        result = super().save(**kwargs)
+        self._after_write()
+        return result
+
+    @classmethod
+    def bulk_create(cls, docs, index, chunk_size=500, using=None):
+        """
+        Bulk create Pages
+        -----------------
+        Create many new Pages in the given index using the Elasticsearch bulk API. The documents are
+        consumed lazily and sent in chunks of :param chunk_size:, therefore any iterable (like a
+        generator reading a file) can be passed. The created and edited fields are set for each document.
+
+        The bulk response is yielded for each document, errors are not raised. This way the caller
+        can decide how to report failed documents.
+
+        Parameter
+        ---------
+        :param docs:        iterable of dict or Page objects
+        :param index:       string, the index where the pages shall be created, or the alias of their Context
+        :param chunk_size:  integer, number of documents sent per bulk request
+        :param using:       `elasticsearch.Elasticsearch` instance to connect to
+        :return:            generator of (ok, item) tuples as returned by `elasticsearch.helpers.streaming_bulk`
+        """
+        def actions():
+            cls.ensure_uid_mapping(index)
+            for doc in docs:
+                page = doc if isinstance(doc, Page) else cls(**doc)
+
+                # update the created and edited field
+                now = dt.utcnow()
+                page.created = now
+                page.edited = now
+                page.meta.index = index
+                page.set_uid()
+
+                yield page.to_dict(include_meta=True)
+
+        def results():
+            for item in streaming_bulk(
+                    using or es,
+                    actions(),
+                    chunk_size=int(chunk_size),
+                    raise_on_error=False,
+                    raise_on_exception=False):
+                yield item
+
+            # all chunks are sent
+            names = cls._affected_names(index)
+            cls.aggregation_cache.bump(names)
+            for name in names:
+                cls.spatial_cache.invalidate(name)
+
+        return results()
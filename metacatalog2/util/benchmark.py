@@ -0,0 +1,325 @@
+"""
+API benchmark
+-------------
+
+Throughput and latency benchmark of the API. The Flask test client drives the most used endpoints
+against the in-memory Elasticsearch of `metacatalog2.util.memory`, filled with a synthetic dataset.
+Thus, the benchmark runs offline and measures the application code in `models.py` and `elastic.py`
+(including the request serialization), not the Elasticsearch node.
+For each scenario the number of operations per second, the p50 and p99 latency and the peak resident
+memory of the process are reported. The results can be written to JSON and compared to an earlier
+run by `compare`, which is used by the `flask bench` command to fail on regressions.
+
+Note: the benchmark replaces the transport of the shared `es` client, therefore it must not be run
+inside a process serving requests.
+"""
+import sys
+import json
+import time
+import random
+import resource
+from urllib.parse import quote
+
+import numpy as np
+from elasticsearch import Transport
+
+from metacatalog2.elastic import es
+from metacatalog2.util.memory import MemoryStore, MemoryConnection
+
+VARIABLES = ['air temperature', 'precipitation', 'relative humidity', 'wind speed', 'wind direction',
+             'global radiation', 'soil moisture', 'soil temperature', 'discharge', 'water level',
+             'groundwater level', 'evapotranspiration', 'snow depth', 'air pressure', 'sap flow',
+             'leaf area index', 'nitrate', 'electric conductivity', 'water temperature', 'turbidity']
+
+WORDS = ['station', 'catchment', 'sensor', 'long-term', 'hourly', 'daily', 'monitoring', 'network', 'field',
+         'campaign', 'forest', 'grassland', 'river', 'lake', 'alpine', 'lowland', 'karst', 'urban', 'eddy',
+         'covariance', 'lysimeter', 'tracer', 'quality', 'controlled', 'raw', 'derived', 'model', 'output']
+
+OWNERS = ['Hydrology', 'Meteorology', 'Soil Physics', 'Ecology', 'Remote Sensing', 'Limnology']
+LICENSES = ['CC BY 4.0', 'CC BY-SA 4.0', 'CC0', 'ODbL']
+
+# all benchmark pages are indexed into this context, which is part of the global meta context
+CONTEXT = 'bench'
+
+
+def use_memory_store(store=None):
+    """
+    Replace the transport of the shared `es` client by a transport to a `MemoryStore` and reset all
+    in-process caches, which may hold results of the former transport.
+
+    :param store: `metacatalog2.util.memory.MemoryStore`, a new empty store if None
+    :return: the `MemoryStore`
+    """
+    from metacatalog2.models import Context, Page, invalidate_aliases
+    from metacatalog2 import metrics
+
+    store = store if store is not None else MemoryStore()
+    es.transport = Transport([dict()], connection_class=MemoryConnection, store=store)
+    metrics._instrument_transport(es.transport)
+
+    Context.cache.invalidate()
+    Page.aggregation_cache.invalidate()
+    # writes to the store are visible immediately, there is no refresh to wait for
+    Page.aggregation_cache.refresh_interval = 0
+    invalidate_aliases()
+    return store
+
+
+def synthetic_page(i, rng):
+    """
+    Build the dict of a synthetic Page. Most Pages are located in central Europe, some all over the world.
+
+    :param i: integer, the number of the Page, used in the id and title
+    :param rng: `random.Random`
+    :return: dict
+    """
+    variable = rng.choice(VARIABLES)
+    if rng.random() < 0.9:
+        lat, lon = rng.gauss(49., 2.5), rng.gauss(9., 4.)
+    else:
+        lat, lon = rng.uniform(-60., 75.), rng.uniform(-180., 180.)
+    lat, lon = max(-90., min(90., lat)), max(-180., min(180., lon))
+
+    return dict(
+        meta=dict(id='page-%d' % i),
+        title='%s at %s %d' % (variable.capitalize(), rng.choice(WORDS), i),
+        identifiers=['bench:%d' % i],
+        description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))),
+        owner=rng.choice(OWNERS),
+        license=rng.choice(LICENSES),
+        variable=variable,
+        coordinates=dict(lat=round(lat, 5), lon=round(lon, 5)),
+        info=dict(downloads=rng.randint(0, 500), votes=rng.randint(0, 50))
+    )
+
+
+def populate(size, seed=42, chunk_size=1000):
+    """
+    Create the global meta context and the benchmark context and bulk index :param size: synthetic Pages.
+
+    :param size: integer, number of Pages
+    :param seed: integer, seed of the random dataset
+    :param chunk_size: integer, number of Pages per bulk request
+    :return: dict, the result of the bulk load
+    """
+    from metacatalog2.models import Context, Page
+
+    for ctx in (Context(name='meta'), Context(name=CONTEXT, part_of=['meta'])):
+        ctx.create_index()
+        ctx.save()
+
+    rng = random.Random(seed)
+    index = Context.by_name(CONTEXT).name
+
+    start = time.perf_counter()
+    indexed = sum(ok for ok, _ in Page.bulk_create((synthetic_page(i, rng) for i in range(size)), index=index,
+                                                   chunk_size=chunk_size))
+    duration = time.perf_counter() - start
+
+    return dict(scenario='bulk_load', size=size, ops=indexed, errors=size - indexed, duration=duration,
+                ops_per_sec=indexed / duration if duration > 0 else None, p50_ms=None, p99_ms=None,
+                peak_rss_mb=peak_rss())
+
+
+def peak_rss():
+    """
+    Return the peak resident memory of the process in MB.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # the unit is bytes on macOS and kilobytes on Linux
+    return rss / 1024. ** 2 if sys.platform == 'darwin' else rss / 1024.
+
+
+def _failed(response):
+    if response.status_code >= 400:
+        return True
+    # the API reports errors in the body
+    if response.is_json and not response.is_streamed:
+        data = response.get_json(silent=True)
+        return isinstance(data, dict) and 'error' in data
+    return False
+
+
+def scenarios(size, rng):
+    """
+    Build the benchmark scenarios. Each scenario is a tuple of (name, number of operations, function),
+    the function sends one request with the given test client.
+
+    :param size: integer, number of Pages in the dataset
+    :param rng: `random.Random`, used to pick the Pages and bounding boxes
+    :return: list of scenarios
+    """
+    from metacatalog2.models import Page
+
+    def random_id():
+        return 'page-%d' % rng.randrange(size)
+
+    def random_bbox():
+        lon, lat = rng.uniform(-5., 20.), rng.uniform(42., 56.)
+        return '%.3f,%.3f,%.3f,%.3f' % (lon, lat, lon + rng.uniform(1., 8.), lat + rng.uniform(1., 5.))
+
+    cursor = dict(value=None)
+
+    def pages_cursor(client):
+        url = '/api/%s/pages?page_size=50' % CONTEXT
+        if cursor['value'] is not None:
+            url += '&cursor=%s' % quote(cursor['value'])
+        response = client.get(url)
+        cursor['value'] = (response.get_json(silent=True) or dict()).get('cursor')
+        return response
+
+    def geohash_uncached(client):
+        Page.aggregation_cache.invalidate()
+        return client.get('/api/pages/geohash?bbox=%s&zoom=8' % random_bbox())
+
+    def variables_uncached(client):
+        Page.aggregation_cache.invalidate()
+        return client.get('/api/variables')
+
+    created = iter(range(10 ** 9))
+
+    return [
+        ('pages_limit', None, lambda client: client.get('/api/pages?limit=100')),
+        ('pages_cursor', None, pages_cursor),
+        ('page_get', None, lambda client: client.get('/api/%s/page/%s' % (CONTEXT, random_id()))),
+        ('page_get_meta', None, lambda client: client.get('/api/page/%s' % random_id())),
+        ('page_mget', None, lambda client: client.post('/api/%s/pages/_mget' % CONTEXT,
+                                                       json=[random_id() for _ in range(20)])),
+        ('geohash', None, lambda client: client.get('/api/pages/geohash?precision=4')),
+        ('geohash_uncached', 100, geohash_uncached),
+        ('variables', None, lambda client: client.get('/api/variables')),
+        ('variables_uncached', 100, variables_uncached),
+        ('page_create', None, lambda client: client.put(
+            '/api/%s/page/new-%d' % (CONTEXT, next(created)),
+            json=dict(title='New page', variable=rng.choice(VARIABLES),
+                      coordinates=dict(lat=rng.uniform(45., 55.), lon=rng.uniform(5., 15.))))),
+        ('page_edit', None, lambda client: client.post('/api/%s/page/%s' % (CONTEXT, random_id()),
+                                                       json=dict(description='edited %d' % rng.randrange(1000)))),
+        ('context_create', 50, lambda client: client.put(
+            '/api/context', json=dict(name='bench_%d' % next(created), part_of=['meta']))),
+    ]
+
+
+def run_scenario(client, name, func, n, warmup=10):
+    """
+    Run a single scenario :param n: times after :param warmup: untimed runs.
+
+    :return: dict of the results
+    """
+    for _ in range(min(warmup, n)):
+        func(client)
+
+    latencies = np.empty(n, dtype=np.float64)
+    errors = 0
+    start = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        response = func(client)
+        # consume streamed responses
+        response.get_data()
+        latencies[i] = time.perf_counter() - t
+        errors += _failed(response)
+    duration = time.perf_counter() - start
+
+    return dict(
+        scenario=name,
+        ops=n,
+        errors=errors,
+        duration=duration,
+        ops_per_sec=n / duration if duration > 0 else None,
+        p50_ms=float(np.percentile(latencies, 50) * 1000),
+        p99_ms=float(np.percentile(latencies, 99) * 1000),
+        peak_rss_mb=peak_rss()
+    )
+
+
+def run(sizes=(10000, ), requests=500, seed=42, only=None, report=None):
+    """
+    Run the benchmark
+    -----------------
+    For each dataset size, a new in-memory store is filled with synthetic Pages and all scenarios
+    are run against it. The writes are run last, as they change the dataset.
+
+    Parameter
+    ---------
+    :param sizes:       list of integers, number of Pages of each dataset
+    :param requests:    integer, number of requests per scenario. Some expensive scenarios use less.
+    :param seed:        integer, seed of the dataset and the requests
+    :param only:        list of scenario names to run, None for all
+    :param report:      callable, called with the result dict of each finished scenario
+    :return:            list of result dicts
+    """
+    from metacatalog2.app import app
+
+    results = []
+    for size in sizes:
+        use_memory_store()
+        result = populate(size, seed=seed)
+        results.append(result)
+        if report is not None:
+            report(result)
+
+        rng = random.Random(seed)
+        with app.test_client() as client:
+            for name, n, func in scenarios(size, rng):
+                if only is not None and name not in only:
+                    continue
+                result = dict(run_scenario(client, name, func, min(n or requests, requests)), size=size)
+                results.append(result)
+                if report is not None:
+                    report(result)
+
+    # drop the last dataset
+    use_memory_store()
+    return results
+
+
+def format_result(result):
+    """
+    Format a result dict as one line of a table.
+    """
+    def number(value, fmt):
+        return fmt % value if value is not None else '-'
+
+    return '%-20s %9d %7d %12s %10s %10s %10s %6d' % (
+        result['scenario'], result['size'], result['ops'], number(result['ops_per_sec'], '%.1f'),
+        number(result['p50_ms'], '%.2f'), number(result['p99_ms'], '%.2f'),
+        number(result['peak_rss_mb'], '%.0f'), result['errors']
+    )
+
+
+HEADER = '%-20s %9s %7s %12s %10s %10s %10s %6s' % (
+    'scenario', 'size', 'ops', 'ops/sec', 'p50 [ms]', 'p99 [ms]', 'RSS [MB]', 'errors'
+)
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare the results to the results of an earlier run. A scenario regressed, if its throughput
+    dropped, or its p99 latency rose, by more than :param tolerance:.
+
+    :param results: list of result dicts
+    :param baseline: list of result dicts, or path of a JSON file written by an earlier run
+    :param tolerance: float, the accepted relative change
+    :return: list of strings describing the regressions
+    """
+    if isinstance(baseline, str):
+        with open(baseline, 'r') as f:
+            baseline = json.load(f)
+    baseline = {(r['scenario'], r['size']): r for r in baseline}
+
+    regressions = []
+    for result in results:
+        old = baseline.get((result['scenario'], result['size']))
+        if old is None:
+            continue
+        if old['ops_per_sec'] and result['ops_per_sec'] and result['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+            regressions.append('%s (size=%d): %.1f ops/sec, was %.1f' % (
+                result['scenario'], result['size'], result['ops_per_sec'], old['ops_per_sec']))
+        if old['p99_ms'] and result['p99_ms'] and result['p99_ms'] > old['p99_ms'] * (1 + tolerance):
+            regressions.append('%s (size=%d): p99 %.2f ms, was %.2f ms' % (
+                result['scenario'], result['size'], result['p99_ms'], old['p99_ms']))
+        if result['errors'] > old['errors']:
+            regressions.append('%s (size=%d): %d errors, was %d' % (
+                result['scenario'], result['size'], result['errors'], old['errors']))
+    return regressions
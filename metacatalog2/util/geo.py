@@ -0,0 +1,169 @@
+"""
+Helper functions for the geo aggregations of Pages.
+The bounding boxes are handled in GeoJSON order: (min_lon, min_lat, max_lon, max_lat).
+"""
+import math
+
+# zoom levels added to the map zoom for the grid resolution. At zoom z, the map shows tiles
+# of 256px, an offset of 3 results in grid cells of about 32px.
+ZOOM_OFFSET = 3
+
+MAX_GEOHASH_PRECISION = 12
+MAX_GEOTILE_PRECISION = 29
+
+
+def parse_bbox(bbox):
+    """
+    Parse a bounding box given as comma separated string or sequence of four numbers.
+
+    :param bbox: string 'min_lon,min_lat,max_lon,max_lat', or sequence of four numbers
+    :return: tuple of (min_lon, min_lat, max_lon, max_lat) floats, or None if bbox is None
+    """
+    if bbox is None:
+        return None
+    if isinstance(bbox, str):
+        bbox = bbox.split(',')
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(v) for v in bbox]
+    except (ValueError, TypeError):
+        raise ValueError('The bbox has to be four numbers: min_lon,min_lat,max_lon,max_lat. Found %s.' % str(bbox))
+
+    if min_lat > max_lat:
+        raise ValueError('The bbox min_lat is larger than max_lat.')
+    if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError('The bbox is out of bounds.')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_precision(precision, grid='geohash'):
+    """
+    Parse the precision of a grid aggregation. Geohash precisions range from 1 to 12, the zoom level
+    of geotiles from 0 to 29.
+
+    :param precision: integer or string of an integer, or None
+    :param grid: string, 'geohash' or 'geotile'
+    :return: integer, or None if precision is None
+    """
+    if precision is None:
+        return None
+    low, high = (1, MAX_GEOHASH_PRECISION) if grid == 'geohash' else (0, MAX_GEOTILE_PRECISION)
+    try:
+        value = int(precision)
+    except (ValueError, TypeError):
+        raise ValueError('The precision has to be an integer, found %s.' % str(precision))
+    if not low <= value <= high:
+        raise ValueError('The %s precision has to be between %d and %d, found %d.' % (grid, low, high, value))
+    return value
+
+
+def bbox_filter(bbox):
+    """
+    Build the body of a `geo_bounding_box` query from the given bounding box.
+
+    :param bbox: tuple of (min_lon, min_lat, max_lon, max_lat)
+    :return: dict
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return dict(
+        top_left=dict(lat=max_lat, lon=min_lon),
+        bottom_right=dict(lat=min_lat, lon=max_lon)
+    )
+
+
+def _bbox_extent(bbox):
+    if bbox is None:
+        return 360., 180.
+    min_lon, min_lat, max_lon, max_lat = bbox
+    # bounding boxes crossing the dateline have min_lon > max_lon
+    width = max_lon - min_lon if max_lon >= min_lon else 360. + max_lon - min_lon
+    return width, max_lat - min_lat
+
+
+def geohash_cell_size(precision):
+    """
+    Return the width and height in degree of a geohash cell of the given precision.
+
+    :param precision: integer, geohash length
+    :return: tuple of (width, height)
+    """
+    bits = 5 * precision
+    lon_bits = int(math.ceil(bits / 2))
+    lat_bits = bits // 2
+    return 360. / 2 ** lon_bits, 180. / 2 ** lat_bits
+
+
+def geotile_cell_size(precision):
+    """
+    Return the width in degree of a map tile of the given zoom. The height depends on the latitude.
+
+    :param precision: integer, tile zoom level
+    :return: float, width in degree
+    """
+    return 360. / 2 ** precision
+
+
+def geohash_precision(bbox=None, zoom=None, max_buckets=10000):
+    """
+    Choose the geohash precision for the grid aggregation. If a zoom is given, the precision is chosen
+    to produce cells smaller than the tiles of that zoom level. The precision is then reduced until
+    at most :param max_buckets: cells fit into the bounding box.
+
+    :param bbox: tuple of (min_lon, min_lat, max_lon, max_lat), or None for the whole world
+    :param zoom: integer, map zoom level
+    :param max_buckets: integer, maximum number of buckets
+    :return: integer, geohash precision
+    """
+    width, height = _bbox_extent(bbox)
+    precision = MAX_GEOHASH_PRECISION
+    if zoom is not None:
+        target = geotile_cell_size(int(zoom) + ZOOM_OFFSET)
+        precision = next(
+            (p for p in range(1, MAX_GEOHASH_PRECISION + 1) if geohash_cell_size(p)[0] <= target),
+            MAX_GEOHASH_PRECISION
+        )
+
+    while precision > 1:
+        cell_width, cell_height = geohash_cell_size(precision)
+        if math.ceil(width / cell_width) * math.ceil(height / cell_height) <= max_buckets:
+            break
+        precision -= 1
+    return precision
+
+
+def geotile_precision(bbox=None, zoom=None, max_buckets=10000):
+    """
+    Choose the tile zoom level for the geotile grid aggregation, analogous to `geohash_precision`.
+    The height of the tiles is approximated by their width, which overestimates the number of
+    tiles towards the poles.
+
+    :param bbox: tuple of (min_lon, min_lat, max_lon, max_lat), or None for the whole world
+    :param zoom: integer, map zoom level
+    :param max_buckets: integer, maximum number of buckets
+    :return: integer, geotile precision
+    """
+    width, height = _bbox_extent(bbox)
+    if zoom is not None:
+        precision = min(int(zoom) + ZOOM_OFFSET, MAX_GEOTILE_PRECISION)
+    else:
+        precision = MAX_GEOTILE_PRECISION
+
+    while precision > 0:
+        size = geotile_cell_size(precision)
+        if math.ceil(width / size) * math.ceil(height / size) <= max_buckets:
+            break
+        precision -= 1
+    return precision
+
+
+def decode_geotile(key):
+    """
+    Decode a geotile key of the form 'zoom/x/y' into the coordinates of the tile center.
+
+    :param key: string, the geotile key
+    :return: tuple of (lat, lon)
+    """
+    zoom, x, y = [int(v) for v in key.split('/')]
+    n = 2 ** zoom
+    lon = (x + 0.5) / n * 360. - 180.
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+    return lat, lon
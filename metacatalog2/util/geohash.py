@@ -0,0 +1,142 @@
+"""
+Geohash encoding and decoding
+-----------------------------
+
+NumPy vectorized geohash functions. All functions accept arrays (or sequences) of coordinates
+or geohash keys and process them at once, which is way faster than decoding the buckets of a
+geohash grid aggregation one by one.
+The coordinates are always returned in (lat, lon) order.
+"""
+import numpy as np
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 12
+
+# lookup table from the ASCII code of a geohash character to its 5 bit value, -1 for invalid characters
+_LOOKUP = np.full(256, -1, dtype=np.int64)
+_LOOKUP[np.frombuffer(BASE32.encode(), dtype=np.uint8)] = np.arange(32)
+_ALPHABET = np.frombuffer(BASE32.encode(), dtype=np.uint8)
+
+
+def _split_bits(keys):
+    """
+    Convert the geohash keys into the integer cell index along longitude and latitude.
+
+    :param keys: sequence of geohash strings
+    :return: tuple of (lon_int, lat_int, lon_bits, lat_bits) integer arrays
+    """
+    keys = np.asarray(keys, dtype='S%d' % MAX_PRECISION)
+    if keys.ndim != 1:
+        keys = keys.ravel()
+    n = keys.shape[0]
+
+    chars = keys.view(np.uint8).reshape(n, MAX_PRECISION)
+    values = _LOOKUP[chars]
+    lengths = np.char.str_len(keys)
+
+    # padding bytes are 0, every other invalid character is an error
+    if np.any((values < 0) & (chars != 0)):
+        raise ValueError('The geohash keys contain invalid characters.')
+
+    lon_int = np.zeros(n, dtype=np.int64)
+    lat_int = np.zeros(n, dtype=np.int64)
+    for position in range(int(lengths.max()) if n > 0 else 0):
+        valid = position < lengths
+        value = values[:, position]
+        for bit in range(5):
+            b = np.where(valid, (value >> (4 - bit)) & 1, 0)
+            # even bits (of the whole hash) encode longitude, odd ones latitude
+            if (position * 5 + bit) % 2 == 0:
+                lon_int = np.where(valid, lon_int * 2 + b, lon_int)
+            else:
+                lat_int = np.where(valid, lat_int * 2 + b, lat_int)
+
+    lon_bits = (5 * lengths + 1) // 2
+    lat_bits = (5 * lengths) // 2
+    return lon_int, lat_int, lon_bits, lat_bits
+
+
+def bounds(keys):
+    """
+    Return the bounds of the geohash cells.
+
+    :param keys: sequence of geohash strings
+    :return: tuple of (min_lat, max_lat, min_lon, max_lon) float arrays
+    """
+    lon_int, lat_int, lon_bits, lat_bits = _split_bits(keys)
+    lon_size = 360. / np.exp2(lon_bits)
+    lat_size = 180. / np.exp2(lat_bits)
+    min_lon = -180. + lon_int * lon_size
+    min_lat = -90. + lat_int * lat_size
+    return min_lat, min_lat + lat_size, min_lon, min_lon + lon_size
+
+
+def decode_array(keys):
+    """
+    Decode the geohash keys into the coordinates of the cell centers.
+
+    :param keys: sequence of geohash strings
+    :return: tuple of (lat, lon) float arrays
+    """
+    min_lat, max_lat, min_lon, max_lon = bounds(keys)
+    return (min_lat + max_lat) / 2., (min_lon + max_lon) / 2.
+
+
+def decode(key):
+    """
+    Decode a single geohash key into the coordinates of the cell center.
+
+    :param key: string, the geohash
+    :return: tuple of (lat, lon)
+    """
+    lat, lon = decode_array([key])
+    return float(lat[0]), float(lon[0])
+
+
+def encode_array(lat, lon, precision=7):
+    """
+    Encode the coordinates into geohash keys of the given precision.
+
+    :param lat: sequence of latitudes
+    :param lon: sequence of longitudes
+    :param precision: integer, the length of the geohash keys
+    :return: array of geohash strings
+    """
+    precision = int(precision)
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError('The precision has to be between 1 and %d.' % MAX_PRECISION)
+    lat = np.asarray(lat, dtype=np.float64).ravel()
+    lon = np.asarray(lon, dtype=np.float64).ravel()
+
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    lon_int = np.clip(np.floor((lon + 180.) / 360. * 2 ** lon_bits), 0, 2 ** lon_bits - 1).astype(np.int64)
+    lat_int = np.clip(np.floor((lat + 90.) / 180. * 2 ** lat_bits), 0, 2 ** lat_bits - 1).astype(np.int64)
+
+    chars = np.zeros((lat.shape[0], precision), dtype=np.uint8)
+    lon_shift, lat_shift = lon_bits, lat_bits
+    for position in range(precision):
+        value = np.zeros(lat.shape[0], dtype=np.int64)
+        for bit in range(5):
+            if (position * 5 + bit) % 2 == 0:
+                lon_shift -= 1
+                b = (lon_int >> lon_shift) & 1
+            else:
+                lat_shift -= 1
+                b = (lat_int >> lat_shift) & 1
+            value = value * 2 + b
+        chars[:, position] = _ALPHABET[value]
+
+    return chars.view('S%d' % precision).ravel().astype(str)
+
+
+def encode(lat, lon, precision=7):
+    """
+    Encode a single coordinate into a geohash key of the given precision.
+
+    :param lat: float, latitude
+    :param lon: float, longitude
+    :param precision: integer, the length of the geohash key
+    :return: string, the geohash
+    """
+    return str(encode_array([lat], [lon], precision=precision)[0])
@@ -0,0 +1,176 @@
+"""
+Parallel bulk loader
+--------------------
+
+Load large metadata dumps (JSON, NDJSON or CSV) into a context. The records are read lazily,
+validated and converted into Page documents in a pool of worker processes and then indexed
+by the `elasticsearch.helpers.parallel_bulk` helper.
+The records are processed in batches, thus the memory consumption is bounded by the batch size
+and the queue size of the bulk helper, not by the size of the dump.
+"""
+import os
+import csv
+import json
+from datetime import datetime as dt
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+from elasticsearch.helpers import parallel_bulk
+from shapely import wkt
+from shapely.errors import ShapelyError
+
+
+def read_records(path, fmt=None):
+    """
+    Read the records from a metadata dump file. The format is guessed from the file extension,
+    if not given.
+
+     * json:   a single JSON array of objects
+     * ndjson: one JSON object per line, read lazily
+     * csv:    one record per row, the header row is used as field names, read lazily
+
+    :param path: string, path to the dump file
+    :param fmt: string, one of ['json', 'ndjson', 'csv']
+    :return: generator of dict
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt == 'jsonl':
+            fmt = 'ndjson'
+
+    if fmt == 'json':
+        with open(path, 'r') as f:
+            for record in json.load(f):
+                yield record
+    elif fmt == 'ndjson':
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if len(line) > 0:
+                    yield json.loads(line)
+    elif fmt == 'csv':
+        with open(path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                # drop empty cells
+                yield {k: v for k, v in row.items() if v is not None and v != ''}
+    else:
+        raise ValueError("The format has to be one of ['json', 'ndjson', 'csv'], found '%s'." % fmt)
+
+
+def convert_record(args):
+    """
+    Validate a single record and convert it into a bulk action of a Page document.
+    The WKT in the `location` field is parsed and normalized by shapely. If the record has no
+    `coordinates`, the centroid of the location is used.
+    This function runs in the worker processes.
+
+    :param args: tuple of (record, index)
+    :return: tuple of (ok, action or error message)
+    """
+    from metacatalog2.models import Page
+    record, index = args
+
+    if not isinstance(record, dict):
+        return False, 'The record has to be an object, found %s.' % record.__class__.__name__
+    if record.get('title') is None:
+        return False, 'The record has no title.'
+
+    record = dict(record)
+    meta = record.pop('meta', dict())
+    if '_id' in record:
+        meta['id'] = record.pop('_id')
+
+    # parse the location
+    if record.get('location') is not None:
+        try:
+            geom = wkt.loads(record['location'])
+        except (ShapelyError, ValueError, TypeError) as e:
+            return False, 'The location is not valid WKT: %s' % str(e)
+        if not geom.is_valid:
+            return False, 'The location is not a valid geometry.'
+        record['location'] = geom.wkt
+        if record.get('coordinates') is None:
+            centroid = geom.centroid
+            record['coordinates'] = dict(lat=centroid.y, lon=centroid.x)
+
+    page = Page(meta=meta, **record)
+    now = dt.utcnow()
+    page.created = now
+    page.edited = now
+    page.meta.index = index
+    page.set_uid()
+
+    return True, page.to_dict(include_meta=True)
+
+
+def convert_records(records, index, processes=None, batch_size=10000):
+    """
+    Convert the records into bulk actions in a pool of worker processes. The records are consumed
+    in batches of :param batch_size:, so that the reader never runs ahead of the consumer by more
+    than one batch.
+
+    :param records: iterable of dict
+    :param index: string, the index of the Pages, or the alias of their Context
+    :param processes: integer, number of worker processes, defaults to the number of CPUs
+    :param batch_size: integer, number of records converted per batch
+    :return: generator of (ok, action or error message) tuples, in the order of the records
+    """
+    processes = processes or cpu_count()
+    chunksize = max(1, batch_size // (processes * 4))
+    records = iter(records)
+
+    with Pool(processes=processes) as pool:
+        while True:
+            batch = [(record, index) for record in islice(records, batch_size)]
+            if len(batch) == 0:
+                break
+            for result in pool.imap(convert_record, batch, chunksize=chunksize):
+                yield result
+
+
+def load(path, context, fmt=None, processes=None, threads=4, chunk_size=500, batch_size=10000, using=None):
+    """
+    Load a metadata dump into the given context.
+
+    Parameter
+    ---------
+    :param path:        string, path to the dump file
+    :param context:     string, the name of the context where the pages shall be indexed
+    :param fmt:         string, one of ['json', 'ndjson', 'csv'], guessed from the extension if None
+    :param processes:   integer, number of worker processes for the conversion
+    :param threads:     integer, number of threads sending bulk requests
+    :param chunk_size:  integer, number of documents per bulk request
+    :param batch_size:  integer, number of records converted per batch
+    :param using:       `elasticsearch.Elasticsearch` instance to connect to
+    :return:            tuple of (number of indexed pages, list of errors)
+    """
+    from metacatalog2.elastic import es
+    from metacatalog2.models import Context
+    # write through the alias, it always points to the current index of the Context
+    index = Context.by_name(name=context).name
+
+    errors = []
+
+    def actions():
+        for i, (ok, result) in enumerate(convert_records(read_records(path, fmt=fmt), index, processes, batch_size)):
+            if ok:
+                yield result
+            else:
+                errors.append(dict(record=i, error=result))
+
+    indexed = 0
+    for ok, item in parallel_bulk(
+            using or es,
+            actions(),
+            thread_count=threads,
+            chunk_size=chunk_size,
+            queue_size=threads * 2,
+            raise_on_error=False,
+            raise_on_exception=False):
+        if ok:
+            indexed += 1
+        else:
+            result = item.get('index', item)
+            errors.append(dict(id=result.get('_id'), status=result.get('status'), error=result.get('error')))
+
+    return indexed, errors
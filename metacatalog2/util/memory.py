@@ -0,0 +1,1715 @@
+"""
+In-memory Elasticsearch
+-----------------------
+
+Offline stand-in for an Elasticsearch node. The `MemoryConnection` replaces the HTTP connection of the
+elasticsearch client and answers all requests from a `MemoryStore` living in the process. The request
+bodies are still serialized and the responses parsed by the transport of the client, therefore the
+application code runs unchanged and pays the same (de)serialization costs. Only the network and the
+node are gone.
+
+    store = MemoryStore()
+    es = Elasticsearch(connection_class=MemoryConnection, store=store)
+
+The whole application uses the store of this module, if the environment variable ELASTIC_BACKEND is
+set to 'memory' (see `metacatalog2.elastic.BACKENDS`).
+
+Only the subset of the REST API used by metacatalog2 is implemented:
+
+ * documents: index, create, get, update, delete, mget and bulk
+ * search: match_all, bool, term, terms, ids, match, multi_match, exists, range, prefix and
+   geo_bounding_box queries, sort, from / size, search_after, _source filtering, count and scroll
+ * aggregations: terms, geohash_grid, geotile_grid and geo_centroid
+ * indices: create, delete, exists, aliases (including write indices), mappings, settings (only the
+   index.blocks.write setting is applied), _reindex and _tasks. Reindex scripts may only assign
+   `ctx._id`, `ctx._index` or literals to source fields, like `ctx._source.uid = ctx._id`
+
+Text is matched on lowercase word tokens, term queries compare the exact values. The mappings are
+stored, but not applied. Subfields like `title.raw` resolve to the value of their parent field.
+All changes are visible immediately, as if each request was sent with `refresh=true`.
+
+Term, ids, match and geo_bounding_box queries are answered from secondary indexes, which are built
+on first use and kept up to date on writes. The sorted results of the last queries are cached until
+one of their indices changes, thus paging through a result by search_after does not repeat the search.
+"""
+import re
+import json
+import math
+import time
+import uuid
+import itertools
+from fnmatch import fnmatch
+from functools import cmp_to_key
+from collections import OrderedDict
+from threading import RLock
+from urllib.parse import unquote
+
+import numpy as np
+from elasticsearch import Connection
+
+from metacatalog2.util.geohash import encode_array, decode
+
+# same as metacatalog2.elastic.MAX_RESULT_WINDOW
+MAX_RESULT_WINDOW = 10000
+
+# subfields of the index definitions, resolved to the value of their parent field
+SUBFIELDS = ('raw', 'keyword', 'en', 'trigrams', 'shingles')
+
+SHARDS = dict(total=1, successful=1, skipped=0, failed=0)
+
+# number of sorted search results kept for paging
+RESULT_CACHE_SIZE = 16
+
+_TOKEN = re.compile(r'\w+')
+_ASSIGNMENT = re.compile(r'^ctx\._source\.([\w.]+)\s*=\s*(.+)$')
+_TIME_UNITS = dict(ms=0.001, s=1, m=60, h=3600, d=86400)
+
+
+class ElasticError(Exception):
+    """
+    Error of the in-memory store, it is returned as Elasticsearch error response with the given status.
+    If a :param body: is given, it is returned instead of the error object, like the body of a get
+    request for a missing document.
+    """
+    def __init__(self, status, type, reason, body=None):
+        super().__init__(status, type, reason)
+        self.status = status
+        self.type = type
+        self.reason = reason
+        self._body = body
+
+    def error(self):
+        return dict(root_cause=[dict(type=self.type, reason=self.reason)], type=self.type, reason=self.reason)
+
+    @property
+    def body(self):
+        if self._body is not None:
+            return self._body
+        return dict(error=self.error(), status=self.status)
+
+
+class _Index:
+    """
+    A single index of the store. The documents are held in insertion order as
+    id -> (doc_type, version, source) tuples. The tuples are never changed, but replaced.
+
+    The index keeps secondary indexes, which are built on the first query of a field and then
+    updated by each write:
+
+     * values:  field -> value -> set of ids, used by term, terms and terms aggregations
+     * tokens:  field -> token -> set of ids, used by match and multi_match
+     * columns: field -> point arrays of all documents, used by the geo queries and grids.
+                The columns are dropped on writes and rebuilt on next use.
+
+    The generation is a store wide unique number, which changes on each write.
+    """
+    def __init__(self, name, generation, mappings=None, settings=None):
+        self.name = name
+        self.generation = generation
+        self.mappings = mappings or dict()
+        self.settings = settings or dict()
+        self.aliases = set()
+        self.write_aliases = set()
+        self.docs = dict()
+        self.order = dict()
+        self._sequence = itertools.count()
+        self.created = int(time.time() * 1000)
+        self._values = dict()
+        self._tokens = dict()
+        self._columns = dict()
+
+    def alias_body(self, alias):
+        return dict(is_write_index=True) if alias in self.write_aliases else dict()
+
+    def check_write(self):
+        """
+        Raise the error of Elasticsearch, if the index.blocks.write setting is set.
+        """
+        blocks = _lookup(self.settings, ['index', 'blocks', 'write']) + _lookup(self.settings, ['blocks', 'write'])
+        if any(_parse_bool(b) for b in blocks):
+            raise ElasticError(403, 'cluster_block_exception', 'blocked by: [FORBIDDEN/8/index write (api)];')
+
+    def put(self, id, doc, generation):
+        old = self.docs.get(id)
+        if old is None:
+            self.order[id] = next(self._sequence)
+        self.docs[id] = doc
+        self._reindex(id, old, doc)
+        self.generation = generation
+
+    def remove(self, id, generation):
+        old = self.docs.pop(id, None)
+        if old is not None:
+            self.order.pop(id)
+            self._reindex(id, old, None)
+            self.generation = generation
+        return old
+
+    def _reindex(self, id, old, new):
+        for field, postings in self._values.items():
+            if old is not None:
+                for value in _hashable(_values(old[2], field)):
+                    postings.get(value, set()).discard(id)
+            if new is not None:
+                for value in _hashable(_values(new[2], field)):
+                    postings.setdefault(value, set()).add(id)
+        for field, postings in self._tokens.items():
+            if old is not None:
+                for token in set(_tokens(_values(old[2], field))):
+                    postings.get(token, set()).discard(id)
+            if new is not None:
+                for token in set(_tokens(_values(new[2], field))):
+                    postings.setdefault(token, set()).add(id)
+        self._columns.clear()
+
+    def values(self, field):
+        """
+        :return: dict of value: set of ids of all documents holding the value in the field
+        """
+        postings = self._values.get(field)
+        if postings is None:
+            postings = dict()
+            for id, doc in self.docs.items():
+                for value in _hashable(_values(doc[2], field)):
+                    postings.setdefault(value, set()).add(id)
+            self._values[field] = postings
+        return postings
+
+    def lookup(self, field, value):
+        """
+        :return: set of ids of all documents, that might hold a value equal to :param value: in the field
+        """
+        postings = self.values(field)
+        ids = set()
+        for probe in _probes(value):
+            ids.update(postings.get(probe, ()))
+        return ids
+
+    def tokens(self, field):
+        """
+        :return: dict of token: set of ids of all documents holding the token in the field
+        """
+        postings = self._tokens.get(field)
+        if postings is None:
+            postings = dict()
+            for id, doc in self.docs.items():
+                for token in set(_tokens(_values(doc[2], field))):
+                    postings.setdefault(token, set()).add(id)
+            self._tokens[field] = postings
+        return postings
+
+    def columns(self, field):
+        """
+        Return the points of the field of all documents as arrays. Documents without a point are
+        left out.
+
+        :return: dict of ids (list), rows (dict of id: row), lat and lon (arrays) and geohash (dict of
+                precision: keys), or None if any document holds more than one point in the field
+        """
+        if field in self._columns:
+            return self._columns[field]
+
+        ids, lat, lon = [], [], []
+        columns = None
+        for id, doc in self.docs.items():
+            points = _points(doc[2], field)
+            if len(points) > 1:
+                break
+            if len(points) == 1:
+                ids.append(id)
+                lat.append(points[0][0])
+                lon.append(points[0][1])
+        else:
+            columns = dict(
+                ids=ids,
+                rows={id: row for row, id in enumerate(ids)},
+                lat=np.asarray(lat, dtype=np.float64),
+                lon=np.asarray(lon, dtype=np.float64),
+                geohash=dict()
+            )
+        self._columns[field] = columns
+        return columns
+
+    def geohash(self, field, precision):
+        """
+        :return: array of the geohash keys of the points in `_Index.columns`
+        """
+        columns = self.columns(field)
+        if precision not in columns['geohash']:
+            keys = encode_array(columns['lat'], columns['lon'], precision=precision) if len(columns['ids']) > 0 else []
+            columns['geohash'][precision] = np.asarray(keys, dtype=str)
+        return columns['geohash'][precision]
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _split(value):
+    """
+    Split a comma separated URL parameter into a list, lists are passed through.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [v for v in str(value).split(',') if v != '']
+
+
+def _parse_bool(value, default=False):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ('false', '0', '')
+
+
+def _parse_time(value, default=300.):
+    """
+    Parse an Elasticsearch time unit like '5m' into seconds.
+    """
+    if value is None:
+        return default
+    match = re.match(r'^(\d+(?:\.\d+)?)(ms|s|m|h|d)$', str(value))
+    if match is None:
+        raise ElasticError(400, 'parse_exception', 'failed to parse setting [scroll] with value [%s]' % value)
+    return float(match.group(1)) * _TIME_UNITS[match.group(2)]
+
+
+def _tokens(value):
+    if isinstance(value, (list, tuple)):
+        return [t for v in value for t in _tokens(v)]
+    if value is None or isinstance(value, dict):
+        return []
+    return _TOKEN.findall(str(value).lower())
+
+
+def _lookup(obj, parts, flatten=True):
+    """
+    Return all values at the dotted path :param parts: of the object. Lists are traversed.
+    """
+    values = [obj]
+    for part in parts:
+        found = []
+        for value in values:
+            for v in (value if isinstance(value, list) else [value]):
+                if isinstance(v, dict) and part in v:
+                    found.append(v[part])
+        values = found
+
+    if not flatten:
+        return [v for v in values if v is not None]
+    flat = []
+    for value in values:
+        if isinstance(value, list):
+            flat.extend(v for v in value if v is not None)
+        elif value is not None:
+            flat.append(value)
+    return flat
+
+
+def _values(source, field):
+    """
+    Return all values of the field, subfields resolve to the parent field.
+    """
+    values = _lookup(source, field.split('.'))
+    if len(values) == 0 and '.' in field:
+        parent, sub = field.rsplit('.', 1)
+        if sub in SUBFIELDS:
+            values = _lookup(source, parent.split('.'))
+    return values
+
+
+def _point(value):
+    """
+    Parse a geo_point given as object, 'lat,lon' string, geohash or [lon, lat] array.
+
+    :return: tuple of (lat, lon), or None if the value is no geo_point
+    """
+    try:
+        if isinstance(value, dict):
+            return float(value['lat']), float(value['lon'])
+        if isinstance(value, str):
+            if ',' in value:
+                lat, lon = value.split(',')
+                return float(lat), float(lon)
+            return decode(value)
+        if isinstance(value, (list, tuple)) and len(value) == 2:
+            return float(value[1]), float(value[0])
+    except (KeyError, ValueError, TypeError):
+        pass
+    return None
+
+
+def _points(source, field):
+    points = []
+    for value in _lookup(source, field.split('.'), flatten=False):
+        if isinstance(value, list) and not (len(value) == 2 and all(isinstance(v, (int, float)) for v in value)):
+            points.extend(_point(v) for v in value)
+        else:
+            points.append(_point(value))
+    return [p for p in points if p is not None]
+
+
+def _hashable(values):
+    return set(v for v in values if isinstance(v, (str, int, float)))
+
+
+def _probes(value):
+    """
+    Return all values, that are looked up in the value index for a term query of :param value:.
+    See `_equal`, numbers and strings of the same value match.
+    """
+    probes = [value]
+    if isinstance(value, str):
+        for cast in (int, float):
+            try:
+                probes.append(cast(value))
+            except ValueError:
+                pass
+        if value in ('True', 'False'):
+            probes.append(value == 'True')
+    elif isinstance(value, (int, float)):
+        probes.append(str(value))
+    return [p for p in probes if isinstance(p, (str, int, float))]
+
+
+def _equal(a, b):
+    if a == b:
+        return True
+    # numbers and strings of the same value match, like on a keyword field
+    return isinstance(a, str) != isinstance(b, str) and str(a) == str(b)
+
+
+def _compare(a, b):
+    if a == b:
+        return 0
+    try:
+        return -1 if a < b else 1
+    except TypeError:
+        return -1 if str(a) < str(b) else 1
+
+
+def _compile_script(script):
+    """
+    Compile a reindex script of assignments to source fields into a function of (id, index, source).
+    Only `ctx._id`, `ctx._index` and JSON literals can be assigned.
+    """
+    source = script if isinstance(script, str) else script.get('source', script.get('inline', ''))
+    assignments = []
+    for statement in [s.strip() for s in source.split(';') if s.strip() != '']:
+        match = _ASSIGNMENT.match(statement)
+        if match is None:
+            raise ElasticError(400, 'script_exception', 'Unsupported script statement [%s]' % statement)
+        path, value = match.group(1).split('.'), match.group(2).strip()
+        if value not in ('ctx._id', 'ctx._index'):
+            try:
+                value = json.loads(value.replace("'", '"'))
+            except ValueError:
+                raise ElasticError(400, 'script_exception', 'Unsupported script value [%s]' % value)
+        assignments.append((path, value))
+
+    def apply(id, index, source):
+        for path, value in assignments:
+            obj = source
+            for part in path[:-1]:
+                obj = obj.setdefault(part, dict())
+            obj[path[-1]] = id if value == 'ctx._id' else index if value == 'ctx._index' else value
+        return source
+    return apply
+
+
+def _minimum_should_match(value, n, default):
+    if value is None:
+        return default
+    value = str(value).strip()
+    if value.endswith('%'):
+        m = int(n * abs(float(value[:-1])) / 100.)
+        return n - m if value.startswith('-') else m
+    m = int(value)
+    return n + m if m < 0 else m
+
+
+def _filter_source(source, includes, excludes, prefix=''):
+    """
+    Apply the _source includes and excludes, both can hold dotted paths and wildcards.
+    """
+    result = dict()
+    for key, value in source.items():
+        path = prefix + key
+        if any(fnmatch(path, p) for p in excludes):
+            continue
+        included = len(includes) == 0 or any(fnmatch(path, p) for p in includes)
+        if isinstance(value, dict):
+            if included and len(excludes) == 0:
+                result[key] = value
+            elif included or any(p.startswith(path + '.') for p in includes):
+                result[key] = _filter_source(value, [] if included else includes, excludes, path + '.')
+        elif included:
+            result[key] = value
+    return result
+
+
+def _source_spec(source):
+    """
+    Parse the _source of a request body into (includes, excludes), or False if no _source is returned.
+    """
+    if source is None or source is True:
+        return [], []
+    if source is False:
+        return False
+    if isinstance(source, (str, list)):
+        return _split(source), []
+    return (_as_list(source.get('includes', source.get('include'))),
+            _as_list(source.get('excludes', source.get('exclude'))))
+
+
+def _source_params(params):
+    """
+    Parse the _source URL parameters into (includes, excludes), or False if no _source is returned.
+    """
+    if '_source' in params and str(params['_source']).lower() in ('false', 'true'):
+        if not _parse_bool(params['_source']):
+            return False
+        includes = []
+    else:
+        includes = _split(params.get('_source'))
+    includes += _split(params.get('_source_includes', params.get('_source_include')))
+    excludes = _split(params.get('_source_excludes', params.get('_source_exclude')))
+    return includes, excludes
+
+
+def _merge(source, doc):
+    """
+    Merge the partial document into the source, without changing the source.
+    """
+    merged = dict(source)
+    for key, value in doc.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class _Hit:
+    __slots__ = ('index', 'id', 'type', 'source', 'score', 'sort')
+
+    def __init__(self, index, id, type, source, score):
+        self.index = index
+        self.id = id
+        self.type = type
+        self.source = source
+        self.score = score
+        self.sort = None
+
+
+class MemoryStore:
+    """
+    In-memory store
+    ---------------
+
+    Holds the indices, aliases, scroll contexts and tasks of the in-memory Elasticsearch and answers
+    the REST requests routed by `MemoryStore.request`. All requests are served under one lock.
+    """
+    def __init__(self):
+        self.indices = dict()
+        self._scrolls = dict()
+        self._tasks = dict()
+        self._counter = itertools.count(1)
+        self._results = OrderedDict()
+        self._lock = RLock()
+
+    # ------------------------------
+    # routing
+    def request(self, method, url, params=None, body=None):
+        """
+        Answer a REST request.
+
+        :param method: string, the HTTP method
+        :param url: string, the path of the request
+        :param params: dict of URL parameters
+        :param body: string, the request body
+        :return: tuple of (status, response object), the response is a dict, a string for the cat API,
+                or None for HEAD requests
+        """
+        # the client sends the URL parameters utf-8 encoded
+        params = {k: v.decode('utf-8') if isinstance(v, bytes) else v for k, v in (params or dict()).items()}
+        parts =[unquote(p) for p in url.split('?')[0].strip('/').split('/') if p != '']
+        if body is not None and not (len(parts) > 0 and parts[-1] == '_bulk'):
+            body = json.loads(body) if len(body.strip()) > 0 else None
+
+        with self._lock:
+            return self._route(method, parts, params, body)
+
+    def _route(self, method, parts, params, body):
+        n = len(parts)
+        if n == 0:
+            return 200, None if method == 'HEAD' else self.info()
+
+        first = parts[0]
+        if first == '_cat' and n == 2 and parts[1] in ('health', 'indices', 'aliases'):
+            return 200, getattr(self, 'cat_' + parts[1])(params)
+        if first == '_cluster' and parts[1:] == ['health']:
+            return 200, self.cluster_health()
+        if first == '_search' and n >= 2 and parts[1] == 'scroll':
+            scroll_id = parts[2] if n > 2 else params.get('scroll_id', (body or dict()).get('scroll_id'))
+            if method == 'DELETE':
+                return 200, self.clear_scroll(scroll_id)
+            return 200, self.scroll(scroll_id, params.get('scroll', (body or dict()).get('scroll')))
+        if first == '_aliases' and n == 1:
+            if method in ('POST', 'PUT'):
+                return 200, self.update_aliases((body or dict()).get('actions', []))
+            return 200, self.get_alias(None, None)
+        if first == '_alias':
+            return 200, self.get_alias(None, parts[1] if n > 1 else None)
+        if first == '_reindex' and method == 'POST':
+            return 200, self.reindex(body or dict(), params)
+        if first == '_tasks' and n == 2:
+            return 200, self.get_task(parts[1])
+        if first.startswith('_'):
+            return self._endpoint(method, first, None, None, parts[1:], params, body)
+
+        index = first
+        if n == 1:
+            if method == 'PUT':
+                return 200, self.create_index(index, body or dict())
+            if method == 'DELETE':
+                return 200, self.delete_index(index)
+            if method == 'HEAD':
+                self.resolve(index)
+                return 200, None
+            return 200, self.get_index(index)
+
+        # _doc is the type name of typeless requests, no endpoint
+        if parts[1].startswith('_') and parts[1] != '_doc':
+            return self._endpoint(method, parts[1], index, None, parts[2:], params, body)
+
+        doc_type = parts[1]
+        if n == 2 and method == 'POST':
+            return 201, self.index_doc(index, doc_type, None, body or dict())
+        if n >= 3 and parts[2].startswith('_'):
+            return self._endpoint(method, parts[2], index, doc_type, parts[3:], params, body)
+
+        id = parts[2]
+        action = parts[3] if n > 3 else None
+        if action is None and method in ('PUT', 'POST'):
+            op_type = params.get('op_type', 'index')
+            return self._status(self.index_doc(index, doc_type, id, body or dict(), op_type=op_type))
+        if action == '_create' and method in ('PUT', 'POST'):
+            return self._status(self.index_doc(index, doc_type, id, body or dict(), op_type='create'))
+        if action is None and method in ('GET', 'HEAD'):
+            doc = self.get_doc(index, doc_type, id, _source_params(params))
+            return 200, None if method == 'HEAD' else doc
+        if action == '_source' and method == 'GET':
+            return 200, self.get_doc(index, doc_type, id, _source_params(params)).get('_source')
+        if action == '_update' and method == 'POST':
+            return self._status(self.update_doc(index, doc_type, id, body or dict()))
+        if action is None and method == 'DELETE':
+            return 200, self.delete_doc(index, doc_type, id)
+
+        raise ElasticError(400, 'unsupported_operation_exception',
+                           'The request [%s /%s] is not supported by the in-memory store.' % (method, '/'.join(parts)))
+
+    def _endpoint(self, method, endpoint, index, doc_type, rest, params, body):
+        if endpoint == '_search':
+            return 200, self.search(index, doc_type, body or dict(), params)
+        if endpoint == '_count':
+            return 200, self.count(index, doc_type, body or dict())
+        if endpoint == '_mget':
+            return 200, self.mget(index, doc_type, body or dict(), params)
+        if endpoint == '_bulk':
+            return 200, self.bulk(index, doc_type, body or '', params)
+        if endpoint in ('_refresh', '_flush'):
+            self.resolve(index)
+            return 200, dict(_shards=SHARDS)
+        if endpoint in ('_alias', '_aliases') and index is not None:
+            name = rest[0] if len(rest) > 0 else None
+            if method in ('PUT', 'POST') and name is not None:
+                return 200, self.put_alias(index, name)
+            if method == 'DELETE' and name is not None:
+                return 200, self.delete_alias(index, name)
+            result = self.get_alias(index, name)
+            return 200, None if method == 'HEAD' else result
+        if endpoint == '_mapping' and method == 'GET':
+            return 200, {name: dict(mappings=self.indices[name].mappings) for name in self.resolve(index)}
+        if endpoint == '_mapping' and method in ('PUT', 'POST'):
+            return 200, self.put_mapping(index, rest[0] if len(rest) > 0 else doc_type, body or dict())
+        if endpoint == '_settings' and method == 'GET':
+            return 200, {name: dict(settings=self.indices[name].settings) for name in self.resolve(index)}
+        if endpoint == '_settings' and method == 'PUT':
+            return 200, self.put_settings(index, body or dict())
+
+        raise ElasticError(400, 'unsupported_operation_exception',
+                           'The endpoint [%s %s] is not supported by the in-memory store.' % (method, endpoint))
+
+    @staticmethod
+    def _status(result):
+        return (201 if result.get('result') == 'created' else 200), result
+
+    # ------------------------------
+    # cluster
+    def info(self):
+        return dict(
+            name='memory',
+            cluster_name='metacatalog2-memory',
+            version=dict(number='6.8.0', build_flavor='memory', lucene_version=None),
+            tagline='You Know, for Search'
+        )
+
+    def cluster_health(self):
+        return dict(
+            cluster_name='metacatalog2-memory',
+            status='green',
+            timed_out=False,
+            number_of_nodes=1,
+            number_of_data_nodes=1,
+            active_primary_shards=len(self.indices),
+            active_shards=len(self.indices),
+            relocating_shards=0,
+            initializing_shards=0,
+            unassigned_shards=0
+        )
+
+    def cat_health(self, params):
+        return '%d metacatalog2-memory green 1 1 %d %d 0 0 0 0 - 100.0%%\n' % (
+            int(time.time()), len(self.indices), len(self.indices)
+        )
+
+    def cat_indices(self, params):
+        return ''.join('green open %s 1 0 %d 0\n' % (name, len(idx.docs)) for name, idx in sorted(self.indices.items()))
+
+    def cat_aliases(self, params):
+        return ''.join('%s %s - - -\n' % (alias, name)
+                       for name, idx in sorted(self.indices.items()) for alias in sorted(idx.aliases))
+
+    # ------------------------------
+    # indices and aliases
+    def aliases(self):
+        """
+        :return: dict of alias: sorted list of indices
+        """
+        aliases = dict()
+        for name, idx in self.indices.items():
+            for alias in idx.aliases:
+                aliases.setdefault(alias, []).append(name)
+        return {alias: sorted(names) for alias, names in aliases.items()}
+
+    def resolve(self, expression, missing_ok=False):
+        """
+        Resolve a comma separated list of indices, aliases and wildcard patterns into concrete indices.
+
+        :param expression: string, None or '_all' for all indices
+        :param missing_ok: bool, if False a 404 is raised for unknown names
+        :return: sorted list of index names
+        """
+        if expression is None or expression in ('', '_all', '*'):
+            return sorted(self.indices.keys())
+
+        aliases = self.aliases()
+        names = set()
+        for name in _split(expression):
+            if '*' in name or '?' in name:
+                names.update(i for i in self.indices if fnmatch(i, name))
+                for alias, indices in aliases.items():
+                    if fnmatch(alias, name):
+                        names.update(indices)
+            elif name in self.indices:
+                names.add(name)
+            elif name in aliases:
+                names.update(aliases[name])
+            elif not missing_ok:
+                raise ElasticError(404, 'index_not_found_exception', 'no such index [%s]' % name)
+        return sorted(names)
+
+    def _single_index(self, name, create=False, write=False):
+        """
+        Resolve the index or alias of a single document operation. Writes to an alias of many indices
+        go to its write index.
+        """
+        if name in self.indices:
+            return self.indices[name]
+        indices = self.aliases().get(name)
+        if indices is None:
+            if create:
+                self.create_index(name, dict())
+                return self.indices[name]
+            raise ElasticError(404, 'index_not_found_exception', 'no such index [%s]' % name)
+        if write:
+            targets = [i for i in indices if name in self.indices[i].write_aliases]
+            indices = targets if len(targets) > 0 else indices
+        if len(indices) > 1:
+            raise ElasticError(
+                400, 'illegal_argument_exception',
+                "Alias [%s] has more than one indices associated with it [%s], can't execute a single index op" % (
+                    name, str(indices))
+            )
+        return self.indices[indices[0]]
+
+    def create_index(self, name, body):
+        if name in self.indices:
+            raise ElasticError(400, 'resource_already_exists_exception', 'index [%s] already exists' % name)
+        if name.startswith(('_', '-', '+')) or name != name.lower() or name in self.aliases():
+            raise ElasticError(400, 'invalid_index_name_exception', 'Invalid index name [%s]' % name)
+
+        idx = _Index(name, next(self._counter), mappings=body.get('mappings'), settings=body.get('settings'))
+        aliases = body.get('aliases') or dict()
+        idx.aliases.update(aliases.keys())
+        idx.write_aliases.update(a for a, spec in aliases.items() if (spec or dict()).get('is_write_index', False))
+        self.indices[name] = idx
+        return dict(acknowledged=True, shards_acknowledged=True, index=name)
+
+    def delete_index(self, expression):
+        for name in self.resolve(expression):
+            del self.indices[name]
+        return dict(acknowledged=True)
+
+    def get_index(self, expression):
+        return {name: dict(
+            aliases={alias: self.indices[name].alias_body(alias) for alias in sorted(self.indices[name].aliases)},
+            mappings=self.indices[name].mappings,
+            settings=self.indices[name].settings
+        ) for name in self.resolve(expression)}
+
+    def get_alias(self, index, name):
+        indices = self.resolve(index)
+        patterns = _split(name)
+        result = dict()
+        for i in indices:
+            aliases = [a for a in sorted(self.indices[i].aliases)
+                       if len(patterns) == 0 or any(fnmatch(a, p) for p in patterns)]
+            if len(aliases) > 0 or len(patterns) == 0:
+                result[i] = dict(aliases={a: self.indices[i].alias_body(a) for a in aliases})
+
+        if len(patterns) > 0 and len(result) == 0:
+            body = dict(error='alias [%s] missing' % name, status=404)
+            raise ElasticError(404, 'aliases_not_found_exception', 'alias [%s] missing' % name, body=body)
+        return result
+
+    def put_alias(self, index, name):
+        return self.update_aliases([dict(add=dict(index=index, alias=name))])
+
+    def delete_alias(self, index, name):
+        return self.update_aliases([dict(remove=dict(index=index, alias=name))])
+
+    def update_aliases(self, actions):
+        """
+        Apply all alias actions at once. If any action fails, no alias is changed.
+        """
+        aliases = {name: set(idx.aliases) for name, idx in self.indices.items()}
+        writes = {name: set(idx.write_aliases) for name, idx in self.indices.items()}
+        removed = set()
+
+        for action in actions:
+            (kind, spec), = action.items()
+            indices = []
+            for i in _as_list(spec.get('index')) + _as_list(spec.get('indices')):
+                indices.extend(self.resolve(i))
+            names = _as_list(spec.get('alias')) + _as_list(spec.get('aliases'))
+
+            if kind == 'add':
+                for alias in names:
+                    if alias in self.indices:
+                        raise ElasticError(400, 'invalid_alias_name_exception',
+                                           'Invalid alias name [%s], an index exists with the same name' % alias)
+                    for i in indices:
+                        aliases[i].add(alias)
+                        if spec.get('is_write_index', False):
+                            writes[i].add(alias)
+                        else:
+                            writes[i].discard(alias)
+            elif kind == 'remove':
+                for alias in names:
+                    matched = [i for i in indices if any(fnmatch(a, alias) for a in aliases[i])]
+                    if len(matched) == 0:
+                        raise ElasticError(404, 'aliases_not_found_exception', 'aliases [%s] missing' % alias)
+                    for i in matched:
+                        aliases[i] = set(a for a in aliases[i] if not fnmatch(a, alias))
+                        writes[i] = set(a for a in writes[i] if a in aliases[i])
+            elif kind == 'remove_index':
+                removed.update(indices)
+            else:
+                raise ElasticError(400, 'illegal_argument_exception', 'Unsupported alias action [%s]' % kind)
+
+        counts = dict()
+        for name in set(writes) - removed:
+            for alias in writes[name]:
+                counts[alias] = counts.get(alias, 0) + 1
+        for alias, n in counts.items():
+            if n > 1:
+                raise ElasticError(400, 'illegal_state_exception', 'alias [%s] has more than one write index' % alias)
+
+        for name, names in aliases.items():
+            self.indices[name].aliases = names
+            self.indices[name].write_aliases = writes[name]
+        for name in removed:
+            self.indices.pop(name, None)
+        return dict(acknowledged=True)
+
+    def put_mapping(self, expression, doc_type, body):
+        """
+        Add the properties to the mapping of all indices. Like Elasticsearch, a field can not change its type.
+        """
+        names = self.resolve(expression)
+        for name in names:
+            mapping = self.indices[name].mappings.get(doc_type, dict())
+            for field, spec in body.get('properties', dict()).items():
+                current = mapping.get('properties', dict()).get(field)
+                if current is not None and current.get('type', 'object') != spec.get('type', 'object'):
+                    raise ElasticError(400, 'illegal_argument_exception',
+                                       'mapper [%s] of different type, current_type [%s], merged_type [%s]' % (
+                                           field, current.get('type', 'object'), spec.get('type', 'object')))
+        for name in names:
+            idx = self.indices[name]
+            idx.mappings = _merge(idx.mappings, {doc_type: dict(properties=body.get('properties', dict()))})
+        return dict(acknowledged=True)
+
+    # ------------------------------
+    # documents
+    def put_settings(self, expression, body):
+        """
+        Merge the settings into all indices. Dotted keys like 'index.blocks.write' are expanded.
+        """
+        settings = dict()
+        for key, value in body.items():
+            obj = settings
+            parts = key.split('.')
+            for part in parts[:-1]:
+                obj = obj.setdefault(part, dict())
+            obj[parts[-1]] = value
+        for name in self.resolve(expression):
+            self.indices[name].settings = _merge(self.indices[name].settings, settings)
+        return dict(acknowledged=True)
+
+    def index_doc(self, index, doc_type, id, source, op_type='index'):
+        idx = self._single_index(index, create=True, write=True)
+        idx.check_write()
+        if id is None:
+            id = uuid.uuid4().hex[:20]
+        id = str(id)
+
+        existing = idx.docs.get(id)
+        if existing is not None and op_type == 'create':
+            raise ElasticError(409, 'version_conflict_engine_exception',
+                               '[%s][%s]: version conflict, document already exists' % (doc_type, id))
+        version = existing[1] + 1 if existing is not None else 1
+        idx.put(id, (doc_type or '_doc', version, source), next(self._counter))
+
+        return dict(
+            _index=idx.name,
+            _type=doc_type or '_doc',
+            _id=id,
+            _version=version,
+            result='updated' if existing is not None else 'created',
+            _shards=SHARDS,
+            _seq_no=version - 1,
+            _primary_term=1
+        )
+
+    def get_doc(self, index, doc_type, id, source=([], [])):
+        idx = self._single_index(index)
+        doc = idx.docs.get(str(id))
+        if doc is None:
+            body = dict(_index=idx.name, _type=doc_type or '_doc', _id=str(id), found=False)
+            raise ElasticError(404, 'not_found', 'document [%s] not found' % id, body=body)
+
+        result = dict(_index=idx.name, _type=doc[0], _id=str(id), _version=doc[1], found=True)
+        if source is not False:
+            result['_source'] = _filter_source(doc[2], *source) if source != ([], []) else doc[2]
+        return result
+
+    def update_doc(self, index, doc_type, id, body):
+        idx = self._single_index(index, write=True)
+        idx.check_write()
+        id = str(id)
+        if 'script' in body:
+            raise ElasticError(400, 'illegal_argument_exception', 'Scripted updates are not supported.')
+
+        existing = idx.docs.get(id)
+        if existing is None:
+            if body.get('doc_as_upsert', False):
+                source = body.get('doc', dict())
+            elif 'upsert' in body:
+                source = body['upsert']
+            else:
+                raise ElasticError(404, 'document_missing_exception', '[%s][%s]: document missing' % (doc_type, id))
+            return self.index_doc(idx.name, doc_type, id, source)
+
+        source = _merge(existing[2], body.get('doc', dict()))
+        if source == existing[2] and body.get('detect_noop', True):
+            result, version = 'noop', existing[1]
+        else:
+            result, version = 'updated', existing[1] + 1
+            idx.put(id, (existing[0], version, source), next(self._counter))
+
+        return dict(_index=idx.name, _type=existing[0], _id=id, _version=version, result=result, _shards=SHARDS)
+
+    def delete_doc(self, index, doc_type, id):
+        idx = self._single_index(index, write=True)
+        idx.check_write()
+        id = str(id)
+        existing = idx.remove(id, next(self._counter))
+        if existing is None:
+            body = dict(_index=idx.name, _type=doc_type or '_doc', _id=id, _version=1, result='not_found',
+                        _shards=SHARDS)
+            raise ElasticError(404, 'not_found', 'document [%s] not found' % id, body=body)
+        return dict(_index=idx.name, _type=existing[0], _id=id, _version=existing[1] + 1, result='deleted',
+                    _shards=SHARDS)
+
+    def mget(self, index, doc_type, body, params):
+        if 'docs' in body:
+            specs = body['docs']
+        else:
+            specs = [dict(_id=id) for id in body.get('ids', [])]
+        default_source = _source_params(params)
+
+        docs = []
+        for spec in specs:
+            name = spec.get('_index', index)
+            source = _source_spec(spec['_source']) if '_source' in spec else default_source
+            try:
+                docs.append(self.get_doc(name, spec.get('_type', doc_type), spec['_id'], source))
+            except ElasticError as e:
+                if e._body is not None:
+                    docs.append(e._body)
+                else:
+                    docs.append(dict(_index=name, _type=spec.get('_type', doc_type), _id=str(spec['_id']),
+                                     error=e.error()))
+        return dict(docs=docs)
+
+    def bulk(self, index, doc_type, body, params):
+        start = time.monotonic()
+        lines = iter(l for l in body.splitlines() if l.strip() != '')
+        items = []
+
+        for line in lines:
+            (op, meta), = json.loads(line).items()
+            source = json.loads(next(lines)) if op != 'delete' else None
+            name = meta.get('_index', index)
+            type = meta.get('_type', doc_type)
+            id = meta.get('_id')
+
+            try:
+                if op in ('index', 'create'):
+                    result = self.index_doc(name, type, id, source, op_type=op)
+                elif op == 'update':
+                    result = self.update_doc(name, type, id, source)
+                elif op == 'delete':
+                    result = self.delete_doc(name, type, id)
+                else:
+                    raise ElasticError(400, 'illegal_argument_exception', 'Malformed action [%s]' % op)
+                result['status'] = 201 if result['result'] == 'created' else 200
+            except ElasticError as e:
+                result = dict(_index=name, _type=type, _id=id, status=e.status, error=e.error())
+                if e._body is not None:
+                    result = dict(e._body, status=e.status)
+            items.append({op: result})
+
+        return dict(
+            took=int((time.monotonic() - start) * 1000),
+            errors=any(item[op].get('status', 200) >= 300 for item in items for op in item),
+            items=items
+        )
+
+    # ------------------------------
+    # search
+    def _candidates(self, idx, query):
+        """
+        Use the secondary indexes of the index to find the documents, that may match the query.
+        The query is still evaluated on each candidate, thus the candidates only have to include
+        all matching documents.
+
+        :return: set of ids, or None if all documents have to be evaluated
+        """
+        if not query:
+            return None
+        (kind, spec), = query.items()
+
+        if kind == 'ids':
+            return set(str(v) for v in _as_list(spec.get('values')))
+        if kind == 'match_none':
+            return set()
+        if kind == 'constant_score':
+            return self._candidates(idx, spec.get('filter'))
+
+        if kind in ('term', 'terms', 'match'):
+            field, value = self._field_spec(spec)
+            if isinstance(value, dict):
+                value = value.get('query', value.get('value'))
+            values = value if kind == 'terms' else [value]
+            if field == '_id':
+                return set(str(v) for v in values)
+            if kind == 'match':
+                postings = idx.tokens(field)
+                return set().union(*[postings.get(t, ()) for t in set(_tokens(value))])
+            return set().union(*[idx.lookup(field, v) for v in values])
+
+        if kind == 'multi_match':
+            ids = set()
+            tokens = set(_tokens(spec.get('query')))
+            for field in _as_list(spec.get('fields', ['*'])):
+                field = field.partition('^')[0]
+                if '*' in field:
+                    return None
+                postings = idx.tokens(field)
+                ids.update(*[postings.get(t, ()) for t in tokens])
+            return ids
+
+        if kind == 'geo_bounding_box':
+            field, box = self._field_spec(spec, options=('validation_method', 'type', 'ignore_unmapped'))
+            columns = idx.columns(field)
+            if columns is None or 'top_left' not in box:
+                return None
+            top, left = _point(box['top_left'])
+            bottom, right = _point(box['bottom_right'])
+            lat, lon = columns['lat'], columns['lon']
+            mask = (lat >= bottom) & (lat <= top)
+            mask &= ((lon >= left) & (lon <= right)) if left <= right else ((lon >= left) | (lon <= right))
+            ids = columns['ids']
+            return set(ids[i] for i in np.flatnonzero(mask).tolist())
+
+        if kind == 'bool':
+            must = _as_list(spec.get('must')) + _as_list(spec.get('filter'))
+            should = _as_list(spec.get('should'))
+            sets = [c for c in (self._candidates(idx, q) for q in must) if c is not None]
+
+            # at least one should clause has to match
+            default = 1 if len(should) > 0 and len(must) == 0 else 0
+            if _minimum_should_match(spec.get('minimum_should_match'), len(should), default) > 0:
+                should_sets = [self._candidates(idx, q) for q in should]
+                if all(c is not None for c in should_sets):
+                    sets.append(set().union(*should_sets))
+
+            if len(sets) == 0:
+                return None
+            sets.sort(key=len)
+            return sets[0].intersection(*sets[1:])
+
+        return None
+
+    def _match(self, indices, doc_type, query):
+        """
+        Return the hits of all documents matching the query, in index and insertion order.
+        """
+        types = set(_split(doc_type)) - {'_doc'}
+        hits = []
+        for name in indices:
+            idx = self.indices[name]
+            candidates = self._candidates(idx, query)
+            if candidates is None:
+                docs = idx.docs.items()
+            elif len(candidates) * 4 > len(idx.docs):
+                docs = ((id, doc) for id, doc in idx.docs.items() if id in candidates)
+            else:
+                ids = sorted((c for c in candidates if c in idx.docs), key=idx.order.get)
+                docs = ((id, idx.docs[id]) for id in ids)
+
+            for id, (type, version, source) in docs:
+                if len(types) > 0 and type not in types:
+                    continue
+                score = self._score(query, id, source)
+                if score is not None:
+                    hits.append(_Hit(name, id, type, source, score))
+        return hits
+
+    @staticmethod
+    def _sort_spec(sort):
+        spec = []
+        for s in _as_list(sort):
+            if isinstance(s, str):
+                field, order = s, 'desc' if s == '_score' else 'asc'
+            else:
+                (field, options), = s.items()
+                order = options if isinstance(options, str) else options.get('order', 'asc')
+            spec.append((field, order == 'desc'))
+        return spec
+
+    def _sort(self, hits, spec):
+        """
+        Sort the hits by the sort spec and set the sort values of each hit. Missing values are sorted last.
+        """
+        if spec is None:
+            if any(h.score != 1. for h in hits):
+                hits.sort(key=lambda h: -h.score)
+            return hits
+
+        for h in hits:
+            h.sort = [self._sort_value(h, field, desc) for field, desc in spec]
+
+        # stable sort by each field, starting with the last one
+        try:
+            for i, (field, desc) in reversed(list(enumerate(spec))):
+                if desc:
+                    hits.sort(key=lambda h: (h.sort[i] is not None, h.sort[i]), reverse=True)
+                else:
+                    hits.sort(key=lambda h: (h.sort[i] is None, h.sort[i]))
+        except TypeError:
+            # the field holds values of different types
+            hits.sort(key=cmp_to_key(lambda a, b: self._compare_sort(a.sort, b.sort, spec)))
+        return hits
+
+    @staticmethod
+    def _compare_sort(a, b, spec):
+        for x, y, (_, desc) in zip(a, b, spec):
+            if x is None or y is None:
+                if x is None and y is None:
+                    continue
+                return 1 if x is None else -1
+            c = _compare(x, y)
+            if c != 0:
+                return -c if desc else c
+        return 0
+
+    def _search_after(self, hits, after, spec):
+        """
+        Return the hits after the given sort values, found by bisection of the sorted hits.
+        """
+        lo, hi = 0, len(hits)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._compare_sort(hits[mid].sort, after, spec) > 0:
+                hi = mid
+            else:
+                lo = mid + 1
+        return hits[lo:]
+
+    def _sorted_hits(self, indices, doc_type, query, spec):
+        """
+        Return the sorted hits of the query. The results of the last queries are cached until one of
+        the indices is changed, thus paging through the same query does not evaluate it again.
+        """
+        key = (tuple(indices), doc_type, json.dumps(query, sort_keys=True), json.dumps(spec))
+        generations = tuple(self.indices[name].generation for name in indices)
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == generations:
+            self._results.move_to_end(key)
+            return cached[1]
+
+        hits = self._sort(self._match(indices, doc_type, query), spec)
+        self._results[key] = (generations, hits)
+        while len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return hits
+
+    @staticmethod
+    def _sort_value(hit, field, desc):
+        if field == '_id':
+            return hit.id
+        if field == '_score':
+            return hit.score
+        if field == '_doc':
+            return None
+        values = [v for v in _values(hit.source, field) if not isinstance(v, dict)]
+        if len(values) == 0:
+            return None
+        return max(values) if desc else min(values)
+
+    def _hit(self, hit, source):
+        result = dict(_index=hit.index, _type=hit.type, _id=hit.id, _score=hit.score)
+        if source is not False:
+            result['_source'] = _filter_source(hit.source, *source) if source != ([], []) else hit.source
+        if hit.sort is not None:
+            result['sort'] = hit.sort
+        return result
+
+    def search(self, index, doc_type, body, params):
+        start = time.monotonic()
+        indices = self.resolve(index, missing_ok=_parse_bool(params.get('ignore_unavailable')))
+        size = int(params.get('size', body.get('size', 10)))
+        offset = int(params.get('from', body.get('from', 0)))
+        source = _source_params(params) if any(k.startswith('_source') for k in params) \
+            else _source_spec(body.get('_source'))
+
+        spec = self._sort_spec(body['sort']) if body.get('sort') is not None else None
+        hits = self._sorted_hits(indices, doc_type, body.get('query'), spec)
+        aggregations = self._aggregate(body['aggs'], hits) if body.get('aggs') else None
+        total = len(hits)
+
+        if body.get('search_after') is not None:
+            if spec is None:
+                raise ElasticError(400, 'search_context_exception', 'Sort must contain at least one field.')
+            hits = self._search_after(hits, body['search_after'], spec)
+
+        response = dict(timed_out=False, _shards=SHARDS)
+        if 'scroll' in params:
+            scroll_id = 'memory-scroll-%d' % next(self._counter)
+            self._drop_expired_scrolls()
+            expires = time.monotonic() + _parse_time(params['scroll'])
+            self._scrolls[scroll_id] = [hits[size:], size, source, expires]
+            response['_scroll_id'] = scroll_id
+            page = hits[:size]
+        else:
+            if offset + size > MAX_RESULT_WINDOW:
+                raise ElasticError(
+                    400, 'illegal_argument_exception',
+                    'Result window is too large, from + size must be less than or equal to: [%d] but was [%d].' % (
+                        MAX_RESULT_WINDOW, offset + size)
+                )
+            page = hits[offset:offset + size]
+
+        response['hits'] = dict(
+            total=total,
+            max_score=max((h.score for h in page), default=None),
+            hits=[self._hit(h, source) for h in page]
+        )
+        if aggregations is not None:
+            response['aggregations'] = aggregations
+        if body.get('profile', False):
+            response['profile'] = dict(shards=[])
+        response['took'] = int((time.monotonic() - start) * 1000)
+        return response
+
+    def count(self, index, doc_type, body):
+        return dict(count=len(self._sorted_hits(self.resolve(index), doc_type, body.get('query'), None)), _shards=SHARDS)
+
+    def _drop_expired_scrolls(self):
+        now = time.monotonic()
+        for scroll_id in [s for s, ctx in self._scrolls.items() if ctx[3] < now]:
+            del self._scrolls[scroll_id]
+
+    def scroll(self, scroll_id, scroll=None):
+        ctx = self._scrolls.get(scroll_id)
+        if ctx is None or ctx[3] < time.monotonic():
+            raise ElasticError(404, 'search_context_missing_exception', 'No search context found for id [%s]' % scroll_id)
+
+        hits, size, source, _ = ctx
+        page, ctx[0] = hits[:size], hits[size:]
+        ctx[3] = time.monotonic() + _parse_time(scroll)
+        return dict(
+            _scroll_id=scroll_id,
+            took=0,
+            timed_out=False,
+            _shards=SHARDS,
+            hits=dict(total=len(hits), max_score=None, hits=[self._hit(h, source) for h in page])
+        )
+
+    def clear_scroll(self, scroll_id):
+        freed = 0
+        for s in _split(scroll_id):
+            if self._scrolls.pop(s, None) is not None:
+                freed += 1
+        return dict(succeeded=True, num_freed=freed)
+
+    # ------------------------------
+    # queries
+    def _score(self, query, id, source):
+        """
+        Evaluate the query on a single document.
+
+        :return: the score, or None if the document does not match
+        """
+        if not query:
+            return 1.
+        (kind, spec), = query.items()
+        method = getattr(self, '_query_' + kind, None)
+        if method is None:
+            raise ElasticError(400, 'parsing_exception', 'no [query] registered for [%s]' % kind)
+        return method(spec, id, source)
+
+    @staticmethod
+    def _field_spec(spec, options=()):
+        """
+        Split the query spec of the form {field: value, option: value} into (field, value).
+        """
+        fields = [(k, v) for k, v in spec.items() if k not in ('boost', '_name') + tuple(options)]
+        if len(fields) != 1:
+            raise ElasticError(400, 'parsing_exception', 'The query has to target exactly one field.')
+        return fields[0]
+
+    def _query_match_all(self, spec, id, source):
+        return float(spec.get('boost', 1.))
+
+    def _query_match_none(self, spec, id, source):
+        return None
+
+    def _query_bool(self, spec, id, source):
+        must = _as_list(spec.get('must'))
+        filters = _as_list(spec.get('filter'))
+        should = _as_list(spec.get('should'))
+        must_not = _as_list(spec.get('must_not'))
+
+        score = 0.
+        for q in must:
+            s = self._score(q, id, source)
+            if s is None:
+                return None
+            score += s
+        for q in filters:
+            if self._score(q, id, source) is None:
+                return None
+        for q in must_not:
+            if self._score(q, id, source) is not None:
+                return None
+
+        matched = 0
+        for q in should:
+            s = self._score(q, id, source)
+            if s is not None:
+                matched += 1
+                score += s
+        default = 1 if len(should) > 0 and len(must) == 0 and len(filters) == 0 else 0
+        if matched < _minimum_should_match(spec.get('minimum_should_match'), len(should), default):
+            return None
+
+        if len(must) == 0 and len(should) == 0 and len(filters) == 0:
+            return 1.
+        return score
+
+    def _query_constant_score(self, spec, id, source):
+        if self._score(spec.get('filter'), id, source) is None:
+            return None
+        return float(spec.get('boost', 1.))
+
+    def _query_term(self, spec, id, source):
+        field, value = self._field_spec(spec)
+        if isinstance(value, dict):
+            value = value.get('value')
+        if field == '_id':
+            return 1. if id == str(value) else None
+        return 1. if any(_equal(v, value) for v in _values(source, field)) else None
+
+    def _query_terms(self, spec, id, source):
+        field, values = self._field_spec(spec)
+        if field == '_id':
+            return 1. if id in set(str(v) for v in values) else None
+        return 1. if any(_equal(v, value) for v in _values(source, field) for value in values) else None
+
+    def _query_ids(self, spec, id, source):
+        return 1. if id in set(str(v) for v in _as_list(spec.get('values'))) else None
+
+    def _query_exists(self, spec, id, source):
+        return 1. if len(_values(source, spec['field'])) > 0 else None
+
+    def _query_prefix(self, spec, id, source):
+        field, value = self._field_spec(spec)
+        if isinstance(value, dict):
+            value = value.get('value')
+        return 1. if any(str(v).startswith(str(value)) for v in _values(source, field)) else None
+
+    def _query_range(self, spec, id, source):
+        field, bounds = self._field_spec(spec)
+        checks = dict(gt=lambda v, b: _compare(v, b) > 0, gte=lambda v, b: _compare(v, b) >= 0,
+                      lt=lambda v, b: _compare(v, b) < 0, lte=lambda v, b: _compare(v, b) <= 0)
+        for value in _values(source, field):
+            if all(check(value, bounds[op]) for op, check in checks.items() if op in bounds):
+                return 1.
+        return None
+
+    def _query_match(self, spec, id, source):
+        field, query = self._field_spec(spec)
+        options = query if isinstance(query, dict) else dict(query=query)
+        if field == '_id':
+            return 1. if id == str(options['query']) else None
+
+        tokens = set(_tokens(options['query']))
+        if len(tokens) == 0:
+            return None
+        matched = len(tokens & set(_tokens(_values(source, field))))
+        if options.get('operator', 'or').lower() == 'and':
+            required = len(tokens)
+        else:
+            required = max(1, _minimum_should_match(options.get('minimum_should_match'), len(tokens), 1))
+        return float(matched) * float(options.get('boost', 1.)) if matched >= required else None
+
+    def _query_match_phrase(self, spec, id, source):
+        field, query = self._field_spec(spec)
+        query = query.get('query') if isinstance(query, dict) else query
+        phrase = ' '.join(_tokens(query))
+        return 1. if any(phrase in ' '.join(_tokens(v)) for v in _values(source, field)) else None
+
+    def _query_multi_match(self, spec, id, source):
+        tokens = set(_tokens(spec.get('query')))
+        if len(tokens) == 0:
+            return None
+
+        matched = set()
+        scores = []
+        for field in _as_list(spec.get('fields', ['*'])):
+            field, _, boost = field.partition('^')
+            if field == '*':
+                values = [v for v in source.values() if isinstance(v, str)]
+            else:
+                values = _values(source, field)
+            found = tokens & set(_tokens(values))
+            matched.update(found)
+            scores.append(len(found) * float(boost or 1.))
+
+        required = max(1, _minimum_should_match(spec.get('minimum_should_match'), len(tokens), 1))
+        if len(matched) < required:
+            return None
+        if spec.get('type', 'best_fields') in ('most_fields', 'cross_fields'):
+            return float(sum(scores))
+        best = max(scores)
+        return best + float(spec.get('tie_breaker', 0.)) * (sum(scores) - best)
+
+    def _query_geo_bounding_box(self, spec, id, source):
+        field, box = self._field_spec(spec, options=('validation_method', 'type', 'ignore_unmapped'))
+        if 'top_left' in box:
+            top, left = _point(box['top_left'])
+            bottom, right = _point(box['bottom_right'])
+        else:
+            top, left, bottom, right = box['top'], box['left'], box['bottom'], box['right']
+
+        for lat, lon in _points(source, field):
+            if not bottom <= lat <= top:
+                continue
+            # boxes crossing the dateline have left > right
+            if (left <= lon <= right) if left <= right else (lon >= left or lon <= right):
+                return 1.
+        return None
+
+    # ------------------------------
+    # aggregations
+    def _aggregate(self, aggs, hits):
+        result = dict()
+        for name, spec in aggs.items():
+            sub = spec.get('aggs', spec.get('aggregations'))
+            kinds = [k for k in spec.keys() if k not in ('aggs', 'aggregations', 'meta')]
+            if len(kinds) != 1:
+                raise ElasticError(400, 'parsing_exception', 'Expected exactly one aggregation type in [%s]' % name)
+            method = getattr(self, '_agg_' + kinds[0], None)
+            if method is None:
+                raise ElasticError(400, 'parsing_exception', 'Unknown aggregation type [%s]' % kinds[0])
+            result[name] = method(spec[kinds[0]], hits, sub)
+        return result
+
+    def _buckets(self, groups, size, sub):
+        """
+        Build the buckets from a dict of key: hits, ordered by the document count and key.
+        """
+        keys = sorted(groups.keys(), key=lambda k: (-len(groups[k]), k))[:size]
+        buckets = []
+        for key in keys:
+            bucket = dict(key=key, doc_count=len(groups[key]))
+            if sub:
+                bucket.update(self._aggregate(sub, groups[key]))
+            buckets.append(bucket)
+        return buckets
+
+    def _covers(self, hits):
+        """
+        :return: list of the indices, if the hits are all documents of these indices, else None
+        """
+        names = set(h.index for h in hits)
+        if sum(len(self.indices[name].docs) for name in names) != len(hits):
+            return None
+        return [self.indices[name] for name in sorted(names)]
+
+    def _agg_terms(self, spec, hits, sub):
+        indices = self._covers(hits) if not sub else None
+        if indices is not None:
+            # count the documents from the value index
+            counts = dict()
+            for idx in indices:
+                for value, ids in idx.values(spec['field']).items():
+                    if len(ids) > 0:
+                        counts[value] = counts.get(value, 0) + len(ids)
+            size = int(spec.get('size', 10))
+            keys = sorted(counts.keys(), key=lambda k: (-counts[k], k))[:size]
+            buckets = [dict(key=key, doc_count=counts[key]) for key in keys]
+            other = sum(counts.values()) - sum(b['doc_count'] for b in buckets)
+            return dict(doc_count_error_upper_bound=0, sum_other_doc_count=other, buckets=buckets)
+
+        groups = dict()
+        for h in hits:
+            for value in set(v for v in _values(h.source, spec['field']) if not isinstance(v, dict)):
+                groups.setdefault(value, []).append(h)
+
+        buckets = self._buckets(groups, int(spec.get('size', 10)), sub)
+        other = sum(len(g) for g in groups.values()) - sum(b['doc_count'] for b in buckets)
+        return dict(doc_count_error_upper_bound=0, sum_other_doc_count=other, buckets=buckets)
+
+    def _grid(self, keys, owners, hits, size, sub):
+        """
+        Build the buckets of a grid aggregation from one cell key per point and the index of the hit
+        of each point.
+        """
+        if len(keys) == 0:
+            return dict(buckets=[])
+
+        # count each document only once per cell
+        cells = np.unique(np.stack([np.asarray(keys, dtype=str), owners.astype(str)]), axis=1)[0] \
+            if len(set(owners.tolist())) < len(owners) else np.asarray(keys, dtype=str)
+
+        if not sub:
+            unique, counts = np.unique(cells, return_counts=True)
+            order = np.lexsort((unique, -counts))[:size]
+            return dict(buckets=[dict(key=str(unique[i]), doc_count=int(counts[i])) for i in order])
+
+        groups = dict()
+        for key, owner in zip(np.asarray(keys, dtype=str).tolist(), owners.tolist()):
+            group = groups.setdefault(key, [])
+            if len(group) == 0 or group[-1] is not hits[owner]:
+                group.append(hits[owner])
+        return dict(buckets=self._buckets(groups, size, sub))
+
+    def _grid_rows(self, field, hits):
+        """
+        Find the rows of the hits in the point columns of their index.
+
+        :return: list of (index, rows, owners) tuples, or None if an index has no point columns
+        """
+        groups = OrderedDict()
+        for i, h in enumerate(hits):
+            groups.setdefault(h.index, []).append(i)
+
+        result = []
+        for name, owners in groups.items():
+            idx = self.indices[name]
+            columns = idx.columns(field)
+            if columns is None:
+                return None
+            rows = columns['rows']
+            found = [(rows[hits[i].id], i) for i in owners if hits[i].id in rows]
+            result.append((
+                idx,
+                np.asarray([r for r, _ in found], dtype=np.int64),
+                np.asarray([i for _, i in found], dtype=np.int64)
+            ))
+        return result
+
+    def _grid_points(self, field, hits):
+        groups = self._grid_rows(field, hits)
+        if groups is not None:
+            lat = [idx.columns(field)['lat'][rows] for idx, rows, _ in groups]
+            lon = [idx.columns(field)['lon'][rows] for idx, rows, _ in groups]
+            owners = [o for _, _, o in groups]
+            if len(groups) == 0:
+                return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+            return np.concatenate(lat), np.concatenate(lon), np.concatenate(owners)
+
+        lat, lon, owners = [], [], []
+        for i, h in enumerate(hits):
+            for p in _points(h.source, field):
+                lat.append(p[0])
+                lon.append(p[1])
+                owners.append(i)
+        return np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64), np.asarray(owners, dtype=np.int64)
+
+    def _agg_geohash_grid(self, spec, hits, sub):
+        try:
+            precision = int(spec.get('precision', 5))
+        except ValueError:
+            raise ElasticError(400, 'illegal_argument_exception',
+                               'Only integer geohash precisions are supported, found [%s]' % spec.get('precision'))
+        size = int(spec.get('size', 10000))
+
+        # the geohash keys are cached with the point columns of the index
+        groups = self._grid_rows(spec['field'], hits)
+        if groups is not None and len(groups) > 0:
+            keys = np.concatenate([idx.geohash(spec['field'], precision)[rows] for idx, rows, _ in groups])
+            return self._grid(keys, np.concatenate([o for _, _, o in groups]), hits, size, sub)
+
+        lat, lon, owners = self._grid_points(spec['field'], hits)
+        keys = encode_array(lat, lon, precision=precision) if len(lat) > 0 else []
+        return self._grid(keys, owners, hits, size, sub)
+
+    def _agg_geotile_grid(self, spec, hits, sub):
+        zoom = int(spec.get('precision', 7))
+        lat, lon, owners = self._grid_points(spec['field'], hits)
+        n = 2 ** zoom
+        x = np.clip(np.floor((lon + 180.) / 360. * n), 0, n - 1).astype(np.int64)
+        rad = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+        y = np.clip(np.floor((1. - np.log(np.tan(rad) + 1. / np.cos(rad)) / math.pi) / 2. * n), 0, n - 1).astype(np.int64)
+        keys = ['%d/%d/%d' % (zoom, i, j) for i, j in zip(x.tolist(), y.tolist())]
+        return self._grid(keys, owners, hits, int(spec.get('size', 10000)), sub)
+
+    def _agg_geo_centroid(self, spec, hits, sub):
+        lat, lon, _ = self._grid_points(spec['field'], hits)
+        if len(lat) == 0:
+            return dict(count=0)
+        return dict(location=dict(lat=float(lat.mean()), lon=float(lon.mean())), count=int(len(lat)))
+
+    # ------------------------------
+    # reindex and tasks
+    def reindex(self, body, params):
+        start = time.monotonic()
+        source = body.get('source', dict())
+        dest = body.get('dest', dict())
+        op_type = dest.get('op_type', 'index')
+
+        hits = self._match(self.resolve(source.get('index')), source.get('type'), source.get('query'))
+        script = _compile_script(body['script']) if body.get('script') is not None else None
+        created = updated = 0
+        failures = []
+        for h in hits:
+            doc = script(h.id, h.index, json.loads(json.dumps(h.source))) if script is not None else h.source
+            try:
+                result = self.index_doc(dest['index'], dest.get('type', h.type), h.id, doc, op_type=op_type)
+            except ElasticError as e:
+                failures.append(dict(index=dest['index'], type=h.type, id=h.id, status=e.status, cause=e.error()))
+                continue
+            if result['result'] == 'created':
+                created += 1
+            else:
+                updated += 1
+
+        status = dict(total=len(hits), created=created, updated=updated, deleted=0, batches=1, version_conflicts=0,
+                      noops=0, retries=dict(bulk=0, search=0), throttled_millis=0, requests_per_second=-1.0,
+                      throttled_until_millis=0)
+        response = dict(status, took=int((time.monotonic() - start) * 1000), timed_out=False, failures=failures)
+
+        if _parse_bool(params.get('wait_for_completion'), default=True):
+            return response
+
+        task_id = 'memory:%d' % next(self._counter)
+        self._tasks[task_id] = dict(
+            completed=True,
+            task=dict(node='memory', id=int(task_id.split(':')[1]), type='transport',
+                      action='indices:data/write/reindex', status=status,
+                      description='reindex from %s to %s' % (source.get('index'), dest['index'])),
+            response=response
+        )
+        return dict(task=task_id)
+
+    def get_task(self, task_id):
+        if task_id not in self._tasks:
+            raise ElasticError(404, 'resource_not_found_exception', 'task [%s] isn\'t running and hasn\'t stored its results' % task_id)
+        return self._tasks[task_id]
+
+
+# store used by connections without an explicit store
+default_store = MemoryStore()
+
+
+class MemoryConnection(Connection):
+    """
+    Connection of the elasticsearch client to a `MemoryStore`, pass it as `connection_class` to
+    `elasticsearch.Elasticsearch`. All connections share the `default_store`, unless a :param store:
+    is given.
+    """
+    def __init__(self, host='localhost', port=None, store=None, **kwargs):
+        super().__init__(host=host, port=port, **kwargs)
+        self.store = store if store is not None else default_store
+        self.host = 'memory://%s' % host
+
+    def perform_request(self, method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        start = time.time()
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+
+        try:
+            status, data = self.store.request(method, url, params=params, body=body)
+        except ElasticError as e:
+            status, data = e.status, e.body
+
+        if data is None:
+            raw = ''
+        elif isinstance(data, str):
+            raw = data
+        else:
+            raw = json.dumps(data)
+        duration = time.time() - start
+
+        if not (200 <= status < 300) and status not in ignore:
+            self.log_request_fail(method, url, url, body, duration, status, raw)
+            self._raise_error(status, raw)
+
+        self.log_request_success(method, url, url, body, status, raw, duration)
+        content_type = 'text/plain' if isinstance(data, str) else 'application/json; charset=UTF-8'
+        return status, {'content-type': content_type}, raw
+
+    def close(self):
+        pass
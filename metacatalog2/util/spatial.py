@@ -0,0 +1,134 @@
+"""
+Spatial index
+-------------
+
+In-process spatial index over the `location` geometries of Pages, based on the shapely STRtree.
+The WKT parsing is cached, so that the same geometry is only parsed once per process.
+"""
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+from shapely import wkt
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+
+@lru_cache(maxsize=4096)
+def load_wkt(location):
+    """
+    Parse the WKT string into a shapely geometry. The result is cached by the WKT string.
+
+    :param location: string, WKT
+    :return: shapely geometry
+    """
+    return wkt.loads(location)
+
+
+@lru_cache(maxsize=1024)
+def load_prepared(location):
+    """
+    Parse the WKT string into a prepared shapely geometry, which is faster for repeated predicates.
+    The result is cached by the WKT string.
+
+    :param location: string, WKT
+    :return: `shapely.prepared.PreparedGeometry`
+    """
+    return prep(load_wkt(location))
+
+
+class SpatialIndex:
+    """
+    Spatial index
+    -------------
+
+    STRtree index of geometries by id. The STRtree is immutable, therefore added and removed
+    geometries are only recorded and the tree is rebuilt from the geometries in memory before
+    the next query.
+    All query methods accept a single geometry, or a sequence of geometries. For a single geometry
+    a list of ids is returned, for a sequence a list of lists of ids.
+    """
+    def __init__(self, items=()):
+        self._geometries = dict()
+        self._tree = None
+        self._ids = []
+        self._lock = Lock()
+        for id, geometry in items:
+            self.add(id, geometry)
+
+    def __len__(self):
+        return len(self._geometries)
+
+    def add(self, id, geometry):
+        """
+        Add or replace the geometry of id. The geometry can be a shapely geometry or WKT.
+        """
+        if isinstance(geometry, str):
+            geometry = load_wkt(geometry)
+        with self._lock:
+            self._geometries[id] = geometry
+            self._tree = None
+
+    def remove(self, id):
+        with self._lock:
+            if self._geometries.pop(id, None) is not None:
+                self._tree = None
+
+    def _build(self):
+        with self._lock:
+            if self._tree is None:
+                self._ids = list(self._geometries.keys())
+                self._tree = STRtree([self._geometries[i] for i in self._ids])
+            return self._tree, self._ids
+
+    def _query(self, geometry, predicate):
+        tree, ids = self._build()
+        single = isinstance(geometry, (BaseGeometry, str))
+        geometries = [geometry] if single else list(geometry)
+        geometries = [load_wkt(g) if isinstance(g, str) else g for g in geometries]
+
+        results = [[] for _ in geometries]
+        if len(ids) > 0 and len(geometries) > 0:
+            input_idx, tree_idx = tree.query(np.array(geometries, dtype=object), predicate=predicate)
+            for i, t in zip(input_idx.tolist(), tree_idx.tolist()):
+                results[i].append(ids[t])
+
+        return results[0] if single else results
+
+    def intersects(self, geometry):
+        """
+        Return the ids of all geometries intersecting the given geometry.
+        """
+        return self._query(geometry, 'intersects')
+
+    def within(self, geometry):
+        """
+        Return the ids of all geometries within the given geometry.
+        """
+        # the predicate is evaluated as predicate(geometry, tree_geometry)
+        return self._query(geometry, 'contains')
+
+    def contains(self, geometry):
+        """
+        Return the ids of all geometries containing the given geometry.
+        """
+        return self._query(geometry, 'within')
+
+    def nearest(self, geometry):
+        """
+        Return the ids of the nearest geometries. If several geometries have the same distance,
+        all of them are returned.
+        """
+        tree, ids = self._build()
+        single = isinstance(geometry, (BaseGeometry, str))
+        geometries = [geometry] if single else list(geometry)
+        geometries = [load_wkt(g) if isinstance(g, str) else g for g in geometries]
+
+        results = [[] for _ in geometries]
+        if len(ids) > 0 and len(geometries) > 0:
+            input_idx, tree_idx = tree.query_nearest(np.array(geometries, dtype=object), all_matches=True)
+            for i, t in zip(input_idx.tolist(), tree_idx.tolist()):
+                results[i].append(ids[t])
+
+        return results[0] if single else results
@@ -0,0 +1,87 @@
+"""
+Shared fixtures of the test suite. All tests run against the in-memory Elasticsearch of
+`metacatalog2.util.memory`, therefore no Elasticsearch node is needed.
+"""
+import os
+import time
+
+# the backend has to be set before the shared client is built on import
+os.environ.setdefault('ELASTIC_BACKEND', 'memory')
+
+import pytest
+
+from metacatalog2.app import app as flask_app
+from metacatalog2.util.benchmark import use_memory_store
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace time.monotonic by a clock, which is only moved by setting `clock.now`."""
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def store():
+    """A new empty in-memory store, all in-process caches are reset."""
+    return use_memory_store()
+
+
+@pytest.fixture
+def requests_sent(store, monkeypatch):
+    """The list of (method, url) of all requests sent by the shared client from now on."""
+    from metacatalog2.elastic import es
+
+    calls = []
+    perform_request = es.transport.perform_request
+
+    def counted(method, url, *args, **kwargs):
+        calls.append((method, url))
+        return perform_request(method, url, *args, **kwargs)
+    monkeypatch.setattr(es.transport, 'perform_request', counted)
+    return calls
+
+
+@pytest.fixture
+def client(store):
+    flask_app.config['TESTING'] = True
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def contexts(store):
+    """The global 'meta' context and the 'proj' context, which is part of 'meta'."""
+    from metacatalog2.models import Context
+
+    created = dict()
+    for ctx in (Context(name='meta'), Context(name='proj', part_of=['meta'])):
+        ctx.create_index()
+        ctx.save(refresh=True)
+        created[ctx.name] = ctx
+    return created
+
+
+@pytest.fixture
+def pages(contexts):
+    """25 Pages in the 'proj' context, located around 49N 8E."""
+    from metacatalog2.models import Page
+
+    docs = [dict(
+        meta=dict(id='page-%d' % i),
+        title='Page %d' % i,
+        variable='air temperature' if i % 2 == 0 else 'discharge',
+        coordinates=dict(lat=49. + i * 0.01, lon=8. + i * 0.01),
+        location='POINT (%f %f)' % (8. + i * 0.01, 49. + i * 0.01)
+    ) for i in range(25)]
+    results = list(Page.bulk_create(docs, index='proj'))
+    assert all(ok for ok, _ in results)
+    return docs
@@ -0,0 +1,72 @@
+from metacatalog2.models import AggregationCache, Context, Page
+
+
+def test_bump_invalidates(clock):
+    cache = AggregationCache(refresh_interval=0)
+    assert cache.set('key', 'value', indices=['proj'])
+    assert cache.get('key', indices=['proj']) == 'value'
+
+    cache.bump(['meta'])
+    assert cache.get('key', indices=['proj']) == 'value'
+
+    cache.bump(['proj'])
+    assert cache.get('key', indices=['proj']) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_outdated_snapshot(clock):
+    cache = AggregationCache(refresh_interval=0)
+    snapshot = cache.snapshot(['proj'])
+
+    # a write while the aggregation is running
+    cache.bump(['proj'])
+    assert not cache.set('key', 'value', indices=['proj'], snapshot=snapshot)
+    assert cache.get('key', indices=['proj']) is None
+
+
+def test_refresh_window(clock):
+    cache = AggregationCache(refresh_interval=1)
+    cache.bump(['proj'])
+
+    # the write might not be visible to the aggregation yet
+    clock.now += 0.5
+    assert not cache.set('key', 'value', indices=['proj'], snapshot=cache.snapshot(['proj']))
+
+    clock.now += 1
+    assert cache.set('key', 'value', indices=['proj'], snapshot=cache.snapshot(['proj']))
+    assert cache.get('key', indices=['proj']) == 'value'
+
+
+def test_ttl(clock):
+    cache = AggregationCache(ttl=10, refresh_interval=0)
+    cache.set('key', 'value', indices=['proj'])
+    clock.now += 11
+    assert cache.get('key', indices=['proj']) is None
+
+
+def test_variables_cached_until_write(pages):
+    first = Page.variables(index='proj')
+    Page.variables(index='meta')
+    hits = Page.aggregation_cache.hits
+    assert Page.variables(index='proj') == first
+    assert Page.aggregation_cache.hits == hits + 1
+
+    page = Page(title='new', variable='soil moisture')
+    page.meta.index = 'proj'
+    page.create(refresh=True)
+
+    # the write to proj invalidates the meta alias as well
+    keys = [b['key'] for b in Page.variables(index='proj')]
+    assert 'soil moisture' in keys
+    assert 'soil moisture' in [b['key'] for b in Page.variables(index='meta')]
+    assert Page.aggregation_cache.hits == hits + 1
+
+
+def test_affected_names_of_alias(contexts):
+    # a Context name containing '_v' must not be cut like the name of a concrete index
+    ctx = Context(name='my_vendor', part_of=['proj'])
+    ctx.create_index()
+    ctx.save(refresh=True)
+
+    assert Page._affected_names('my_vendor') == ['meta', 'my_vendor', 'proj']
+    assert Page._affected_names('my_vendor_v1') == ['meta', 'my_vendor_v1', 'my_vendor', 'proj']
@@ -0,0 +1,29 @@
+import asyncio
+
+from metacatalog2 import aio
+from metacatalog2.models import Page
+
+
+def test_context_by_name(contexts):
+    ctx = asyncio.run(aio.context_by_name('proj'))
+    assert ctx.part_of == ['meta']
+
+
+def test_gather_pages(pages):
+    async def fetch():
+        return await asyncio.gather(
+            aio.get_page('page-1', context='proj'),
+            aio.get_pages(['page-2', 'page-3'], context='proj'),
+            aio.all_pages(index='proj', limit=5)
+        )
+    page, many, all_pages = asyncio.run(fetch())
+    assert page.meta.id == 'page-1'
+    assert len(many) == 2
+    assert len(all_pages) == 5
+
+
+def test_create_page(contexts):
+    page = Page(title='async')
+    page.meta.index = 'proj'
+    asyncio.run(aio.create_page(page, refresh=True))
+    assert Page.get(page.meta.id, context='proj').title == 'async'
@@ -0,0 +1,54 @@
+from metacatalog2.elastic import es, alias_map
+from metacatalog2.models import Context
+
+
+def aliases(index):
+    return sorted(es.indices.get_alias(index=index)[index]['aliases'])
+
+
+def test_alias_actions(contexts):
+    actions = contexts['proj'].alias_actions(current={'proj_v1': ['proj', 'old']})
+    assert actions == [
+        dict(remove=dict(index='proj_v1', alias='proj')),
+        dict(remove=dict(index='proj_v1', alias='old')),
+        dict(add=dict(index='proj_v1', alias='proj', is_write_index=True)),
+        dict(add=dict(index='proj_v1', alias='meta'))
+    ]
+
+
+def test_realias(contexts):
+    es.indices.put_alias(index='proj_v1', name='stale')
+    assert aliases('proj_v1') == ['meta', 'proj', 'stale']
+
+    assert Context.by_name('proj').realias()
+    assert aliases('proj_v1') == ['meta', 'proj']
+    assert alias_map.resolve('stale') is None
+
+
+def test_realias_one_request(contexts, monkeypatch):
+    calls = []
+    update_aliases = es.indices.update_aliases
+
+    def counted(*args, **kwargs):
+        calls.append(kwargs['body']['actions'])
+        return update_aliases(*args, **kwargs)
+    monkeypatch.setattr(es.indices, 'update_aliases', counted)
+
+    child = Context(name='sub', part_of=['proj', 'meta'])
+    child.create_index()
+    child.save(refresh=True)
+    calls.clear()
+
+    assert Context.by_name('proj').realias_hierarchy()
+    assert len(calls) == 1
+    assert aliases('sub_v1') == ['meta', 'proj', 'sub']
+    assert alias_map.resolve('proj') == ['proj_v1', 'sub_v1']
+
+
+def test_edit_context_realiases(client, contexts):
+    ctx = Context.by_name('proj')
+    client.put('/api/context', json=dict(name='group'))
+    result = client.post('/api/context/%s' % ctx.meta.id, json=dict(part_of=['group'])).get_json()
+
+    assert result['_source']['part_of'] == ['group']
+    assert aliases('proj_v1') == ['group', 'proj']
@@ -0,0 +1,32 @@
+import json
+
+from metacatalog2.util import benchmark
+
+
+def result(scenario, ops_per_sec, p99_ms, errors=0, size=100):
+    return dict(scenario=scenario, size=size, ops=10, ops_per_sec=ops_per_sec, p50_ms=1., p99_ms=p99_ms,
+                peak_rss_mb=None, errors=errors)
+
+
+def test_run(store):
+    results = benchmark.run(sizes=[100], requests=5)
+    assert results[0]['scenario'] == 'bulk_load' and results[0]['ops'] == 100
+    assert len(results) > 1
+    assert all(r['errors'] == 0 for r in results), [r for r in results if r['errors'] > 0]
+    assert all(benchmark.format_result(r) for r in results)
+
+
+def test_compare(tmp_path):
+    baseline = [result('get', 100., 10.), result('search', 50., 20.)]
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps(baseline))
+
+    assert benchmark.compare([result('get', 90., 11.)], str(path)) == []
+    regressions = benchmark.compare([
+        result('get', 70., 10.),
+        result('search', 50., 30., errors=1),
+        result('new', 1., 1000.)
+    ], baseline)
+    assert len(regressions) == 3
+    assert regressions[0].startswith('get (size=100)')
+    assert all(r.startswith('search') for r in regressions[1:])
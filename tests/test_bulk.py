@@ -0,0 +1,63 @@
+import json
+
+from metacatalog2.elastic import es
+from metacatalog2.models import Page
+
+
+def ndjson(*docs):
+    return '\n'.join(d if isinstance(d, str) else json.dumps(d) for d in docs) + '\n'
+
+
+def test_bulk_endpoint(client, contexts):
+    body = ndjson(dict(title='a'), dict(title='b'), '', dict(title='c'))
+    result = client.put('/api/proj/pages/_bulk?chunk_size=2', data=body).get_json()
+    assert result == dict(acknowleged=True, indexed=3, errors=[])
+    assert es.count(index='proj')['count'] == 3
+
+
+def test_bulk_invalid_line(client, contexts):
+    body = ndjson(dict(title='a'), '{"title": ', dict(title='c'))
+    result = client.put('/api/proj/pages/_bulk', data=body).get_json()
+
+    assert result['acknowleged'] is False
+    assert result['indexed'] == 2
+    assert len(result['errors']) == 1
+    assert result['errors'][0]['line'] == 2
+    assert result['errors'][0]['status'] == 400
+
+
+def test_bulk_rejected_documents(client, contexts):
+    es.indices.put_settings(index='proj_v1', body={'index.blocks.write': True})
+    result = client.put('/api/proj/pages/_bulk', data=ndjson(dict(meta=dict(id='a'), title='a'))).get_json()
+
+    assert result['acknowleged'] is False
+    assert result['indexed'] == 0
+    assert result['errors'][0]['id'] == 'a'
+    assert result['errors'][0]['status'] == 403
+
+
+def test_bulk_unknown_context(client, contexts):
+    result = client.put('/api/nothing/pages/_bulk', data=ndjson(dict(title='a'))).get_json()
+    assert result['error']['status'] == 404
+
+
+def test_bulk_create_sets_uid(contexts):
+    results = list(Page.bulk_create([dict(meta=dict(id='x1'), title='x')], index='proj'))
+    assert results[0][0] is True
+    source = es.get(index='proj', doc_type='page', id='x1')['_source']
+    assert source['uid'] == 'x1'
+    assert 'created' in source and 'edited' in source
+
+
+def test_bulk_non_object_lines(client, contexts):
+    body = ndjson(dict(title='a'), '[1, 2]', '"x"', dict(title='d'))
+    result = client.put('/api/proj/pages/_bulk', data=body).get_json()
+
+    assert result['indexed'] == 2
+    assert [(e['line'], e['status']) for e in result['errors']] == [(2, 400), (3, 400)]
+
+
+def test_bulk_chunk_size(client, contexts):
+    body = ndjson(dict(title='a'), dict(title='b'))
+    assert client.put('/api/proj/pages/_bulk?chunk_size=abc', data=body).get_json()['indexed'] == 2
+    assert client.put('/api/proj/pages/_bulk?chunk_size=0', data=body).get_json()['error']['status'] == 400
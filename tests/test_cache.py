@@ -0,0 +1,79 @@
+import pytest
+from requests import HTTPError
+
+from metacatalog2.models import LRUCache, Context
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    # b is the least recently used
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['size'] == 2
+
+
+def test_lru_ttl(clock):
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_lru_peek_and_stats():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.peek('a') == 1
+    assert cache.stats()['hits'] == 0
+
+    # peek does not touch the LRU order, a is still evicted first
+    cache.set('c', 3)
+    assert cache.peek('a') is None
+    assert cache.get('x') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_lru_invalidate():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.invalidate('a')
+    assert cache.get('a') is None and cache.get('b') == 2
+    cache.invalidate()
+    assert cache.get('b') is None
+
+
+def test_by_name_is_cached(contexts):
+    first = Context.by_name('proj')
+    hits = Context.cache.hits
+    assert Context.by_name('proj') is first
+    assert Context.cache.hits == hits + 1
+
+
+def test_by_name_invalidated_on_save(contexts):
+    ctx = Context.by_name('proj')
+    ctx.part_of = []
+    ctx.save(refresh=True)
+    assert Context.cache.peek('proj') is None
+    assert Context.by_name('proj').part_of == []
+
+
+def test_by_name_invalidated_on_delete(contexts):
+    Context.by_name('proj').delete(refresh=True)
+    with pytest.raises(HTTPError):
+        Context.by_name('proj')
+
+
+def test_by_names(contexts):
+    found = Context.by_names(['meta', 'proj'])
+    assert sorted(found) == ['meta', 'proj']
+    with pytest.raises(HTTPError):
+        Context.by_names(['meta', 'nothing'])
@@ -0,0 +1,30 @@
+import pytest
+from requests import HTTPError
+
+from metacatalog2.models import Context
+
+
+def test_by_name_single_request(contexts, requests_sent):
+    ctx = Context.by_name('proj', use_cache=False)
+    assert ctx.part_of == ['meta']
+    assert requests_sent == [('GET', '/index_list_v1/context/_search')]
+
+
+def test_by_name_not_found(contexts):
+    with pytest.raises(HTTPError) as e:
+        Context.by_name('nothing')
+    assert e.value.errno == 404
+
+
+def test_by_name_duplicate(contexts):
+    Context(name='proj', part_of=[]).save(refresh=True)
+    with pytest.raises(HTTPError) as e:
+        Context.by_name('proj', use_cache=False)
+    assert e.value.errno == 412
+    assert Context.by_name('proj', strict=False, use_cache=False).name == 'proj'
+
+
+def test_by_names_single_request(contexts, requests_sent):
+    found = Context.by_names(['meta', 'proj', 'meta'], use_cache=False)
+    assert sorted(found) == ['meta', 'proj']
+    assert len(requests_sent) == 1
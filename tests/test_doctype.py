@@ -0,0 +1,22 @@
+from metacatalog2 import elastic
+from metacatalog2.models import Page
+
+
+def test_all_single_request(pages, requests_sent):
+    assert len(Page.all(index='proj')) == 25
+    assert len(requests_sent) == 1
+
+    assert len(Page.all(index='proj', limit=5)) == 5
+
+
+def test_all_fields(pages):
+    docs = Page.all(index='proj', limit=3, fields=['title'])
+    assert all(list(page.to_dict()) == ['title'] for page in docs)
+
+
+def test_all_exceeding_result_window(pages, monkeypatch):
+    monkeypatch.setattr(elastic, 'MAX_RESULT_WINDOW', 10)
+
+    assert len(Page.all(index='proj')) == 25
+    assert len(Page.all(index='proj', limit=12)) == 12
+    assert len(Page.all(index='proj', limit=8)) == 8
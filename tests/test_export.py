@@ -0,0 +1,28 @@
+import json
+
+from metacatalog2.models import Page
+
+
+def test_scan(pages):
+    ids = [page.meta.id for page in Page.scan(index='proj', size=7)]
+    assert sorted(ids) == sorted(d['meta']['id'] for d in pages)
+
+
+def test_stream_ndjson(client, pages):
+    response = client.get('/api/proj/pages?stream=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 25
+    assert all('_source' in json.loads(line) for line in lines)
+
+
+def test_stream_json(client, pages):
+    response = client.get('/api/proj/pages?stream=json&fields=title')
+    assert response.mimetype == 'application/json'
+    docs = json.loads(response.get_data(as_text=True))
+    assert len(docs) == 25
+    assert all(list(d['_source']) == ['title'] for d in docs)
+
+
+def test_stream_invalid_format(client, pages):
+    assert client.get('/api/proj/pages?stream=xml').get_json()['error']['status'] == 400
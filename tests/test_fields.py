@@ -0,0 +1,42 @@
+import pytest
+
+from metacatalog2.elastic import source_filter, source_params, apply_source_filter
+from metacatalog2.models import Page
+
+
+def test_source_filter():
+    assert source_filter(None) is None
+    assert source_filter('title, variable') == dict(includes=['title', 'variable'])
+    assert source_filter(['-location', '-supplemetary']) == dict(excludes=['location', 'supplemetary'])
+    assert source_filter('title,-title.raw,') == dict(includes=['title'], excludes=['title.raw'])
+    assert source_filter('') == dict()
+
+
+def test_source_params():
+    assert source_params(None) == dict()
+    assert source_params('title,-location') == dict(_source_include='title', _source_exclude='location')
+
+
+def test_apply_source_filter():
+    doc = dict(title='a', location='POINT (1 1)', info=dict(votes=1))
+    assert apply_source_filter(doc, None) is doc
+    assert apply_source_filter(doc, 'title,info.votes') == dict(title='a', info=dict(votes=1))
+    assert apply_source_filter(doc, '-location') == dict(title='a', info=dict(votes=1))
+
+
+@pytest.mark.parametrize('url', [
+    '/api/proj/page/page-1?fields=title',
+    '/api/page/page-1?context=proj&fields=title'
+])
+def test_get_page_fields(client, pages, url):
+    assert list(client.get(url).get_json()['_source']) == ['title']
+
+
+def test_get_pages_exclude(client, pages):
+    docs = client.get('/api/proj/pages?fields=-location,-coordinates').get_json()
+    assert len(docs) == 25
+    assert all('location' not in d['_source'] and 'title' in d['_source'] for d in docs)
+
+
+def test_scan_fields(pages):
+    assert all(list(page.to_dict()) == ['variable'] for page in Page.scan(index='proj', fields='variable'))
@@ -0,0 +1,26 @@
+from metacatalog2.models import Page
+
+
+def test_fulltext(pages):
+    result = Page.fulltext('discharge', index='proj', size=50)
+    ids = [hit.meta.id for hit in result]
+    assert sorted(ids) == sorted('page-%d' % i for i in range(1, 25, 2))
+
+
+def test_fulltext_paging(pages):
+    first = [hit.meta.id for hit in Page.fulltext('discharge', index='proj', size=5)]
+    second = [hit.meta.id for hit in Page.fulltext('discharge', index='proj', size=5, offset=5)]
+    assert len(first) == len(second) == 5
+    assert set(first).isdisjoint(second)
+
+
+def test_search_endpoint(client, pages):
+    result = client.get('/api/proj/search?q=discharge&size=3&fields=title').get_json()
+    assert result['total'] == 12
+    assert len(result['hits']) == 3
+    assert all(list(hit['page']['_source']) == ['title'] for hit in result['hits'])
+    assert all(hit['score'] > 0 for hit in result['hits'])
+
+
+def test_search_endpoint_missing_query(client, pages):
+    assert client.get('/api/proj/search?q=').get_json()['error']['status'] == 400
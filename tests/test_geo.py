@@ -0,0 +1,99 @@
+import math
+
+import pytest
+
+from metacatalog2.util import geo
+
+
+def test_parse_bbox():
+    assert geo.parse_bbox(None) is None
+    assert geo.parse_bbox('7.5,47,10.5,50') == (7.5, 47., 10.5, 50.)
+    assert geo.parse_bbox([7.5, 47, 10.5, 50]) == (7.5, 47., 10.5, 50.)
+
+
+@pytest.mark.parametrize('bbox', ['1,2,3', 'a,b,c,d', '0,50,10,40', '0,-91,10,40', '-181,0,10,10'])
+def test_parse_bbox_invalid(bbox):
+    with pytest.raises(ValueError):
+        geo.parse_bbox(bbox)
+
+
+def test_parse_precision():
+    assert geo.parse_precision(None) is None
+    assert geo.parse_precision('5') == 5
+    assert geo.parse_precision(0, grid='geotile') == 0
+
+
+@pytest.mark.parametrize('precision,grid', [('abc', 'geohash'), (0, 'geohash'), (13, 'geohash'),
+                                            (-1, 'geotile'), (30, 'geotile'), ('1.5', 'geotile')])
+def test_parse_precision_invalid(precision, grid):
+    with pytest.raises(ValueError):
+        geo.parse_precision(precision, grid=grid)
+
+
+def test_bbox_filter():
+    assert geo.bbox_filter((7.5, 47., 10.5, 50.)) == dict(
+        top_left=dict(lat=50., lon=7.5),
+        bottom_right=dict(lat=47., lon=10.5)
+    )
+
+
+def test_geohash_cell_size():
+    assert geo.geohash_cell_size(1) == (45., 45.)
+    assert geo.geohash_cell_size(2) == (11.25, 5.625)
+
+
+def test_geohash_precision_max_buckets():
+    # the whole world fits into 32 cells of precision 1, but not into 1024 cells of precision 2
+    assert geo.geohash_precision(max_buckets=32) == 1
+    assert geo.geohash_precision(max_buckets=1024) == 2
+
+    bbox = (7.5, 47., 10.5, 50.)
+    precision = geo.geohash_precision(bbox=bbox, max_buckets=10000)
+    width, height = geo.geohash_cell_size(precision)
+    assert math.ceil(3 / width) * math.ceil(3 / height) <= 10000
+    width, height = geo.geohash_cell_size(precision + 1)
+    assert math.ceil(3 / width) * math.ceil(3 / height) > 10000
+
+
+def test_geohash_precision_zoom():
+    # finer zoom levels result in finer grids
+    precisions = [geo.geohash_precision(zoom=z, max_buckets=10 ** 9) for z in range(0, 18, 3)]
+    assert precisions == sorted(precisions)
+    assert precisions[0] < precisions[-1]
+
+    # the cells are smaller than the tiles shown at that zoom
+    precision = geo.geohash_precision(zoom=5, max_buckets=10 ** 9)
+    assert geo.geohash_cell_size(precision)[0] <= geo.geotile_cell_size(5 + geo.ZOOM_OFFSET)
+
+
+def test_geohash_precision_dateline():
+    # a bbox crossing the dateline is 20 degree wide, not 340
+    assert geo.geohash_precision(bbox=(170., -10., -170., 10.)) == geo.geohash_precision(bbox=(0., -10., 20., 10.))
+
+
+def test_geotile_precision():
+    assert geo.geotile_precision(max_buckets=1) == 0
+    assert geo.geotile_precision(zoom=4) == 4 + geo.ZOOM_OFFSET
+    assert geo.geotile_precision(zoom=40, max_buckets=10 ** 30) == geo.MAX_GEOTILE_PRECISION
+
+
+def test_decode_geotile():
+    lat, lon = geo.decode_geotile('0/0/0')
+    assert lat == pytest.approx(0.) and lon == pytest.approx(0.)
+
+    lat, lon = geo.decode_geotile('1/1/0')
+    assert lat > 0 and lon == pytest.approx(90.)
+
+
+def test_geohash_endpoint_bbox(client, pages):
+    points = client.get('/api/proj/pages/geohash?bbox=7,48,8.1,49.1&precision=9').get_json()['points']
+    assert sum(p['count'] for p in points) == 11
+
+    response = client.get('/api/proj/pages/geohash?bbox=7,48,8').get_json()
+    assert response['error']['status'] == 400
+
+
+@pytest.mark.parametrize('query', ['precision=abc', 'precision=13', 'grid=geotile&precision=30'])
+def test_geohash_endpoint_invalid_precision(client, pages, query):
+    result = client.get('/api/proj/pages/geohash?' + query).get_json()
+    assert result['error']['status'] == 400
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pytest
+
+from metacatalog2.elastic import es
+
+URL = '/api/proj/pages/geohash?precision=4'
+
+
+@pytest.fixture
+def expected(client, pages):
+    points = client.get(URL).get_json()['points']
+    assert len(points) > 0
+    return points
+
+
+def test_columnar(client, expected):
+    result = client.get(URL + '&format=columnar').get_json()
+    assert result['count'] == [p['count'] for p in expected]
+    assert list(zip(result['lat'], result['lon'])) == [tuple(p['coordinates']) for p in expected]
+
+
+def test_binary(client, expected):
+    response = client.get(URL + '&format=binary')
+    assert response.mimetype == 'application/octet-stream'
+    body = response.get_data()
+
+    n = int(np.frombuffer(body[:4], dtype='<u4')[0])
+    assert n == len(expected) == int(response.headers['X-Point-Count'])
+    lat = np.frombuffer(body[4:4 + 4 * n], dtype='<f4')
+    lon = np.frombuffer(body[4 + 4 * n:4 + 8 * n], dtype='<f4')
+    count = np.frombuffer(body[4 + 8 * n:], dtype='<u4')
+
+    assert count.tolist() == [p['count'] for p in expected]
+    np.testing.assert_allclose(lat, [p['coordinates'][0] for p in expected], rtol=1e-6)
+    np.testing.assert_allclose(lon, [p['coordinates'][1] for p in expected], rtol=1e-6)
+
+
+def test_geojsonseq(client, expected):
+    response = client.get(URL + '&format=geojsonseq')
+    assert response.mimetype == 'application/geo+json-seq'
+    records = response.get_data(as_text=True).split('\x1e')[1:]
+    features = [json.loads(r) for r in records]
+
+    assert [f['properties']['count'] for f in features] == [p['count'] for p in expected]
+    assert [f['geometry']['coordinates'][::-1] for f in features] == [p['coordinates'] for p in expected]
+
+
+def test_invalid_format_before_query(client, pages, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('the aggregation must not be sent')
+    monkeypatch.setattr(es.transport, 'perform_request', fail)
+
+    response = client.get(URL + '&format=xml').get_json()
+    assert response['error']['status'] == 400
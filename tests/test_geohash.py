@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from metacatalog2.util import geohash
+
+
+def test_encode_known():
+    # reference values of geohash.org
+    assert geohash.encode(57.64911, 10.40744, precision=11) == 'u4pruydqqvj'
+    assert geohash.encode(42.6, -5.6, precision=5) == 'ezs42'
+
+
+def test_decode_known():
+    lat, lon = geohash.decode('ezs42')
+    assert lat == pytest.approx(42.605, abs=0.03)
+    assert lon == pytest.approx(-5.603, abs=0.03)
+
+
+def test_bounds():
+    min_lat, max_lat, min_lon, max_lon = geohash.bounds(['s', '7'])
+    np.testing.assert_allclose(min_lat, [0., -45.])
+    np.testing.assert_allclose(max_lat, [45., 0.])
+    np.testing.assert_allclose(min_lon, [0., -45.])
+    np.testing.assert_allclose(max_lon, [45., 0.])
+
+
+def test_roundtrip():
+    rng = np.random.RandomState(42)
+    lat = rng.uniform(-90, 90, 1000)
+    lon = rng.uniform(-180, 180, 1000)
+
+    for precision in (1, 5, 7, 12):
+        keys = geohash.encode_array(lat, lon, precision=precision)
+        assert all(len(k) == precision for k in keys)
+
+        # the coordinates are within the decoded cells
+        min_lat, max_lat, min_lon, max_lon = geohash.bounds(keys)
+        assert np.all((min_lat <= lat) & (lat <= max_lat))
+        assert np.all((min_lon <= lon) & (lon <= max_lon))
+
+        # the cell centers encode to the same keys
+        c_lat, c_lon = geohash.decode_array(keys)
+        assert list(geohash.encode_array(c_lat, c_lon, precision=precision)) == list(keys)
+
+
+def test_mixed_precision():
+    lat, lon = geohash.decode_array(['u', 'u4pruydqqvj', 'ezs42'])
+    assert lat.shape == (3, )
+    assert (lat[1], lon[1]) == pytest.approx((57.64911, 10.40744), abs=1e-4)
+
+
+def test_edges():
+    assert geohash.encode(90., 180., precision=3) == 'zzz'
+    assert geohash.encode(-90., -180., precision=3) == '000'
+    lat, lon = geohash.decode_array([])
+    assert lat.shape == (0, )
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        geohash.decode_array(['u4a'])
+    with pytest.raises(ValueError):
+        geohash.encode(0., 0., precision=13)
@@ -0,0 +1,49 @@
+import pytest
+
+from metacatalog2.elastic import es, alias_map
+from metacatalog2.models import Page
+
+
+@pytest.fixture
+def moved(pages):
+    """Move proj_v1 to proj_v2 behind the back of this process, like a reindex of another worker."""
+    assert alias_map.resolve('proj') == ['proj_v1']
+    es.indices.create(index='proj_v2')
+    es.reindex(body=dict(source=dict(index='proj_v1'), dest=dict(index='proj_v2')), refresh=True)
+    es.indices.update_aliases(body=dict(actions=[
+        dict(add=dict(index='proj_v2', alias='proj', is_write_index=True)),
+        dict(add=dict(index='proj_v2', alias='meta')),
+        dict(remove_index=dict(index='proj_v1'))
+    ]))
+    return 'proj_v2'
+
+
+def test_get_resolves_alias(pages):
+    Page.get_paths.clear()
+    page = Page.get('page-1', context='proj')
+    assert page.meta.index == 'proj_v1'
+    assert Page.get_paths == dict(get=1)
+
+    # meta is an alias of two indices and has to be searched
+    assert Page.get('page-1', context='meta').title == 'Page 1'
+    assert Page.get_paths['search'] == 1
+
+
+def test_get_missing(pages):
+    assert Page.get('nothing', context='meta') is None
+
+
+def test_get_after_index_moved(moved):
+    Page.get_paths.clear()
+    page = Page.get('page-1', context='proj')
+    assert page.title == 'Page 1'
+    assert page.meta.index == moved
+    assert Page.get_paths['fallback'] == 1
+
+    # the alias map was reloaded
+    assert alias_map.resolve('proj') == [moved]
+
+
+def test_get_many_after_index_moved(moved):
+    result = Page.get_many(['page-3', 'page-1'], context='proj')
+    assert [p.meta.index for p in result] == [moved, moved]
@@ -0,0 +1,13 @@
+def test_info(client, contexts):
+    result = client.get('/api/info').get_json()
+    assert result['elasticsearch_info']['version']['number']
+    assert 'green' in result['cluster_health']
+    assert set(result['context_cache']) == {'hits', 'misses', 'size', 'maxsize', 'ttl'}
+    assert 'page_get_paths' in result
+
+
+def test_info_counts_calls(client, contexts):
+    # the first request loads the alias map
+    client.get('/api/info')
+    response = client.get('/api/info')
+    assert 'desc="2 calls"' in response.headers['Server-Timing']
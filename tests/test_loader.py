@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from metacatalog2.elastic import es
+from metacatalog2.util.loader import read_records, convert_record, load
+
+
+def test_read_records_formats(tmp_path):
+    records = [dict(title='a'), dict(title='b', owner='me')]
+
+    (tmp_path / 'dump.json').write_text(json.dumps(records))
+    (tmp_path / 'dump.jsonl').write_text('\n'.join(json.dumps(r) for r in records) + '\n\n')
+    (tmp_path / 'dump.csv').write_text('title,owner\na,\nb,me\n')
+
+    for name in ('dump.json', 'dump.jsonl', 'dump.csv'):
+        assert list(read_records(str(tmp_path / name))) == records
+
+    with pytest.raises(ValueError):
+        list(read_records(str(tmp_path / 'dump.json'), fmt='xml'))
+
+
+def test_convert_record():
+    ok, action = convert_record((dict(_id='1', title='a', location='POINT (8 49)'), 'proj'))
+    assert ok
+    assert action['_id'] == '1' and action['_index'] == 'proj'
+    assert action['_source']['uid'] == '1'
+    assert action['_source']['coordinates'] == dict(lat=49., lon=8.)
+
+
+@pytest.mark.parametrize('record', [
+    ['not', 'an', 'object'],
+    dict(description='no title'),
+    dict(title='a', location='POINT (8'),
+    dict(title='a', location='POLYGON ((0 0, 1 1, 1 0, 0 1, 0 0))')
+])
+def test_convert_record_errors(record):
+    ok, message = convert_record((record, 'proj'))
+    assert not ok
+    assert isinstance(message, str)
+
+
+def test_load(tmp_path, contexts):
+    path = tmp_path / 'dump.ndjson'
+    path.write_text('\n'.join(json.dumps(r) for r in [
+        dict(_id='1', title='a'),
+        dict(description='no title'),
+        dict(_id='3', title='c', location='POINT (8 49)')
+    ]))
+
+    indexed, errors = load(str(path), context='proj', processes=2, threads=2, chunk_size=1)
+    assert indexed == 2
+    assert [e['record'] for e in errors] == [1]
+    assert es.count(index='proj')['count'] == 2
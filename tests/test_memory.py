@@ -0,0 +1,90 @@
+import pytest
+from elasticsearch import Elasticsearch, Transport
+from elasticsearch.exceptions import NotFoundError, AuthorizationException, RequestError
+
+from metacatalog2.elastic import backend_connection
+from metacatalog2.util.memory import MemoryStore, MemoryConnection
+
+
+@pytest.fixture
+def mem():
+    client = Elasticsearch()
+    client.transport = Transport([dict()], connection_class=MemoryConnection, store=MemoryStore())
+    client.indices.create(index='docs_v1', body=dict(mappings=dict(page=dict(properties=dict(
+        title=dict(type='text'),
+        uid=dict(type='keyword')
+    )))))
+    return client
+
+
+def test_backend_connection():
+    assert backend_connection('memory') is MemoryConnection
+    assert backend_connection('metacatalog2.util.memory.MemoryConnection') is MemoryConnection
+    with pytest.raises(ValueError):
+        backend_connection('nobackend')
+
+
+def test_index_get_delete(mem):
+    mem.index(index='docs_v1', doc_type='page', id='1', body=dict(title='air temperature'))
+    assert mem.get(index='docs_v1', doc_type='page', id='1')['_source'] == dict(title='air temperature')
+
+    mem.delete(index='docs_v1', doc_type='page', id='1')
+    with pytest.raises(NotFoundError):
+        mem.get(index='docs_v1', doc_type='page', id='1')
+
+
+def test_search_match_and_sort(mem):
+    for i, title in enumerate(['air temperature', 'soil temperature', 'discharge']):
+        mem.index(index='docs_v1', doc_type='page', id=str(i), body=dict(title=title, uid=str(i)))
+
+    result = mem.search(index='docs_v1', body=dict(query=dict(match=dict(title='temperature')), sort=['uid']))
+    assert result['hits']['total'] == 2
+    assert [h['_id'] for h in result['hits']['hits']] == ['0', '1']
+
+
+def test_alias_write_index(mem):
+    mem.indices.create(index='docs_v2')
+    mem.indices.update_aliases(body=dict(actions=[
+        dict(add=dict(index='docs_v1', alias='docs')),
+        dict(add=dict(index='docs_v2', alias='docs', is_write_index=True))
+    ]))
+    result = mem.index(index='docs', doc_type='page', id='1', body=dict(title='x'))
+    assert result['_index'] == 'docs_v2'
+
+    # only one write index per alias
+    with pytest.raises(RequestError):
+        mem.indices.update_aliases(body=dict(actions=[
+            dict(add=dict(index='docs_v1', alias='docs', is_write_index=True))
+        ]))
+
+
+def test_write_block(mem):
+    mem.indices.put_settings(index='docs_v1', body={'index.blocks.write': True})
+    with pytest.raises(AuthorizationException):
+        mem.index(index='docs_v1', doc_type='page', id='1', body=dict(title='x'))
+
+    mem.indices.put_settings(index='docs_v1', body={'index.blocks.write': None})
+    mem.index(index='docs_v1', doc_type='page', id='1', body=dict(title='x'))
+
+
+def test_reindex_script(mem):
+    mem.index(index='docs_v1', doc_type='page', id='a', body=dict(title='x'))
+    mem.indices.create(index='docs_v2')
+    result = mem.reindex(body=dict(
+        source=dict(index='docs_v1'),
+        dest=dict(index='docs_v2'),
+        script=dict(source='ctx._source.uid = ctx._id', lang='painless')
+    ), refresh=True)
+    assert result['created'] == 1
+    assert mem.get(index='docs_v2', doc_type='page', id='a')['_source'] == dict(title='x', uid='a')
+    # the source document is not changed
+    assert 'uid' not in mem.get(index='docs_v1', doc_type='page', id='a')['_source']
+
+
+def test_app_runs_on_memory_store(client, contexts):
+    response = client.put('/api/proj/page', json=dict(title='air temperature'))
+    page = response.get_json()
+    assert page['_index'] == 'proj_v1'
+
+    response = client.get('/api/page/%s' % page['_id'])
+    assert response.get_json()['_source']['title'] == 'air temperature'
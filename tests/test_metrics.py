@@ -0,0 +1,36 @@
+import re
+
+from metacatalog2.metrics import Histogram
+
+
+def test_histogram():
+    hist = Histogram((1, 5))
+    for value in (0.5, 2, 10):
+        hist.observe(value)
+
+    assert hist.render('x', 'a="b"') == [
+        'x_bucket{a="b",le="1"} 1',
+        'x_bucket{a="b",le="5"} 2',
+        'x_bucket{a="b",le="+Inf"} 3',
+        'x_sum{a="b"} 12.500000',
+        'x_count{a="b"} 3'
+    ]
+
+
+def test_server_timing(client, pages):
+    # the first request loads the alias map
+    client.get('/api/proj/page/page-1')
+    response = client.get('/api/proj/page/page-1')
+    timing = response.headers['Server-Timing']
+    assert re.match(r'^app;dur=[\d.]+, es;dur=[\d.]+;desc="1 calls"$', timing)
+
+
+def test_metrics_endpoint(client, pages):
+    client.get('/api/proj/page/page-1')
+    response = client.get('/api/metrics')
+    assert response.mimetype == 'text/plain'
+
+    text = response.get_data(as_text=True)
+    assert 'metacatalog_request_duration_seconds_count{endpoint="api.get_page"}' in text
+    assert 'metacatalog_responses_total{endpoint="api.get_page",status="200"}' in text
+    assert 'metacatalog_cache_requests_total{cache="context",result="hit"}' in text
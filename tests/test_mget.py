@@ -0,0 +1,18 @@
+from metacatalog2.models import Page
+
+
+def test_get_many(pages):
+    result = Page.get_many(['page-3', 'nothing', 'page-1'], context='proj', fields='title')
+    assert [p.meta.id if p is not None else None for p in result] == ['page-3', None, 'page-1']
+    assert list(result[0].to_dict()) == ['title']
+
+    result = Page.get_many(['page-3', 'nothing'], context='meta')
+    assert result[0].title == 'Page 3' and result[1] is None
+
+
+def test_mget_endpoint(client, pages):
+    result = client.post('/api/proj/pages/_mget', json=dict(ids=['page-1', 'x'])).get_json()
+    assert result['pages'][0]['_id'] == 'page-1' and result['pages'][1] is None
+    assert result['missing'] == ['x']
+
+    assert client.post('/api/proj/pages/_mget', json=dict(ids='page-1')).get_json()['error']['status'] == 400
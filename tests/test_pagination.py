@@ -0,0 +1,87 @@
+import pytest
+
+from metacatalog2.elastic import es, encode_cursor, decode_cursor
+from metacatalog2.models import Page
+
+
+def test_cursor_roundtrip():
+    values = [1577836800000, 'page-1']
+    cursor = encode_cursor(values)
+    assert isinstance(cursor, str)
+    assert '/' not in cursor and '+' not in cursor
+    assert decode_cursor(cursor) == values
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
+
+
+def test_iter_pages(pages):
+    seen = []
+    cursor = None
+    while True:
+        hits, cursor = Page.iter_pages(index='proj', page_size=10, cursor=cursor)
+        seen.extend(page.meta.id for page in hits)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(d['meta']['id'] for d in pages)
+
+
+def test_iter_pages_equal_timestamps(contexts):
+    # the uid breaks the ties of equal edited timestamps
+    for i in range(7):
+        es.index(index='proj', doc_type='page', id='p%d' % i,
+                 body=dict(title='p', edited='2020-01-01T00:00:00', uid='p%d' % i))
+
+    first, cursor = Page.iter_pages(index='proj', page_size=4)
+    second, last = Page.iter_pages(index='proj', page_size=4, cursor=cursor)
+    ids = [p.meta.id for p in first + second]
+    assert ids == ['p%d' % i for i in range(7)]
+    assert last is None
+
+
+def test_pages_endpoint(client, pages):
+    first = client.get('/api/proj/pages?page_size=20').get_json()
+    assert len(first['pages']) == 20
+    second = client.get('/api/proj/pages?cursor=%s' % first['cursor']).get_json()
+    assert len(second['pages']) == 5 and second['cursor'] is None
+
+    ids = set(p['_id'] for p in first['pages'] + second['pages'])
+    assert len(ids) == 25
+
+
+def test_pages_endpoint_invalid_cursor(client, pages):
+    response = client.get('/api/proj/pages?cursor=abc').get_json()
+    assert response['error']['status'] == 400
+
+
+def test_contexts_endpoint(client, contexts):
+    first = client.get('/api/contexts?page_size=1').get_json()
+    second = client.get('/api/contexts?page_size=1&cursor=%s' % first['cursor']).get_json()
+    names = [c['_source']['name'] for c in first['contexts'] + second['contexts']]
+    assert names == ['meta', 'proj']
+
+
+def test_iter_pages_invalid_page_size(client, pages):
+    with pytest.raises(ValueError):
+        Page.iter_pages(index='proj', page_size=0)
+    assert client.get('/api/proj/pages?page_size=0').get_json()['error']['status'] == 400
+    assert client.get('/api/contexts?page_size=-1').get_json()['error']['status'] == 400
+
+
+def test_uid_mapping(contexts):
+    es.indices.create(index='old_v1', body=dict(mappings=dict(page=dict(properties=dict(title=dict(type='text'))))))
+    page = Page(title='old')
+    page.meta.index = 'old_v1'
+    page.save()
+
+    mapping = es.indices.get_mapping(index='old_v1')['old_v1']['mappings']['page']['properties']
+    assert mapping['uid'] == {'type': 'keyword'}
+    assert 'old_v1' in Page.uid_mapped
+
+
+def test_uid_mapping_conflict(contexts):
+    es.indices.create(index='old_v1', body=dict(mappings=dict(page=dict(properties=dict(uid=dict(type='text'))))))
+    Page.ensure_uid_mapping('old_v1')
+    assert 'old_v1' in Page.uid_mapped
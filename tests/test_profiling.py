@@ -0,0 +1,53 @@
+import json
+import logging
+
+from metacatalog2 import metrics
+
+
+def test_profile_attached(client, pages):
+    result = client.get('/api/proj/pages?limit=3&profile=true').get_json()
+    assert len(result['data']) == 3
+    assert len(result['profile']) == 1
+    assert result['profile'][0]['query']['profile'] is True
+
+
+def test_profile_header_bypasses_cache(client, pages):
+    client.get('/api/proj/pages/geohash?precision=3')
+    result = client.get('/api/proj/pages/geohash?precision=3', headers={'X-Profile': '1'}).get_json()
+    assert len(result['points']) > 0
+    assert len(result['profile']) == 1
+
+
+def test_profile_streamed(client, store, pages, monkeypatch):
+    # record the bodies as received by the store, after the instrumented transport
+    bodies = []
+    store_request = store.request
+
+    def recorded(method, url, params=None, body=None):
+        bodies.append(body)
+        return store_request(method, url, params=params, body=body)
+    monkeypatch.setattr(store, 'request', recorded)
+
+    response = client.get('/api/proj/pages?stream=ndjson&profile=true')
+    assert len(response.get_data(as_text=True).splitlines()) == 25
+    assert 'X-Profile-Queries' not in response.headers
+    assert len(bodies) > 0
+    assert not any('"profile"' in str(b) for b in bodies)
+
+
+def test_no_profile(client, pages):
+    assert isinstance(client.get('/api/proj/pages?limit=3').get_json(), list)
+
+
+def test_slowlog(client, pages, monkeypatch, caplog):
+    client.get('/api/proj/page/page-1')
+    assert len(caplog.records) == 0
+
+    monkeypatch.setattr(metrics, 'ELASTIC_SLOW_QUERY_MS', 0)
+    with caplog.at_level(logging.WARNING, logger='metacatalog2.slowlog'):
+        client.get('/api/proj/page/page-1')
+
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry['endpoint'] == 'api.get_page'
+    assert entry['method'] == 'GET'
+    assert entry['duration_ms'] >= 0
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+from metacatalog2.elastic import es
+from metacatalog2.main import views
+
+
+class RawStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, size, decode_content=True):
+        assert decode_content is False
+        for chunk in self.chunks:
+            yield chunk
+
+
+class ProxyResponse:
+    def __init__(self, chunks, status_code=200, headers=None):
+        self.raw = RawStream(chunks)
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def node(monkeypatch):
+    """Answer the proxy requests to an Elasticsearch node at http://node:9200 by a recorded response."""
+    node = SimpleNamespace(requests=[], response=None)
+
+    def get(url, **kwargs):
+        node.requests.append(dict(kwargs, url=url))
+        return node.response
+    monkeypatch.setattr(views.session, 'get', get)
+    monkeypatch.setattr(es.transport, 'get_connection', lambda: SimpleNamespace(host='http://node:9200'))
+    return node
+
+
+def test_proxy_streams(client, node):
+    node.response = ProxyResponse([b'{"a":', b' 1}'], headers={
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'ETag': 'x'
+    })
+    response = client.get('/es/proj/_search?q=title:a', headers={'Accept-Encoding': 'gzip', 'If-None-Match': 'x'})
+
+    assert response.is_streamed
+    assert response.get_data() == b'{"a": 1}'
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'ETag' not in response.headers
+    assert node.response.closed
+
+    request = node.requests[0]
+    assert request['url'] == 'http://node:9200/proj/_search?q=title:a'
+    assert request['stream'] is True
+    assert request['headers'] == {'Accept-Encoding': 'gzip'}
+
+
+def test_proxy_status(client, node):
+    node.response = ProxyResponse([b'{"error": "not found"}'], status_code=404,
+                                  headers={'Content-Type': 'application/json'})
+    response = client.get('/es/nothing/_search')
+    assert response.status_code == 404
+    assert response.mimetype == 'application/json'
+
+
+def test_proxy_memory_backend(client, pages):
+    response = client.get('/es/proj/_count')
+    assert response.get_json()['count'] == 25
+    assert client.get('/es/nothing/_count').status_code == 404
@@ -0,0 +1,99 @@
+import pytest
+from elasticsearch.exceptions import AuthorizationException
+from requests import HTTPError
+
+from metacatalog2.elastic import es
+from metacatalog2.models import Context, Page
+
+
+def aliases(index):
+    return es.indices.get_alias(index=index)[index]['aliases']
+
+
+def test_reindex(pages):
+    ctx = Context.by_name('proj')
+    statuses = []
+    ctx.reindex(progress=statuses.append, poll_interval=0)
+
+    assert ctx.v == 2 and not ctx.reindex_task
+    assert Context.by_name('proj').index_name == 'proj_v2'
+    assert es.count(index='proj_v2')['count'] == 25
+    assert sorted(aliases('proj_v2')) == ['meta', 'proj']
+    assert aliases('proj_v2')['proj'] == dict(is_write_index=True)
+    assert len(statuses) > 0
+
+    # the old index is kept read-only
+    assert aliases('proj_v1') == dict()
+    with pytest.raises(AuthorizationException):
+        es.index(index='proj_v1', doc_type='page', id='x', body=dict(title='x'))
+
+    # reads and writes through the alias use the new index
+    assert Page.get('page-1', context='proj').meta.index == 'proj_v2'
+    page = Page(title='new')
+    page.meta.index = 'proj'
+    page.create(refresh=True)
+    assert page.meta.index == 'proj_v2'
+
+
+def test_reindex_sets_uid(contexts):
+    # Pages indexed before the uid field existed
+    es.index(index='proj', doc_type='page', id='old', body=dict(title='old'), refresh=True)
+    Context.by_name('proj').reindex(poll_interval=0)
+    assert es.get(index='proj', doc_type='page', id='old')['_source']['uid'] == 'old'
+
+
+def test_reindex_delete_old(pages):
+    Context.by_name('proj').reindex(delete_old=True, poll_interval=0)
+    assert not es.indices.exists(index='proj_v1')
+
+
+def test_writes_blocked_while_reindexing(pages):
+    ctx = Context.by_name('proj')
+    ctx.start_reindex()
+
+    with pytest.raises(AuthorizationException):
+        es.index(index='proj', doc_type='page', id='x', body=dict(title='x'))
+    with pytest.raises(HTTPError) as e:
+        ctx.start_reindex()
+    assert e.value.errno == 409
+
+    finished, status = ctx.finish_reindex()
+    assert finished
+    es.index(index='proj', doc_type='page', id='x', body=dict(title='x'))
+
+    with pytest.raises(HTTPError) as e:
+        ctx.finish_reindex()
+    assert e.value.errno == 404
+
+
+def test_reindex_failure(pages, monkeypatch):
+    ctx = Context.by_name('proj')
+    ctx.start_reindex()
+
+    completed = dict(completed=True, task=dict(status=dict()), error=dict(type='test'))
+    monkeypatch.setattr(es.tasks, 'get', lambda task_id: completed)
+    with pytest.raises(HTTPError) as e:
+        ctx.finish_reindex()
+    assert e.value.errno == 500
+
+    # the new index is gone and the old one is writable again
+    assert not es.indices.exists(index='proj_v2')
+    assert Context.by_name('proj').v == 1 and not Context.by_name('proj').reindex_task
+    es.index(index='proj', doc_type='page', id='x', body=dict(title='x'))
+
+
+def test_reindex_endpoint(client, pages):
+    ctx = Context.by_name('proj')
+    response = client.post('/api/context/%s/reindex' % ctx.meta.id)
+    assert response.status_code == 202
+    assert response.get_json()['task'] is not None
+
+    # writes are rejected until the reindex is finished
+    assert client.put('/api/proj/page', json=dict(title='x')).get_json()['error']['status'] == 409
+
+    result = client.get('/api/context/%s/reindex' % ctx.meta.id).get_json()
+    assert result['finished'] is True
+    assert result['context']['_source']['v'] == 2
+    assert client.put('/api/proj/page', json=dict(title='x')).get_json()['_index'] == 'proj_v2'
+
+    assert client.get('/api/context/%s/reindex' % ctx.meta.id).get_json()['error']['status'] == 404
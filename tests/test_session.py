@@ -0,0 +1,18 @@
+from metacatalog2.elastic import new_elastic, new_session, ELASTIC_POOL_SIZE, ELASTIC_RETRIES, ELASTIC_TIMEOUT
+
+
+def test_new_session():
+    session = new_session()
+    adapter = session.get_adapter('http://node:9200')
+    assert adapter is session.get_adapter('https://node:9200')
+    assert adapter._pool_maxsize == ELASTIC_POOL_SIZE
+    assert adapter.max_retries.total == ELASTIC_RETRIES
+
+
+def test_new_elastic():
+    client = new_elastic(backend='elasticsearch')
+    connection = client.transport.get_connection()
+    assert connection.pool.pool.maxsize == ELASTIC_POOL_SIZE
+    assert connection.timeout == ELASTIC_TIMEOUT
+    assert client.transport.max_retries == ELASTIC_RETRIES
+    assert client.transport.retry_on_timeout
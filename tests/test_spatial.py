@@ -0,0 +1,70 @@
+from shapely.geometry import box
+
+from metacatalog2.models import Page, Context
+from metacatalog2.util.spatial import SpatialIndex, load_wkt
+
+
+def test_spatial_index_predicates():
+    idx = SpatialIndex([
+        ('a', 'POINT (1 1)'),
+        ('b', 'POLYGON ((0 0, 4 0, 4 4, 0 4, 0 0))'),
+        ('c', box(10, 10, 11, 11))
+    ])
+    assert len(idx) == 3
+    assert sorted(idx.intersects(box(0.5, 0.5, 1.5, 1.5))) == ['a', 'b']
+    assert sorted(idx.within(box(-1, -1, 5, 5))) == ['a', 'b']
+    assert idx.contains('POINT (2 2)') == ['b']
+    assert idx.nearest('POINT (9 9)') == ['c']
+    assert [sorted(r) for r in idx.intersects([box(0, 0, 1, 1), box(20, 20, 21, 21)])] == [['a', 'b'], []]
+
+
+def test_spatial_index_updates():
+    idx = SpatialIndex([('a', 'POINT (1 1)')])
+    assert idx.intersects(box(0, 0, 2, 2)) == ['a']
+
+    idx.add('b', 'POINT (1.5 1.5)')
+    idx.add('a', 'POINT (5 5)')
+    assert idx.intersects(box(0, 0, 2, 2)) == ['b']
+
+    idx.remove('b')
+    idx.remove('unknown')
+    assert idx.intersects(box(0, 0, 2, 2)) == []
+
+
+def test_load_wkt_cached():
+    assert load_wkt('POINT (1 2)') is load_wkt('POINT (1 2)')
+
+
+def test_page_spatial_index_follows_writes(pages):
+    idx = Page.spatial_index(index='proj')
+    assert len(idx) == 25
+    assert Page.spatial_index(index='proj') is idx
+
+    page = Page(title='new', location='POINT (100 10)')
+    page.meta.index = 'proj'
+    page.create(refresh=True)
+    assert idx.intersects(box(99, 9, 101, 11)) == [page.meta.id]
+
+    page.delete(refresh=True)
+    assert idx.intersects(box(99, 9, 101, 11)) == []
+
+
+def test_page_spatial_index_dropped(pages):
+    idx = Page.spatial_index(index='proj')
+
+    # bulk writes and alias changes drop the index
+    list(Page.bulk_create([dict(title='bulk', location='POINT (100 10)')], index='proj'))
+    assert Page.spatial_cache.peek('proj') is None
+    idx = Page.spatial_index(index='proj')
+    assert len(idx) == 26
+
+    Context.by_name('proj').realias()
+    assert Page.spatial_cache.peek('proj') is None
+
+
+def test_spatial_endpoint(client, pages):
+    result = client.get('/api/proj/pages/spatial?wkt=POLYGON((7 48, 8.055 48, 8.055 49.055, 7 49.055, 7 48))').get_json()
+    assert sorted(result['ids']) == ['page-0', 'page-1', 'page-2', 'page-3', 'page-4', 'page-5']
+
+    assert client.get('/api/proj/pages/spatial?wkt=POINT(1').get_json()['error']['status'] == 400
+    assert client.get('/api/proj/pages/spatial?wkt=POINT(1 1)&predicate=x').get_json()['error']['status'] == 400